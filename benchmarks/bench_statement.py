@@ -0,0 +1,655 @@
+"""
+bench_statement.py
+
+Per-stage micro-benchmarks for the statement pipeline.
+
+Usage:
+    python -m benchmarks.bench_statement run --output benchmarks/baselines/local.json
+    python -m benchmarks.bench_statement compare benchmarks/baselines/local.json --threshold 10
+    python -m benchmarks.bench_statement importtime --top 20
+    python -m benchmarks.bench_statement pdfsize --presets standard,print
+    python -m benchmarks.bench_statement tablesize --tables Transactions,Merchants,Categories
+
+Each benchmark is recorded as seconds per call (median/min/max over several
+repeats). `compare` exits with status 1 when any benchmark's median is slower
+than the baseline by more than the threshold percentage.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_THRESHOLD = 10.0
+DEFAULT_ROWS = [10, 100, 1000]
+DEFAULT_RENDER_ROWS = [10, 100, 500]
+DEFAULT_LONG_ROWS = [1000, 5000]
+DEFAULT_LANGUAGES = ['en', 'zh', 'ms', 'ta']
+DEFAULT_TABLES = ['Transactions', 'Merchants', 'Categories']
+STAGES = ['totals', 'currency', 'fx', 'html', 'render', 'longrender', 'validators', 'db', 'startup', 'logging']
+
+TRANSACTION_TYPES = ['Purchase', 'Purchase', 'Purchase', 'Payment', 'Fee', 'Refund']
+CATEGORIES = ['Dining', 'Groceries', 'Travel', 'Electronics', 'Entertainment']
+CURRENCIES = ['SGD', 'SGD', 'SGD', 'HKD', 'USD', 'MYR']
+SAMPLE_RATES = {'HKD': '0.1745', 'USD': '1.36', 'MYR': '0.3045'}
+
+
+class SkipBenchmark(Exception):
+    """Raised by a stage when its dependencies are unavailable."""
+
+
+# ---------------------------
+# Sample data
+# ---------------------------
+
+def make_customer():
+    return {
+        'customer_id': 1,
+        'first_name': 'John',
+        'last_name': 'Tan',
+        'email': 'john.tan@example.com',
+        'phone': '+65 9123 4567',
+        'address': '1 Raffles Place, Singapore'
+    }
+
+
+def make_account():
+    return {
+        'account_id': 1,
+        'account_number': 'DBS1234567890',
+        'account_type': 'Platinum',
+        'card_number': '4539578763621486',
+        'credit_limit': Decimal('20000.00'),
+        'reward_points': 12500,
+        'tier_level': 'Platinum'
+    }
+
+
+def make_transactions(count):
+    """Build a deterministic list of transaction rows shaped like the DB rows."""
+    start = datetime(2025, 4, 1, 9, 0, 0)
+    transactions = []
+    for i in range(count):
+        transactions.append({
+            'transaction_id': i + 1,
+            'transaction_date': start + timedelta(minutes=37 * i),
+            'merchant_name': f"Merchant {i % 250}",
+            'transaction_amount': Decimal(f"{(i * 7919) % 100000 / 100:.2f}"),
+            'transaction_type': TRANSACTION_TYPES[i % len(TRANSACTION_TYPES)],
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'currency': CURRENCIES[i % len(CURRENCIES)]
+        })
+    return transactions
+
+
+# ---------------------------
+# Timing
+# ---------------------------
+
+def measure(func, repeat=5, min_time=0.2):
+    """Time func, returning per-call statistics in seconds.
+
+    The loop count is calibrated (like timeit's autorange) so that a single
+    repeat takes at least min_time seconds.
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / loops)
+
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'loops': loops,
+        'repeat': repeat
+    }
+
+
+def _import_app():
+    try:
+        import generate_pdf
+    except ImportError as e:
+        raise SkipBenchmark(f"generate_pdf could not be imported: {e}")
+    return generate_pdf
+
+
+# ---------------------------
+# Stages
+# ---------------------------
+
+def bench_totals(args):
+    generator = _import_app().StatementGenerator()
+    for rows in args.rows:
+        transactions = make_transactions(rows)
+        yield f"calculate_totals[rows={rows}]", lambda: generator.calculate_totals(transactions)
+
+
+def bench_currency(args):
+    generator = _import_app().StatementGenerator()
+    amounts = [Decimal('1234567.89'), Decimal('-42.50'), Decimal('0.00')]
+    yield "format_currency", lambda: [generator.format_currency(a) for a in amounts]
+
+
+def bench_fx(args):
+    from services import fx
+    for rows in args.rows:
+        transactions = make_transactions(rows)
+        # A fresh table per call so the pair factors are recomputed too
+        yield (f"fx_normalise[rows={rows}]",
+               lambda t=transactions: fx.normalise(t, 'SGD', fx.RateTable(None, SAMPLE_RATES)))
+
+
+def bench_html(args):
+    generator = _import_app().StatementGenerator()
+    customer, account = make_customer(), make_account()
+    for rows in args.rows:
+        transactions = make_transactions(rows)
+        for language in args.languages:
+            yield (f"build_statement_html[rows={rows},lang={language}]",
+                   lambda t=transactions, l=language: generator.build_statement_html(customer, account, t, l))
+
+
+def _load_renderer():
+    """Load WeasyPrint and start the render pool, or skip when WeasyPrint cannot load.
+
+    generate_statement_pdf returns None when rendering fails, so without this
+    check a host without WeasyPrint's libraries would time the failure path.
+    Starting the pool here also keeps worker start-up out of the first sample.
+    """
+    from services import render_pool
+
+    try:
+        render_pool.warm_up()
+    except (ImportError, OSError) as e:
+        raise SkipBenchmark(f"WeasyPrint could not be loaded: {e}")
+
+
+def bench_render(args):
+    generator = _import_app().StatementGenerator()
+    _load_renderer()
+    customer, account = make_customer(), make_account()
+    for rows in args.render_rows:
+        transactions = make_transactions(rows)
+        for language in args.languages:
+            yield (f"generate_statement_pdf[rows={rows},lang={language}]",
+                   lambda t=transactions, l=language: generator.generate_statement_pdf(customer, account, t, l))
+
+
+def bench_longrender(args):
+    """Long statements rendered as one document and as parallel chunks."""
+    generator = _import_app().StatementGenerator()
+    _load_renderer()
+    customer, account = make_customer(), make_account()
+    for rows in args.long_rows:
+        transactions = make_transactions(rows)
+        for mode, chunked in (('single', False), ('chunked', True)):
+            yield (f"generate_statement_pdf[rows={rows},mode={mode}]",
+                   lambda t=transactions, c=chunked: generator.generate_statement_pdf(customer, account, t, chunked=c))
+
+
+def bench_validators(args):
+    try:
+        from test_cases.validators import StatementValidator
+    except ImportError as e:
+        raise SkipBenchmark(f"StatementValidator could not be imported: {e}")
+
+    yield "validate_card_number", lambda: StatementValidator.validate_card_number('4539 5787 6362 1486')
+    yield "validate_email", lambda: StatementValidator.validate_email('john.tan@example.com')
+    yield "validate_date", lambda: StatementValidator.validate_date('2025-04-24')
+    yield "validate_amount", lambda: StatementValidator.validate_amount('1234.567')
+
+    try:
+        import pandas as pd
+        from validators import data_validators
+    except ImportError:
+        return
+
+    for rows in args.rows:
+        df = pd.DataFrame({
+            'date': ['2025-04-24'] * rows,
+            'amount': [(i * 7919) % 20000 for i in range(rows)]
+        })
+        yield f"validate_date_column[rows={rows}]", lambda d=df: data_validators.validate_date_column(d, 'date')
+        yield f"high_value_transactions[rows={rows}]", lambda d=df: data_validators.high_value_transactions(d)
+
+
+def bench_db(args):
+    app = _import_app()
+    config = app.get_config()
+    db = app.DatabaseConnection(config)
+    customer, _, _ = db.fetch_customer_data(args.customer_id)
+    if not customer:
+        raise SkipBenchmark(f"customer {args.customer_id} not reachable in {config['DB_NAME']}")
+    yield f"fetch_customer_data[customer={args.customer_id}]", lambda: db.fetch_customer_data(args.customer_id)
+
+
+def _log_burst(logger, threads, records):
+    def worker():
+        for i in range(records):
+            logger.info("PDF generated successfully", extra={'customer_id': i})
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+def bench_logging(args):
+    """Compare synchronous file+stream handlers with the queued pipeline."""
+    import logging
+    from services import logging_config
+
+    log_dir = tempfile.mkdtemp()
+    devnull = open(os.devnull, 'w')
+
+    sync_logger = logging.getLogger('bench.sync')
+    sync_logger.propagate = False
+    sync_logger.setLevel(logging.INFO)
+    sync_logger.handlers = [logging.FileHandler(os.path.join(log_dir, 'sync.log')),
+                            logging.StreamHandler(devnull)]
+    for handler in sync_logger.handlers:
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    queued_logger = logging_config.configure_logging('bench.queued', os.path.join(log_dir, 'queued.log'),
+                                                     stream=devnull)
+
+    for threads in args.log_threads:
+        yield (f"logging[sync,threads={threads}]",
+               lambda t=threads: _log_burst(sync_logger, t, args.log_records))
+        yield (f"logging[queued,threads={threads}]",
+               lambda t=threads: _log_burst(queued_logger, t, args.log_records))
+
+
+def import_times(module='generate_pdf'):
+    """Import module in a fresh interpreter under -X importtime.
+
+    Returns a list of (cumulative_us, self_us, name) tuples, slowest first.
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               capture_output=True, text=True, cwd=REPO_ROOT)
+    if completed.returncode != 0:
+        raise SkipBenchmark(completed.stderr.strip().splitlines()[-1])
+
+    times = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times.append((int(cumulative_us), int(self_us), name.strip()))
+    return sorted(times, reverse=True)
+
+
+def bench_startup(args):
+    import_times()  # skip early when the app cannot be imported
+    yield "import generate_pdf[cold]", lambda: import_times()
+
+
+STAGE_FUNCTIONS = {
+    'totals': bench_totals,
+    'currency': bench_currency,
+    'fx': bench_fx,
+    'html': bench_html,
+    'render': bench_render,
+    'longrender': bench_longrender,
+    'validators': bench_validators,
+    'db': bench_db,
+    'startup': bench_startup,
+    'logging': bench_logging
+}
+
+
+def run_benchmarks(args):
+    """Run the selected stages and return the results document."""
+    results = {}
+    skipped = {}
+    for stage in args.stages:
+        try:
+            for name, func in STAGE_FUNCTIONS[stage](args):
+                results[name] = measure(func, repeat=args.repeat, min_time=args.min_time)
+                print(f"{name:<55} {results[name]['median'] * 1000:>10.3f} ms")
+        except SkipBenchmark as e:
+            skipped[stage] = str(e)
+            print(f"{stage:<55} skipped: {e}")
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'revision': _git_revision(),
+            'stages': args.stages
+        },
+        'results': results,
+        'skipped': skipped
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------------------
+# PDF size report
+# ---------------------------
+
+def extract_pdf_text(pdf_bytes):
+    """Extract the text of every page with pypdf."""
+    import io
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def missing_text(pdf_bytes, expected):
+    """Return the expected strings that cannot be found in the PDF text.
+
+    Whitespace is ignored because extracted CJK and Tamil text is often split
+    into separately positioned runs.
+    """
+    text = ''.join(extract_pdf_text(pdf_bytes).split())
+    return [item for item in expected if ''.join(item.split()) not in text]
+
+
+def pdf_size_report(args):
+    """Render one statement per language and preset and check its text survives.
+
+    Returns a list of dicts with language, preset, bytes and missing strings.
+    """
+    app = _import_app()
+    generator = app.StatementGenerator()
+    _load_renderer()
+    customer, account = make_customer(), make_account()
+    transactions = make_transactions(args.size_rows)
+
+    rows = []
+    for language in args.languages:
+        text = app.translations[language]
+        expected = [
+            text['statement_title'],
+            text['transaction_details'],
+            f"{customer['first_name']} {customer['last_name']}",
+            account['account_number']
+        ] + [t['merchant_name'] for t in transactions[:5]]
+
+        for preset in args.presets:
+            pdf = generator.generate_statement_pdf(customer, account, transactions, language, preset).getvalue()
+            rows.append({
+                'language': language,
+                'preset': preset,
+                'bytes': len(pdf),
+                'missing': missing_text(pdf, expected)
+            })
+    return rows
+
+
+def print_size_report(rows):
+    print(f"{'language':<10} {'preset':<10} {'bytes':>10}  text check")
+    for row in rows:
+        check = 'ok' if not row['missing'] else f"missing {row['missing']}"
+        print(f"{row['language']:<10} {row['preset']:<10} {row['bytes']:>10}  {check}")
+
+
+def table_sizes(connection, tables):
+    """On-disk size of MySQL tables from information_schema, after refreshing statistics.
+
+    Tables that do not exist are left out.
+    """
+    with connection.cursor() as cursor:
+        existing = []
+        for table in tables:
+            cursor.execute("SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                           (table,))
+            if cursor.fetchone():
+                cursor.execute(f"ANALYZE TABLE `{table}`")
+                cursor.fetchall()
+                existing.append(table)
+        if not existing:
+            return []
+
+        placeholders = ', '.join(['%s'] * len(existing))
+        cursor.execute(f"""
+            SELECT TABLE_NAME AS name, TABLE_ROWS AS row_count, AVG_ROW_LENGTH AS avg_row_bytes,
+                   DATA_LENGTH AS data_bytes, INDEX_LENGTH AS index_bytes
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})
+            ORDER BY TABLE_NAME
+        """, existing)
+        return [{key: (int(value) if key != 'name' else value) for key, value in row.items()}
+                for row in cursor.fetchall()]
+
+
+def table_size_report(args):
+    app = _import_app()
+    try:
+        connection = app.DatabaseConnection(app.get_config()).connect()
+    except Exception as e:
+        raise SkipBenchmark(f"database not reachable: {e}")
+    try:
+        return table_sizes(connection, args.tables)
+    finally:
+        connection.close()
+
+
+def print_table_sizes(rows):
+    print(f"{'table':<16} {'rows':>10} {'avg row B':>10} {'data KiB':>10} {'index KiB':>10}")
+    for row in rows:
+        print(f"{row['name']:<16} {row['row_count']:>10} {row['avg_row_bytes']:>10} "
+              f"{row['data_bytes'] / 1024:>10.0f} {row['index_bytes'] / 1024:>10.0f}")
+
+
+# ---------------------------
+# Comparison
+# ---------------------------
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compare two results documents by median time.
+
+    Returns a list of (name, baseline_median, current_median, change_percent,
+    status) tuples where status is 'regression', 'improvement', 'ok', 'new'
+    or 'missing'.
+    """
+    rows = []
+    base_results = baseline.get('results', {})
+    current_results = current.get('results', {})
+
+    for name in sorted(set(base_results) | set(current_results)):
+        if name not in current_results:
+            rows.append((name, base_results[name]['median'], None, None, 'missing'))
+            continue
+        if name not in base_results:
+            rows.append((name, None, current_results[name]['median'], None, 'new'))
+            continue
+
+        before = base_results[name]['median']
+        after = current_results[name]['median']
+        change = (after - before) / before * 100 if before else 0.0
+        if change > threshold:
+            status = 'regression'
+        elif change < -threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, before, after, change, status))
+
+    return rows
+
+
+def _format_ms(value):
+    return f"{value * 1000:.3f}" if value is not None else "-"
+
+
+def print_comparison(rows, threshold):
+    print(f"{'benchmark':<55} {'baseline ms':>12} {'current ms':>12} {'change':>9}  status")
+    for name, before, after, change, status in rows:
+        change_str = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<55} {_format_ms(before):>12} {_format_ms(after):>12} {change_str:>9}  {status}")
+    regressions = [row for row in rows if row[4] == 'regression']
+    print(f"\n{len(regressions)} regression(s) over {threshold:.1f}%")
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(document, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _csv_ints(value):
+    return [int(item) for item in _csv(value)]
+
+
+def _add_run_options(parser):
+    parser.add_argument('--stages', type=_csv, default=list(STAGES),
+                        help=f"Comma separated stages to run (default: {','.join(STAGES)})")
+    parser.add_argument('--rows', type=_csv_ints, default=DEFAULT_ROWS,
+                        help="Row counts for totals/HTML/validator benchmarks")
+    parser.add_argument('--render-rows', type=_csv_ints, default=DEFAULT_RENDER_ROWS,
+                        help="Row counts for WeasyPrint rendering benchmarks")
+    parser.add_argument('--long-rows', type=_csv_ints, default=DEFAULT_LONG_ROWS,
+                        help="Row counts for the single vs chunked long statement benchmark")
+    parser.add_argument('--languages', type=_csv, default=DEFAULT_LANGUAGES,
+                        help="Statement languages to benchmark")
+    parser.add_argument('--customer-id', type=int, default=1,
+                        help="Customer used for the database fetch benchmark")
+    parser.add_argument('--log-threads', type=_csv_ints, default=[1, 8, 32],
+                        help="Concurrent threads for the logging benchmark")
+    parser.add_argument('--log-records', type=int, default=200,
+                        help="Records logged per thread in the logging benchmark")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help="Minimum seconds per repeat used to calibrate the loop count")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Statement pipeline micro-benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run benchmarks and store the results")
+    _add_run_options(run_parser)
+    run_parser.add_argument('--output', default=os.path.join(BASELINE_DIR, 'latest.json'))
+
+    importtime_parser = subparsers.add_parser('importtime', help="Show the slowest imports of the app module")
+    importtime_parser.add_argument('--module', default='generate_pdf')
+    importtime_parser.add_argument('--top', type=int, default=20)
+
+    size_parser = subparsers.add_parser('pdfsize', help="Report bytes per statement per language and preset")
+    size_parser.add_argument('--languages', type=_csv, default=DEFAULT_LANGUAGES)
+    size_parser.add_argument('--presets', type=_csv, default=['standard', 'print'])
+    size_parser.add_argument('--size-rows', type=int, default=50,
+                             help="Transactions per statement (default: %(default)s)")
+    size_parser.add_argument('--output', help="Also write the report as JSON")
+
+    table_parser = subparsers.add_parser('tablesize', help="Report MySQL table and index sizes")
+    table_parser.add_argument('--tables', type=_csv, default=DEFAULT_TABLES)
+    table_parser.add_argument('--output', help="Also write the report as JSON")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare results against a baseline")
+    compare_parser.add_argument('baseline', help="Baseline results JSON")
+    compare_parser.add_argument('current', nargs='?',
+                                help="Results JSON to compare (runs the benchmarks when omitted)")
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help="Regression threshold in percent (default: %(default)s)")
+    _add_run_options(compare_parser)
+
+    args = parser.parse_args(argv)
+    if args.command == 'importtime':
+        try:
+            times = import_times(args.module)
+        except SkipBenchmark as e:
+            print(f"Import failed: {e}")
+            return 1
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for cumulative_us, self_us, name in times[:args.top]:
+            print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+        return 0
+
+    if args.command == 'pdfsize':
+        try:
+            rows = pdf_size_report(args)
+        except SkipBenchmark as e:
+            print(f"Report skipped: {e}")
+            return 1
+        print_size_report(rows)
+        if args.output:
+            save_results({'meta': {'created': datetime.now().isoformat(timespec='seconds'),
+                                   'revision': _git_revision()},
+                          'sizes': rows}, args.output)
+        return 1 if any(row['missing'] for row in rows) else 0
+
+    if args.command == 'tablesize':
+        try:
+            rows = table_size_report(args)
+        except SkipBenchmark as e:
+            print(f"Report skipped: {e}")
+            return 1
+        print_table_sizes(rows)
+        if args.output:
+            save_results({'meta': {'created': datetime.now().isoformat(timespec='seconds'),
+                                   'revision': _git_revision()},
+                          'tables': rows}, args.output)
+        return 0
+
+    unknown = [stage for stage in args.stages if stage not in STAGE_FUNCTIONS]
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(unknown)}")
+
+    if args.command == 'run':
+        save_results(run_benchmarks(args), args.output)
+        return 0
+
+    baseline = load_results(args.baseline)
+    if args.current:
+        current = load_results(args.current)
+    else:
+        args.stages = [stage for stage in baseline['meta'].get('stages', args.stages) if stage in STAGE_FUNCTIONS]
+        current = run_benchmarks(args)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(rows, args.threshold)
+    return 1 if any(row[4] == 'regression' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
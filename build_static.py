@@ -0,0 +1,129 @@
+"""
+build_static.py
+
+Pre-renders the static marketing/login pages and extracts their inline CSS
+and JavaScript into fingerprinted, minified, precompressed files.
+
+Usage:
+    python build_static.py
+
+Output is written to static/dist/:
+    assets/<page>-<n>.<hash>.css|js (+ .br, .gz)   served with immutable cache headers
+    pages/<endpoint>.html (+ .br, .gz)             served by the page routes
+    manifest.json                                  endpoint -> page file and ETag
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import brotli
+
+from generate_pdf import app, STATIC_DIST_DIR, STATIC_PAGES, logger
+
+ASSET_URL_PREFIX = '/static/dist/assets/'
+FINGERPRINT_LENGTH = 12
+
+INLINE_STYLE_RE = re.compile(r'<style>(.*?)</style>', re.DOTALL | re.IGNORECASE)
+INLINE_SCRIPT_RE = re.compile(r'<script>(.*?)</script>', re.DOTALL | re.IGNORECASE)
+
+
+# ---------------------------
+# Minification
+# ---------------------------
+
+def minify_css(css):
+    """Strip comments and redundant whitespace from a stylesheet."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+def minify_js(js):
+    """Drop indentation, blank lines and whole-line comments from a script.
+
+    This is deliberately conservative: statements are kept on their own
+    lines so that automatic semicolon insertion behaves exactly as before.
+    """
+    lines = []
+    for line in js.splitlines():
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+# ---------------------------
+# Output helpers
+# ---------------------------
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def write_precompressed(path, data):
+    """Write data along with Brotli and gzip encoded variants."""
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def extract_assets(html, page_name, assets_dir):
+    """Move inline <style> and <script> blocks into fingerprinted files.
+
+    Returns the rewritten HTML.
+    """
+    counter = {'css': 0, 'js': 0}
+
+    def replace(kind, minify, tag):
+        def _replace(match):
+            counter[kind] += 1
+            data = minify(match.group(1)).encode('utf-8')
+            filename = f"{page_name}-{counter[kind]}.{fingerprint(data)}.{kind}"
+            write_precompressed(os.path.join(assets_dir, filename), data)
+            return tag.format(url=ASSET_URL_PREFIX + filename)
+        return _replace
+
+    html = INLINE_STYLE_RE.sub(replace('css', minify_css, '<link rel="stylesheet" href="{url}">'), html)
+    html = INLINE_SCRIPT_RE.sub(replace('js', minify_js, '<script src="{url}"></script>'), html)
+    return html
+
+
+def build(output_dir=STATIC_DIST_DIR):
+    """Render every static page and write the dist tree and manifest."""
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    assets_dir = os.path.join(output_dir, 'assets')
+    pages_dir = os.path.join(output_dir, 'pages')
+    os.makedirs(assets_dir)
+    os.makedirs(pages_dir)
+
+    manifest = {}
+    with app.test_request_context('/'):
+        from flask import render_template
+
+        for endpoint, template_name in STATIC_PAGES.items():
+            page_name = os.path.splitext(template_name)[0]
+            html = extract_assets(render_template(template_name), page_name, assets_dir)
+            data = html.encode('utf-8')
+            filename = f"{endpoint}.html"
+            write_precompressed(os.path.join(pages_dir, filename), data)
+            manifest[endpoint] = {'file': f"pages/{filename}", 'etag': fingerprint(data)}
+            logger.info(f"Built {template_name} -> {filename} ({len(data)} bytes)")
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    build()
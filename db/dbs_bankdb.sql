@@ -6,10 +6,18 @@ COLLATE utf8mb4_unicode_ci;
 USE DBS_CreditCard;
 
 -- Drop tables if they exist (for clean re-runs)
+DROP TABLE IF EXISTS SpendingRollup;
 DROP TABLE IF EXISTS Rewards;
 DROP TABLE IF EXISTS Transactions;
+DROP TABLE IF EXISTS TransactionsImport;
+DROP TABLE IF EXISTS TransactionsArchive;
+DROP TABLE IF EXISTS Merchants;
+DROP TABLE IF EXISTS Categories;
 DROP TABLE IF EXISTS Accounts;
+DROP TABLE IF EXISTS FxRates;
 DROP TABLE IF EXISTS Customers;
+DROP PROCEDURE IF EXISTS sp_apply_spending;
+DROP PROCEDURE IF EXISTS sp_load_transactions;
 
 -- Create schema with proper data types, constraints, and indexes
 -- Table for Customers with additional fields and constraints
@@ -41,6 +49,7 @@ CREATE TABLE Accounts (
     expiry_date DATE NOT NULL,
     credit_limit DECIMAL(12, 2) NOT NULL DEFAULT 1000.00,
     available_credit DECIMAL(12, 2) NOT NULL DEFAULT 1000.00,
+    billing_currency CHAR(3) NOT NULL DEFAULT 'SGD', -- statement currency; limits are in it too
     annual_fee DECIMAL(10, 2) DEFAULT 0.00,
     interest_rate DECIMAL(5, 2) NOT NULL DEFAULT 12.99,
     statement_date INT NOT NULL DEFAULT 1, -- Day of month
@@ -51,16 +60,48 @@ CREATE TABLE Accounts (
     INDEX idx_account_customer (customer_id)
 ) ENGINE=InnoDB;
 
--- Table for Transactions with improved categorization and tracking
+-- FX rates: the value of one unit of each currency in SGD, by date. Statements
+-- convert foreign currency transactions with the latest rate on or before the
+-- cycle's last day (services/fx.py)
+CREATE TABLE FxRates (
+    currency CHAR(3) NOT NULL,
+    rate_date DATE NOT NULL,
+    rate_to_base DECIMAL(20, 10) NOT NULL,
+    PRIMARY KEY (currency, rate_date)
+) ENGINE=InnoDB;
+
+-- Dimension tables for transaction categories and merchants. Transactions
+-- reference them by integer key; the app resolves names through an
+-- in-process intern table (services/dimensions.py)
+CREATE TABLE Categories (
+    category_key SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    category_name VARCHAR(100) NOT NULL,
+    UNIQUE INDEX idx_category_name (category_name)
+) ENGINE=InnoDB;
+
+CREATE TABLE Merchants (
+    merchant_key INT AUTO_INCREMENT PRIMARY KEY,
+    merchant_name VARCHAR(255) NOT NULL,
+    merchant_id VARCHAR(50) NOT NULL DEFAULT '', -- '' when the acquirer sends none
+    merchant_category_code VARCHAR(4),
+    UNIQUE INDEX idx_merchant_identity (merchant_name, merchant_id)
+) ENGINE=InnoDB;
+
+-- Table for Transactions with improved categorization and tracking.
+-- Partitioned by month on transaction_date so statement queries for a period
+-- read only that month's partition; services/partitions.py adds upcoming
+-- months and archives old ones. MySQL does not support foreign keys on
+-- partitioned tables, so account, merchant and category references are
+-- enforced by the loaders (sp_load_transactions joins the dimensions) and
+-- deleting an account does not cascade to its transactions. The
+-- partitioning column has to be part of the primary key.
 CREATE TABLE Transactions (
-    transaction_id INT AUTO_INCREMENT PRIMARY KEY,
+    transaction_id INT AUTO_INCREMENT,
     account_id INT NOT NULL,
     transaction_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     settlement_date DATETIME,
-    merchant_name VARCHAR(255) NOT NULL,
-    merchant_id VARCHAR(50),
-    merchant_category_code VARCHAR(4),
-    category VARCHAR(100),
+    merchant_key INT NOT NULL,
+    category_key SMALLINT UNSIGNED,
     transaction_amount DECIMAL(12, 2) NOT NULL,
     transaction_type ENUM('Purchase', 'Payment', 'Fee', 'Credit', 'Refund', 'Adjustment', 'Cash Advance') NOT NULL,
     transaction_reference VARCHAR(100),
@@ -68,12 +109,60 @@ CREATE TABLE Transactions (
     currency VARCHAR(3) DEFAULT 'SGD',
     exchange_rate DECIMAL(10, 6) DEFAULT 1.000000,
     description TEXT,
-    FOREIGN KEY (account_id) REFERENCES Accounts(account_id) ON DELETE CASCADE,
+    PRIMARY KEY (transaction_id, transaction_date),
     INDEX idx_transaction_date (transaction_date),
     INDEX idx_transaction_account (account_id),
+    INDEX idx_transaction_account_date (account_id, transaction_date),
     INDEX idx_transaction_type (transaction_type),
-    INDEX idx_transaction_category (category)
-) ENGINE=InnoDB;
+    INDEX idx_transaction_category (category_key)
+) ENGINE=InnoDB
+PARTITION BY RANGE COLUMNS(transaction_date) (
+    PARTITION p_history VALUES LESS THAN ('2025-01-01'),
+    PARTITION p202501 VALUES LESS THAN ('2025-02-01'),
+    PARTITION p202502 VALUES LESS THAN ('2025-03-01'),
+    PARTITION p202503 VALUES LESS THAN ('2025-04-01'),
+    PARTITION p202504 VALUES LESS THAN ('2025-05-01'),
+    PARTITION p202505 VALUES LESS THAN ('2025-06-01'),
+    PARTITION p202506 VALUES LESS THAN ('2025-07-01'),
+    PARTITION p202507 VALUES LESS THAN ('2025-08-01'),
+    PARTITION p202508 VALUES LESS THAN ('2025-09-01'),
+    PARTITION p202509 VALUES LESS THAN ('2025-10-01'),
+    PARTITION p202510 VALUES LESS THAN ('2025-11-01'),
+    PARTITION p202511 VALUES LESS THAN ('2025-12-01'),
+    PARTITION p202512 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p202601 VALUES LESS THAN ('2026-02-01'),
+    PARTITION p202602 VALUES LESS THAN ('2026-03-01'),
+    PARTITION p202603 VALUES LESS THAN ('2026-04-01'),
+    PARTITION p202604 VALUES LESS THAN ('2026-05-01'),
+    PARTITION p202605 VALUES LESS THAN ('2026-06-01'),
+    PARTITION p202606 VALUES LESS THAN ('2026-07-01'),
+    PARTITION p202607 VALUES LESS THAN ('2026-08-01'),
+    PARTITION p202608 VALUES LESS THAN ('2026-09-01'),
+    PARTITION p202609 VALUES LESS THAN ('2026-10-01'),
+    PARTITION p202610 VALUES LESS THAN ('2026-11-01'),
+    PARTITION p202611 VALUES LESS THAN ('2026-12-01'),
+    PARTITION p202612 VALUES LESS THAN ('2027-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- Compressed cold storage for Transactions partitions past the retention
+-- window (moved by services/partitions.py). Same columns as Transactions.
+CREATE TABLE TransactionsArchive (
+    transaction_id INT NOT NULL PRIMARY KEY,
+    account_id INT NOT NULL,
+    transaction_date DATETIME NOT NULL,
+    settlement_date DATETIME,
+    merchant_key INT NOT NULL,
+    category_key SMALLINT UNSIGNED,
+    transaction_amount DECIMAL(12, 2) NOT NULL,
+    transaction_type ENUM('Purchase', 'Payment', 'Fee', 'Credit', 'Refund', 'Adjustment', 'Cash Advance') NOT NULL,
+    transaction_reference VARCHAR(100),
+    transaction_status ENUM('Pending', 'Completed', 'Declined', 'Disputed') NOT NULL,
+    currency VARCHAR(3),
+    exchange_rate DECIMAL(10, 6),
+    description TEXT,
+    INDEX idx_archive_account_date (account_id, transaction_date)
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
 
 -- Table for Rewards and Loyalty points
 CREATE TABLE Rewards (
@@ -82,11 +171,127 @@ CREATE TABLE Rewards (
     reward_points INT NOT NULL DEFAULT 0,
     tier_level ENUM('Standard', 'Silver', 'Gold', 'Platinum') NOT NULL DEFAULT 'Standard',
     points_expiry_date DATE,
+    last_accrual_period CHAR(7), -- last cycle (YYYY-MM) applied by services/rewards.py
     last_updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (account_id) REFERENCES Accounts(account_id) ON DELETE CASCADE,
-    INDEX idx_reward_account (account_id)
+    UNIQUE INDEX idx_reward_account (account_id)
+) ENGINE=InnoDB;
+
+-- Table for monthly spending per account, category and currency, kept up to
+-- date by the Transactions triggers below (read by /api/customer/<id>/spending)
+CREATE TABLE SpendingRollup (
+    account_id INT NOT NULL,
+    spend_month DATE NOT NULL, -- first day of the month
+    category VARCHAR(100) NOT NULL,
+    currency VARCHAR(3) NOT NULL,
+    spend_amount DECIMAL(14, 2) NOT NULL DEFAULT 0, -- completed purchases
+    refund_amount DECIMAL(14, 2) NOT NULL DEFAULT 0, -- completed refunds and credits
+    transaction_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, spend_month, category, currency),
+    FOREIGN KEY (account_id) REFERENCES Accounts(account_id) ON DELETE CASCADE
 ) ENGINE=InnoDB;
 
+-- Apply one transaction's contribution (sign +1 or -1) to SpendingRollup.
+-- Only completed purchases, refunds and credits count as spending.
+DELIMITER //
+CREATE PROCEDURE sp_apply_spending(IN p_account_id INT, IN p_date DATETIME, IN p_category_key SMALLINT UNSIGNED,
+                                   IN p_currency VARCHAR(3), IN p_amount DECIMAL(12, 2), IN p_type VARCHAR(20),
+                                   IN p_status VARCHAR(20), IN p_sign INT)
+BEGIN
+    IF p_status = 'Completed' AND p_type IN ('Purchase', 'Refund', 'Credit') THEN
+        INSERT INTO SpendingRollup (account_id, spend_month, category, currency,
+                                    spend_amount, refund_amount, transaction_count)
+        VALUES (p_account_id, DATE_FORMAT(p_date, '%Y-%m-01'),
+                COALESCE((SELECT category_name FROM Categories WHERE category_key = p_category_key), 'General'),
+                COALESCE(p_currency, 'SGD'),
+                IF(p_type = 'Purchase', p_amount, 0) * p_sign,
+                IF(p_type = 'Purchase', 0, p_amount) * p_sign,
+                p_sign)
+        ON DUPLICATE KEY UPDATE
+            spend_amount = spend_amount + VALUES(spend_amount),
+            refund_amount = refund_amount + VALUES(refund_amount),
+            transaction_count = transaction_count + VALUES(transaction_count);
+    END IF;
+END //
+
+CREATE TRIGGER trg_transactions_spending_insert AFTER INSERT ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(NEW.account_id, NEW.transaction_date, NEW.category_key, NEW.currency,
+                           NEW.transaction_amount, NEW.transaction_type, NEW.transaction_status, 1);
+END //
+
+CREATE TRIGGER trg_transactions_spending_update AFTER UPDATE ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(OLD.account_id, OLD.transaction_date, OLD.category_key, OLD.currency,
+                           OLD.transaction_amount, OLD.transaction_type, OLD.transaction_status, -1);
+    CALL sp_apply_spending(NEW.account_id, NEW.transaction_date, NEW.category_key, NEW.currency,
+                           NEW.transaction_amount, NEW.transaction_type, NEW.transaction_status, 1);
+END //
+
+CREATE TRIGGER trg_transactions_spending_delete AFTER DELETE ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(OLD.account_id, OLD.transaction_date, OLD.category_key, OLD.currency,
+                           OLD.transaction_amount, OLD.transaction_type, OLD.transaction_status, -1);
+END //
+DELIMITER ;
+
+-- Staging table for incoming transactions in their wide, name-based form.
+-- sp_load_transactions moves staged rows into Transactions, adding any new
+-- merchants and categories to the dimension tables first.
+CREATE TABLE TransactionsImport (
+    import_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    account_id INT NOT NULL,
+    transaction_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    settlement_date DATETIME,
+    merchant_name VARCHAR(255) NOT NULL,
+    merchant_id VARCHAR(50),
+    merchant_category_code VARCHAR(4),
+    category VARCHAR(100),
+    transaction_amount DECIMAL(12, 2) NOT NULL,
+    transaction_type ENUM('Purchase', 'Payment', 'Fee', 'Credit', 'Refund', 'Adjustment', 'Cash Advance') NOT NULL,
+    transaction_reference VARCHAR(100),
+    transaction_status ENUM('Pending', 'Completed', 'Declined', 'Disputed') NOT NULL DEFAULT 'Completed',
+    currency VARCHAR(3) DEFAULT 'SGD',
+    exchange_rate DECIMAL(10, 6) DEFAULT 1.000000,
+    description TEXT
+) ENGINE=InnoDB;
+
+DELIMITER //
+CREATE PROCEDURE sp_load_transactions()
+BEGIN
+    DECLARE v_last_import_id BIGINT;
+    -- Rows staged while the load runs are left for the next call
+    SELECT MAX(import_id) INTO v_last_import_id FROM TransactionsImport;
+
+    INSERT IGNORE INTO Categories (category_name)
+    SELECT DISTINCT category FROM TransactionsImport
+    WHERE import_id <= v_last_import_id AND category IS NOT NULL;
+
+    INSERT IGNORE INTO Merchants (merchant_name, merchant_id, merchant_category_code)
+    SELECT merchant_name, COALESCE(merchant_id, ''), MAX(merchant_category_code)
+    FROM TransactionsImport
+    WHERE import_id <= v_last_import_id
+    GROUP BY merchant_name, COALESCE(merchant_id, '');
+
+    INSERT INTO Transactions (account_id, transaction_date, settlement_date, merchant_key, category_key,
+                              transaction_amount, transaction_type, transaction_reference, transaction_status,
+                              currency, exchange_rate, description)
+    SELECT i.account_id, i.transaction_date, i.settlement_date, m.merchant_key, c.category_key,
+           i.transaction_amount, i.transaction_type, i.transaction_reference, i.transaction_status,
+           i.currency, i.exchange_rate, i.description
+    FROM TransactionsImport i
+    JOIN Merchants m ON m.merchant_name = i.merchant_name AND m.merchant_id = COALESCE(i.merchant_id, '')
+    LEFT JOIN Categories c ON c.category_name = i.category
+    WHERE i.import_id <= v_last_import_id
+    ORDER BY i.import_id;
+
+    DELETE FROM TransactionsImport WHERE import_id <= v_last_import_id;
+END //
+DELIMITER ;
+
 -- Insert sample data - Diverse set of customers
 INSERT INTO Customers (first_name, last_name, email, phone, address, city, country, postal_code, date_of_birth, join_date, preferred_language)
 VALUES 
@@ -147,8 +352,29 @@ VALUES
 (14, 'AC100054402', 'Gold', '5489123456785555', '2027-04-30', 14000.00, 9875.45, 130.00, 16.50, 9, 25),
 (15, 'AC100054403', 'Business', '5489123456784444', '2028-03-31', 40000.00, 27834.90, 400.00, 12.50, 24, 14);
 
+-- Sample FX rates (SGD per unit)
+INSERT INTO FxRates (currency, rate_date, rate_to_base)
+VALUES
+('HKD', '2025-01-01', 0.1745000000),
+('MYR', '2025-01-01', 0.3045000000),
+('IDR', '2025-01-01', 0.0000840000),
+('INR', '2025-01-01', 0.0159000000),
+('THB', '2025-01-01', 0.0398000000),
+('USD', '2025-01-01', 1.3600000000),
+('JPY', '2025-01-01', 0.0086500000);
+
+-- Bill customers outside Singapore in their local currency
+UPDATE Accounts SET billing_currency = CASE
+    WHEN customer_id IN (6, 7) THEN 'MYR'
+    WHEN customer_id IN (8, 9) THEN 'HKD'
+    WHEN customer_id IN (10, 11) THEN 'IDR'
+    WHEN customer_id IN (12, 13) THEN 'INR'
+    WHEN customer_id IN (14, 15) THEN 'THB'
+    ELSE 'SGD'
+END;
+
 -- Insert varied transaction history with different categories and transaction types
-INSERT INTO Transactions (account_id, transaction_date, settlement_date, merchant_name, merchant_id, merchant_category_code, category, transaction_amount, transaction_type, transaction_reference, currency)
+INSERT INTO TransactionsImport (account_id, transaction_date, settlement_date, merchant_name, merchant_id, merchant_category_code, category, transaction_amount, transaction_type, transaction_reference, currency)
 VALUES
 -- John Tan (SG)
 (1, '2025-03-15 08:23:15', '2025-03-16 00:00:00', 'Singapore Airlines', 'SGAIR123', '3056', 'Travel', 2450.75, 'Purchase', 'T123456789', 'SGD'),
@@ -211,16 +437,18 @@ VALUES
 -- Add some declined transactions for testing
 (3, '2025-04-05 18:45:22', '2025-04-05 18:45:22', 'Louis Vuitton', 'LV123', '5631', 'Luxury', 4500.00, 'Purchase', 'T323456793', 'SGD'),
 (13, '2025-04-02 15:30:33', '2025-04-02 15:30:33', 'Apple Online', 'APPLE789', '5732', 'Electronics', 85000.00, 'Purchase', 'T133456789', 'INR');
+CALL sp_load_transactions();
 
 -- Update transaction status for declined transactions
 UPDATE Transactions SET transaction_status = 'Declined' WHERE transaction_reference IN ('T323456793', 'T133456789');
 
 -- Sample refunds and credits
-INSERT INTO Transactions (account_id, transaction_date, settlement_date, merchant_name, merchant_id, merchant_category_code, category, transaction_amount, transaction_type, transaction_reference, currency)
+INSERT INTO TransactionsImport (account_id, transaction_date, settlement_date, merchant_name, merchant_id, merchant_category_code, category, transaction_amount, transaction_type, transaction_reference, currency)
 VALUES
 (1, '2025-04-02 09:30:15', '2025-04-03 00:00:00', 'Apple Store Refund', 'APPLE001', '5732', 'Electronics', 500.00, 'Refund', 'R123456789', 'SGD'),
 (5, '2025-04-06 10:45:22', '2025-04-07 00:00:00', 'Cashback Reward', NULL, NULL, 'Rewards', 250.00, 'Credit', 'C523456789', 'SGD'),
 (8, '2025-04-05 11:15:33', '2025-04-06 00:00:00', 'Disputed Charge Reversal', NULL, NULL, 'Adjustment', 1200.00, 'Credit', 'C823456789', 'HKD');
+CALL sp_load_transactions();
 
 -- Insert reward points data
 INSERT INTO Rewards (account_id, reward_points, tier_level, points_expiry_date)
@@ -256,8 +484,8 @@ SELECT
     a.available_credit,
     t.transaction_id,
     t.transaction_date,
-    t.merchant_name,
-    t.category,
+    m.merchant_name,
+    cat.category_name AS category,
     t.transaction_amount,
     t.transaction_type,
     t.transaction_status,
@@ -268,6 +496,10 @@ JOIN
     Accounts a ON c.customer_id = a.customer_id
 LEFT JOIN 
     Transactions t ON a.account_id = t.account_id
+LEFT JOIN
+    Merchants m ON m.merchant_key = t.merchant_key
+LEFT JOIN
+    Categories cat ON cat.category_key = t.category_key
 WHERE
     t.transaction_status = 'Completed' OR t.transaction_status IS NULL;
 
@@ -302,7 +534,7 @@ END //
 DELIMITER ;
 
 
-INSERT INTO Transactions (account_id, transaction_date, settlement_date, merchant_name, merchant_id, merchant_category_code, category, transaction_amount, transaction_type, transaction_reference, currency)
+INSERT INTO TransactionsImport (account_id, transaction_date, settlement_date, merchant_name, merchant_id, merchant_category_code, category, transaction_amount, transaction_type, transaction_reference, currency)
 VALUES (8, '2025-03-05 09:15:22', '2025-03-06 00:00:00', 'Cathay Pacific', 'CATHY123', '3056', 'Travel', 12500.00, 'Purchase', 'T823456789', 'HKD'),
 (8, '2025-03-12 13:45:33', '2025-03-13 00:00:00', 'Four Seasons Hotel', 'FOUR456', '7011', 'Accommodation', 8750.00, 'Purchase', 'T823456790', 'HKD'),
 (8, '2025-03-18 16:30:15', '2025-03-19 00:00:00', 'Apple Store', 'APPLE789', '5732', 'Electronics', 9999.00, 'Purchase', 'T823456791', 'HKD'),
@@ -405,4 +637,5 @@ VALUES (8, '2025-03-05 09:15:22', '2025-03-06 00:00:00', 'Cathay Pacific', 'CATH
 (8, '2026-01-18 18:45:33', '2026-01-19 00:00:00', 'Levi', 'LEVI456', '5651', 'Clothing', 1950.00, 'Purchase', 'T823456875', 'HKD'),
 (8, '2026-01-22 12:30:22', '2026-01-23 00:00:00', 'Subway', 'SUB789', '5812', 'Dining', 95.00, 'Purchase', 'T823456876', 'HKD'),
 (8, '2026-01-25 11:20:45', '2026-01-26 00:00:00', 'Apple TV+', 'APTV001', '4899', 'Entertainment', 58.00, 'Purchase', 'T823456877', 'HKD'),
-(8, '2026-01-28 16:15:33', '2026-01-29 00:00:00', 'HKBN', 'HKBN123', '4814', 'Telecommunications', 280.00, 'Purchase', 'T823456878', 'HKD');
\ No newline at end of file
+(8, '2026-01-28 16:15:33', '2026-01-29 00:00:00', 'HKBN', 'HKBN123', '4814', 'Telecommunications', 280.00, 'Purchase', 'T823456878', 'HKD');
+CALL sp_load_transactions();
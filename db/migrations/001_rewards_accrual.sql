@@ -0,0 +1,31 @@
+-- Prepare Rewards for set-based accrual (services/rewards.py)
+-- * one Rewards row per account, so accrual can upsert with ON DUPLICATE KEY UPDATE
+-- * last_accrual_period makes re-running a cycle a no-op
+-- * (account_id, transaction_date) index for per-cycle aggregation by account range
+
+USE DBS_CreditCard;
+
+-- Merge any duplicate Rewards rows into the oldest row per account
+UPDATE Rewards r
+JOIN (
+    SELECT account_id, MIN(reward_id) AS keep_id, SUM(reward_points) AS total_points,
+           MAX(points_expiry_date) AS expiry
+    FROM Rewards
+    GROUP BY account_id
+    HAVING COUNT(*) > 1
+) d ON d.keep_id = r.reward_id
+SET r.reward_points = d.total_points,
+    r.points_expiry_date = d.expiry;
+
+DELETE r FROM Rewards r
+JOIN Rewards keep ON keep.account_id = r.account_id AND keep.reward_id < r.reward_id;
+
+ALTER TABLE Rewards
+    ADD COLUMN last_accrual_period CHAR(7) AFTER points_expiry_date,
+    ADD UNIQUE INDEX idx_reward_account_unique (account_id),
+    DROP INDEX idx_reward_account;
+
+ALTER TABLE Rewards RENAME INDEX idx_reward_account_unique TO idx_reward_account;
+
+ALTER TABLE Transactions
+    ADD INDEX idx_transaction_account_date (account_id, transaction_date);
@@ -0,0 +1,82 @@
+-- Monthly spending rollup for /api/customer/<id>/spending (services/spending.py)
+-- * SpendingRollup: (account, month, category, currency) totals
+-- * triggers on Transactions keep it current on insert, update and delete
+-- * backfilled once from existing transactions
+
+USE DBS_CreditCard;
+
+-- Table for monthly spending per account, category and currency, kept up to
+-- date by the Transactions triggers below (read by /api/customer/<id>/spending)
+CREATE TABLE SpendingRollup (
+    account_id INT NOT NULL,
+    spend_month DATE NOT NULL, -- first day of the month
+    category VARCHAR(100) NOT NULL,
+    currency VARCHAR(3) NOT NULL,
+    spend_amount DECIMAL(14, 2) NOT NULL DEFAULT 0, -- completed purchases
+    refund_amount DECIMAL(14, 2) NOT NULL DEFAULT 0, -- completed refunds and credits
+    transaction_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, spend_month, category, currency),
+    FOREIGN KEY (account_id) REFERENCES Accounts(account_id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- Apply one transaction's contribution (sign +1 or -1) to SpendingRollup.
+-- Only completed purchases, refunds and credits count as spending.
+DELIMITER //
+CREATE PROCEDURE sp_apply_spending(IN p_account_id INT, IN p_date DATETIME, IN p_category VARCHAR(100),
+                                   IN p_currency VARCHAR(3), IN p_amount DECIMAL(12, 2), IN p_type VARCHAR(20),
+                                   IN p_status VARCHAR(20), IN p_sign INT)
+BEGIN
+    IF p_status = 'Completed' AND p_type IN ('Purchase', 'Refund', 'Credit') THEN
+        INSERT INTO SpendingRollup (account_id, spend_month, category, currency,
+                                    spend_amount, refund_amount, transaction_count)
+        VALUES (p_account_id, DATE_FORMAT(p_date, '%Y-%m-01'), COALESCE(p_category, 'General'),
+                COALESCE(p_currency, 'SGD'),
+                IF(p_type = 'Purchase', p_amount, 0) * p_sign,
+                IF(p_type = 'Purchase', 0, p_amount) * p_sign,
+                p_sign)
+        ON DUPLICATE KEY UPDATE
+            spend_amount = spend_amount + VALUES(spend_amount),
+            refund_amount = refund_amount + VALUES(refund_amount),
+            transaction_count = transaction_count + VALUES(transaction_count);
+    END IF;
+END //
+
+CREATE TRIGGER trg_transactions_spending_insert AFTER INSERT ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(NEW.account_id, NEW.transaction_date, NEW.category, NEW.currency,
+                           NEW.transaction_amount, NEW.transaction_type, NEW.transaction_status, 1);
+END //
+
+CREATE TRIGGER trg_transactions_spending_update AFTER UPDATE ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(OLD.account_id, OLD.transaction_date, OLD.category, OLD.currency,
+                           OLD.transaction_amount, OLD.transaction_type, OLD.transaction_status, -1);
+    CALL sp_apply_spending(NEW.account_id, NEW.transaction_date, NEW.category, NEW.currency,
+                           NEW.transaction_amount, NEW.transaction_type, NEW.transaction_status, 1);
+END //
+
+CREATE TRIGGER trg_transactions_spending_delete AFTER DELETE ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(OLD.account_id, OLD.transaction_date, OLD.category, OLD.currency,
+                           OLD.transaction_amount, OLD.transaction_type, OLD.transaction_status, -1);
+END //
+DELIMITER ;
+
+-- Backfill from existing history (run before new transactions arrive, or
+-- inside a maintenance window, so the triggers and backfill don't overlap)
+INSERT INTO SpendingRollup (account_id, spend_month, category, currency,
+                            spend_amount, refund_amount, transaction_count)
+SELECT account_id,
+       DATE_FORMAT(transaction_date, '%Y-%m-01'),
+       COALESCE(category, 'General'),
+       COALESCE(currency, 'SGD'),
+       SUM(IF(transaction_type = 'Purchase', transaction_amount, 0)),
+       SUM(IF(transaction_type = 'Purchase', 0, transaction_amount)),
+       COUNT(*)
+FROM Transactions
+WHERE transaction_status = 'Completed'
+  AND transaction_type IN ('Purchase', 'Refund', 'Credit')
+GROUP BY 1, 2, 3, 4;
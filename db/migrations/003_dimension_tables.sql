@@ -0,0 +1,198 @@
+-- Merchant and category dimension tables (services/dimensions.py)
+-- * Merchants/Categories replace the merchant_name, merchant_id,
+--   merchant_category_code and category columns repeated on every Transactions row
+-- * TransactionsImport + sp_load_transactions accept new transactions by name
+-- * spending triggers, rewards accrual and vw_customer_statements use the keys
+-- Requires 002_spending_rollup.sql. Measure before and after with
+-- python -m benchmarks.bench_statement tablesize
+
+USE DBS_CreditCard;
+
+-- Dimension tables for transaction categories and merchants. Transactions
+-- reference them by integer key; the app resolves names through an
+-- in-process intern table (services/dimensions.py)
+CREATE TABLE Categories (
+    category_key SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    category_name VARCHAR(100) NOT NULL,
+    UNIQUE INDEX idx_category_name (category_name)
+) ENGINE=InnoDB;
+
+CREATE TABLE Merchants (
+    merchant_key INT AUTO_INCREMENT PRIMARY KEY,
+    merchant_name VARCHAR(255) NOT NULL,
+    merchant_id VARCHAR(50) NOT NULL DEFAULT '', -- '' when the acquirer sends none
+    merchant_category_code VARCHAR(4),
+    UNIQUE INDEX idx_merchant_identity (merchant_name, merchant_id)
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO Categories (category_name)
+SELECT DISTINCT category FROM Transactions WHERE category IS NOT NULL;
+
+INSERT IGNORE INTO Merchants (merchant_name, merchant_id, merchant_category_code)
+SELECT merchant_name, COALESCE(merchant_id, ''), MAX(merchant_category_code)
+FROM Transactions
+GROUP BY merchant_name, COALESCE(merchant_id, '');
+
+-- The spending triggers read the columns being dropped, and would otherwise
+-- fire for every row of the key backfill
+DROP TRIGGER IF EXISTS trg_transactions_spending_insert;
+DROP TRIGGER IF EXISTS trg_transactions_spending_update;
+DROP TRIGGER IF EXISTS trg_transactions_spending_delete;
+DROP PROCEDURE IF EXISTS sp_apply_spending;
+
+ALTER TABLE Transactions
+    ADD COLUMN merchant_key INT AFTER settlement_date,
+    ADD COLUMN category_key SMALLINT UNSIGNED AFTER merchant_key;
+
+UPDATE Transactions t
+JOIN Merchants m ON m.merchant_name = t.merchant_name AND m.merchant_id = COALESCE(t.merchant_id, '')
+LEFT JOIN Categories c ON c.category_name = t.category
+SET t.merchant_key = m.merchant_key,
+    t.category_key = c.category_key;
+
+-- Rebuilds the table without the wide columns
+ALTER TABLE Transactions
+    MODIFY merchant_key INT NOT NULL,
+    DROP INDEX idx_transaction_category,
+    DROP COLUMN merchant_name,
+    DROP COLUMN merchant_id,
+    DROP COLUMN merchant_category_code,
+    DROP COLUMN category,
+    ADD INDEX idx_transaction_category (category_key),
+    ADD FOREIGN KEY (merchant_key) REFERENCES Merchants(merchant_key),
+    ADD FOREIGN KEY (category_key) REFERENCES Categories(category_key);
+
+-- Apply one transaction's contribution (sign +1 or -1) to SpendingRollup.
+-- Only completed purchases, refunds and credits count as spending.
+DELIMITER //
+CREATE PROCEDURE sp_apply_spending(IN p_account_id INT, IN p_date DATETIME, IN p_category_key SMALLINT UNSIGNED,
+                                   IN p_currency VARCHAR(3), IN p_amount DECIMAL(12, 2), IN p_type VARCHAR(20),
+                                   IN p_status VARCHAR(20), IN p_sign INT)
+BEGIN
+    IF p_status = 'Completed' AND p_type IN ('Purchase', 'Refund', 'Credit') THEN
+        INSERT INTO SpendingRollup (account_id, spend_month, category, currency,
+                                    spend_amount, refund_amount, transaction_count)
+        VALUES (p_account_id, DATE_FORMAT(p_date, '%Y-%m-01'),
+                COALESCE((SELECT category_name FROM Categories WHERE category_key = p_category_key), 'General'),
+                COALESCE(p_currency, 'SGD'),
+                IF(p_type = 'Purchase', p_amount, 0) * p_sign,
+                IF(p_type = 'Purchase', 0, p_amount) * p_sign,
+                p_sign)
+        ON DUPLICATE KEY UPDATE
+            spend_amount = spend_amount + VALUES(spend_amount),
+            refund_amount = refund_amount + VALUES(refund_amount),
+            transaction_count = transaction_count + VALUES(transaction_count);
+    END IF;
+END //
+
+CREATE TRIGGER trg_transactions_spending_insert AFTER INSERT ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(NEW.account_id, NEW.transaction_date, NEW.category_key, NEW.currency,
+                           NEW.transaction_amount, NEW.transaction_type, NEW.transaction_status, 1);
+END //
+
+CREATE TRIGGER trg_transactions_spending_update AFTER UPDATE ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(OLD.account_id, OLD.transaction_date, OLD.category_key, OLD.currency,
+                           OLD.transaction_amount, OLD.transaction_type, OLD.transaction_status, -1);
+    CALL sp_apply_spending(NEW.account_id, NEW.transaction_date, NEW.category_key, NEW.currency,
+                           NEW.transaction_amount, NEW.transaction_type, NEW.transaction_status, 1);
+END //
+
+CREATE TRIGGER trg_transactions_spending_delete AFTER DELETE ON Transactions
+FOR EACH ROW
+BEGIN
+    CALL sp_apply_spending(OLD.account_id, OLD.transaction_date, OLD.category_key, OLD.currency,
+                           OLD.transaction_amount, OLD.transaction_type, OLD.transaction_status, -1);
+END //
+DELIMITER ;
+
+-- Staging table for incoming transactions in their wide, name-based form.
+-- sp_load_transactions moves staged rows into Transactions, adding any new
+-- merchants and categories to the dimension tables first.
+CREATE TABLE TransactionsImport (
+    import_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    account_id INT NOT NULL,
+    transaction_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    settlement_date DATETIME,
+    merchant_name VARCHAR(255) NOT NULL,
+    merchant_id VARCHAR(50),
+    merchant_category_code VARCHAR(4),
+    category VARCHAR(100),
+    transaction_amount DECIMAL(12, 2) NOT NULL,
+    transaction_type ENUM('Purchase', 'Payment', 'Fee', 'Credit', 'Refund', 'Adjustment', 'Cash Advance') NOT NULL,
+    transaction_reference VARCHAR(100),
+    transaction_status ENUM('Pending', 'Completed', 'Declined', 'Disputed') NOT NULL DEFAULT 'Completed',
+    currency VARCHAR(3) DEFAULT 'SGD',
+    exchange_rate DECIMAL(10, 6) DEFAULT 1.000000,
+    description TEXT
+) ENGINE=InnoDB;
+
+DELIMITER //
+CREATE PROCEDURE sp_load_transactions()
+BEGIN
+    DECLARE v_last_import_id BIGINT;
+    -- Rows staged while the load runs are left for the next call
+    SELECT MAX(import_id) INTO v_last_import_id FROM TransactionsImport;
+
+    INSERT IGNORE INTO Categories (category_name)
+    SELECT DISTINCT category FROM TransactionsImport
+    WHERE import_id <= v_last_import_id AND category IS NOT NULL;
+
+    INSERT IGNORE INTO Merchants (merchant_name, merchant_id, merchant_category_code)
+    SELECT merchant_name, COALESCE(merchant_id, ''), MAX(merchant_category_code)
+    FROM TransactionsImport
+    WHERE import_id <= v_last_import_id
+    GROUP BY merchant_name, COALESCE(merchant_id, '');
+
+    INSERT INTO Transactions (account_id, transaction_date, settlement_date, merchant_key, category_key,
+                              transaction_amount, transaction_type, transaction_reference, transaction_status,
+                              currency, exchange_rate, description)
+    SELECT i.account_id, i.transaction_date, i.settlement_date, m.merchant_key, c.category_key,
+           i.transaction_amount, i.transaction_type, i.transaction_reference, i.transaction_status,
+           i.currency, i.exchange_rate, i.description
+    FROM TransactionsImport i
+    JOIN Merchants m ON m.merchant_name = i.merchant_name AND m.merchant_id = COALESCE(i.merchant_id, '')
+    LEFT JOIN Categories c ON c.category_name = i.category
+    WHERE i.import_id <= v_last_import_id
+    ORDER BY i.import_id;
+
+    DELETE FROM TransactionsImport WHERE import_id <= v_last_import_id;
+END //
+DELIMITER ;
+
+-- Create View for statement generation 
+CREATE OR REPLACE VIEW vw_customer_statements AS
+SELECT 
+    c.customer_id,
+    CONCAT(c.first_name, ' ', c.last_name) AS customer_name,
+    c.email,
+    c.phone,
+    CONCAT_WS(', ', c.address, c.city, c.country, c.postal_code) AS full_address,
+    a.account_id,
+    a.account_number,
+    a.card_number,
+    a.credit_limit,
+    a.available_credit,
+    t.transaction_id,
+    t.transaction_date,
+    m.merchant_name,
+    cat.category_name AS category,
+    t.transaction_amount,
+    t.transaction_type,
+    t.transaction_status,
+    t.currency
+FROM 
+    Customers c
+JOIN 
+    Accounts a ON c.customer_id = a.customer_id
+LEFT JOIN 
+    Transactions t ON a.account_id = t.account_id
+LEFT JOIN
+    Merchants m ON m.merchant_key = t.merchant_key
+LEFT JOIN
+    Categories cat ON cat.category_key = t.category_key
+WHERE
+    t.transaction_status = 'Completed' OR t.transaction_status IS NULL;
@@ -0,0 +1,90 @@
+-- Monthly RANGE partitioning of Transactions (services/partitions.py)
+-- * partitioned tables cannot have foreign keys, so Transactions' are dropped
+-- * the primary key becomes (transaction_id, transaction_date)
+-- * TransactionsArchive (compressed) receives partitions past the retention window
+-- Rows before 2025-01 land in p_history. Run python -m services.partitions
+-- afterwards to create partitions up to the current month and beyond.
+-- The partition rebuild copies the whole table; run it in a maintenance window.
+
+USE DBS_CreditCard;
+
+DELIMITER //
+CREATE PROCEDURE sp_drop_transaction_foreign_keys()
+BEGIN
+    DECLARE v_done INT DEFAULT 0;
+    DECLARE v_name VARCHAR(64);
+    DECLARE fk_cursor CURSOR FOR
+        SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'Transactions';
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_done = 1;
+
+    OPEN fk_cursor;
+    drop_loop: LOOP
+        FETCH fk_cursor INTO v_name;
+        IF v_done THEN
+            LEAVE drop_loop;
+        END IF;
+        SET @drop_fk = CONCAT('ALTER TABLE Transactions DROP FOREIGN KEY `', v_name, '`');
+        PREPARE stmt FROM @drop_fk;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END LOOP;
+    CLOSE fk_cursor;
+END //
+DELIMITER ;
+
+CALL sp_drop_transaction_foreign_keys();
+DROP PROCEDURE sp_drop_transaction_foreign_keys;
+
+ALTER TABLE Transactions
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (transaction_id, transaction_date);
+
+ALTER TABLE Transactions
+PARTITION BY RANGE COLUMNS(transaction_date) (
+    PARTITION p_history VALUES LESS THAN ('2025-01-01'),
+    PARTITION p202501 VALUES LESS THAN ('2025-02-01'),
+    PARTITION p202502 VALUES LESS THAN ('2025-03-01'),
+    PARTITION p202503 VALUES LESS THAN ('2025-04-01'),
+    PARTITION p202504 VALUES LESS THAN ('2025-05-01'),
+    PARTITION p202505 VALUES LESS THAN ('2025-06-01'),
+    PARTITION p202506 VALUES LESS THAN ('2025-07-01'),
+    PARTITION p202507 VALUES LESS THAN ('2025-08-01'),
+    PARTITION p202508 VALUES LESS THAN ('2025-09-01'),
+    PARTITION p202509 VALUES LESS THAN ('2025-10-01'),
+    PARTITION p202510 VALUES LESS THAN ('2025-11-01'),
+    PARTITION p202511 VALUES LESS THAN ('2025-12-01'),
+    PARTITION p202512 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p202601 VALUES LESS THAN ('2026-02-01'),
+    PARTITION p202602 VALUES LESS THAN ('2026-03-01'),
+    PARTITION p202603 VALUES LESS THAN ('2026-04-01'),
+    PARTITION p202604 VALUES LESS THAN ('2026-05-01'),
+    PARTITION p202605 VALUES LESS THAN ('2026-06-01'),
+    PARTITION p202606 VALUES LESS THAN ('2026-07-01'),
+    PARTITION p202607 VALUES LESS THAN ('2026-08-01'),
+    PARTITION p202608 VALUES LESS THAN ('2026-09-01'),
+    PARTITION p202609 VALUES LESS THAN ('2026-10-01'),
+    PARTITION p202610 VALUES LESS THAN ('2026-11-01'),
+    PARTITION p202611 VALUES LESS THAN ('2026-12-01'),
+    PARTITION p202612 VALUES LESS THAN ('2027-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- Compressed cold storage for Transactions partitions past the retention
+-- window (moved by services/partitions.py). Same columns as Transactions.
+CREATE TABLE TransactionsArchive (
+    transaction_id INT NOT NULL PRIMARY KEY,
+    account_id INT NOT NULL,
+    transaction_date DATETIME NOT NULL,
+    settlement_date DATETIME,
+    merchant_key INT NOT NULL,
+    category_key SMALLINT UNSIGNED,
+    transaction_amount DECIMAL(12, 2) NOT NULL,
+    transaction_type ENUM('Purchase', 'Payment', 'Fee', 'Credit', 'Refund', 'Adjustment', 'Cash Advance') NOT NULL,
+    transaction_reference VARCHAR(100),
+    transaction_status ENUM('Pending', 'Completed', 'Declined', 'Disputed') NOT NULL,
+    currency VARCHAR(3),
+    exchange_rate DECIMAL(10, 6),
+    description TEXT,
+    INDEX idx_archive_account_date (account_id, transaction_date)
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
@@ -0,0 +1,23 @@
+-- Multi-currency statements (services/fx.py)
+-- * Accounts.billing_currency: the currency statements are totalled in
+-- * FxRates: SGD value of one unit of each currency, by date
+-- Existing accounts default to SGD; set billing_currency for accounts billed
+-- in another currency.
+
+USE DBS_CreditCard;
+
+ALTER TABLE Accounts
+    ADD COLUMN billing_currency CHAR(3) NOT NULL DEFAULT 'SGD' AFTER available_credit;
+
+-- FX rates: the value of one unit of each currency in SGD, by date. Statements
+-- convert foreign currency transactions with the latest rate on or before the
+-- cycle's last day (services/fx.py)
+CREATE TABLE FxRates (
+    currency CHAR(3) NOT NULL,
+    rate_date DATE NOT NULL,
+    rate_to_base DECIMAL(20, 10) NOT NULL,
+    PRIMARY KEY (currency, rate_date)
+) ENGINE=InnoDB;
+
+-- Load rates for every currency in Transactions before generating statements;
+-- a statement with a currency that has no rate fails rather than mixing currencies.
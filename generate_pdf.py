@@ -1,26 +1,59 @@
-from flask import Flask, request, send_file, render_template, jsonify, abort
+from flask import Flask, request, send_file, render_template, jsonify, abort, Response, url_for
 import pymysql
-from weasyprint import HTML
-from datetime import datetime
+from whitenoise import WhiteNoise
+from datetime import datetime, timedelta
 import io
 import os
-import logging
+import json
+import hashlib
 import configparser
+import uuid
+import zipfile
 from decimal import Decimal
+from functools import lru_cache
+from markupsafe import escape
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("statement_web_app.log"),
-        logging.StreamHandler()
-    ]
+from services import db_routing, dimensions, fx, render_pool, spending
+from services.admission import AdmissionController, AdmissionRejected, check_thread_budget
+from services.logging_config import configure_logging, request_id_var
+from services.statement_archive import StatementArchive
+
+# Set up logging. Records go through a queue to a background thread that writes
+# JSON lines to stderr and to LOG_FILE (opened on the first record). Every
+# worker appends to the same file, so it is rotated externally (logrotate);
+# set STATEMENT_LOG_FILE to an empty string to log to stderr only.
+LOG_FILE = os.environ.get('STATEMENT_LOG_FILE', "statement_web_app.log")
+LOG_SUCCESS_SAMPLE_RATE = 0.1  # fraction of routine success lines kept
+
+logger = configure_logging(
+    "statement_web_app",
+    LOG_FILE,
+    sample_rate=LOG_SUCCESS_SAMPLE_RATE
 )
-logger = logging.getLogger("statement_web_app")
 
 app = Flask(__name__)
 
+# Pre-built static pages and assets (see build_static.py)
+STATIC_DIST_DIR = os.path.join(app.root_path, 'static', 'dist')
+STATIC_PAGES = {
+    'home': 'first.html',
+    'credit_cards': 'index.html',
+    'login': 'login.html',
+    'signup': 'signup.html'
+}
+PAGE_MAX_AGE = 300  # seconds; pages revalidate via ETag, assets are immutable
+
+# Fingerprinted assets never change under the same URL, so WhiteNoise serves
+# them (and their .br/.gz variants) with far-future immutable cache headers.
+# The dist root is only registered once build_static.py has created it.
+app.wsgi_app = WhiteNoise(
+    app.wsgi_app,
+    max_age=PAGE_MAX_AGE,
+    immutable_file_test=r'\.[0-9a-f]{12}\.(css|js)$'
+)
+if os.path.isdir(STATIC_DIST_DIR):
+    app.wsgi_app.add_files(STATIC_DIST_DIR, prefix='static/dist/')
+
 # Load configuration
 def load_config():
     config = configparser.ConfigParser()
@@ -32,19 +65,108 @@ def load_config():
             'DB_HOST': config.get('Database', 'DB_HOST', fallback='localhost'),
             'DB_USER': config.get('Database', 'DB_USER', fallback='root'),
             'DB_PASSWORD': config.get('Database', 'DB_PASSWORD', fallback='root'),
-            'DB_NAME': config.get('Database', 'DB_NAME', fallback='DBS_CreditCard')
+            'DB_NAME': config.get('Database', 'DB_NAME', fallback='DBS_CreditCard'),
+            'DB_PORT': config.getint('Database', 'DB_PORT', fallback=3306),
+            'DB_REPLICAS': config.get('Database', 'DB_REPLICAS', fallback=''),
+            'DB_REPLICA_MAX_LAG': config.getint('Database', 'DB_REPLICA_MAX_LAG', fallback=30),
+            'DB_REPLICA_RETRY_AFTER': config.getint('Database', 'DB_REPLICA_RETRY_AFTER', fallback=30),
+            'ARCHIVE_DIR': config.get('Archive', 'ARCHIVE_DIR', fallback='statements/archive'),
+            'ARCHIVE_COMPRESS': config.getboolean('Archive', 'ARCHIVE_COMPRESS', fallback=False),
+            'RENDER_CONCURRENCY': config.getint('Admission', 'RENDER_CONCURRENCY', fallback=2),
+            'RENDER_QUEUE_LIMIT': config.getint('Admission', 'RENDER_QUEUE_LIMIT', fallback=2),
+            'RENDER_QUEUE_TIMEOUT': config.getfloat('Admission', 'RENDER_QUEUE_TIMEOUT', fallback=10.0),
+            'API_CONCURRENCY': config.getint('Admission', 'API_CONCURRENCY', fallback=1),
+            'API_QUEUE_LIMIT': config.getint('Admission', 'API_QUEUE_LIMIT', fallback=1),
+            'API_QUEUE_TIMEOUT': config.getfloat('Admission', 'API_QUEUE_TIMEOUT', fallback=2.0),
+            'CUSTOMER_RENDERS_PER_MINUTE': config.getfloat('Admission', 'CUSTOMER_RENDERS_PER_MINUTE', fallback=6),
+            'CUSTOMER_RENDER_BURST': config.getint('Admission', 'CUSTOMER_RENDER_BURST', fallback=3),
+            'RESERVED_THREADS': config.getint('Admission', 'RESERVED_THREADS', fallback=2),
+            'SMTP_HOST': config.get('Delivery', 'SMTP_HOST', fallback='localhost'),
+            'SMTP_PORT': config.getint('Delivery', 'SMTP_PORT', fallback=1025),
+            'SMTP_USER': config.get('Delivery', 'SMTP_USER', fallback=''),
+            'SMTP_PASSWORD': config.get('Delivery', 'SMTP_PASSWORD', fallback=''),
+            'SMTP_STARTTLS': config.getboolean('Delivery', 'SMTP_STARTTLS', fallback=False),
+            'SMTP_CONNECTIONS': config.getint('Delivery', 'SMTP_CONNECTIONS', fallback=8),
+            'SMTP_MESSAGES_PER_CONNECTION': config.getint('Delivery', 'SMTP_MESSAGES_PER_CONNECTION', fallback=100),
+            'DELIVERY_SENDER': config.get('Delivery', 'DELIVERY_SENDER', fallback='DBS Bank <statements@localhost>')
         }
     else:
         # Use defaults if config file doesn't exist
-        logger.warning(f"Config file {config_file} not found. Using default values.")
+        logger.warning("Config file %s not found. Using default values.", config_file)
         return {
             'DB_HOST': 'localhost',
             'DB_USER': 'root',
             'DB_PASSWORD': 'root',
-            'DB_NAME': 'DBS_CreditCard'
+            'DB_NAME': 'DBS_CreditCard',
+            'DB_PORT': 3306,
+            'DB_REPLICAS': '',
+            'DB_REPLICA_MAX_LAG': 30,
+            'DB_REPLICA_RETRY_AFTER': 30,
+            'ARCHIVE_DIR': 'statements/archive',
+            'ARCHIVE_COMPRESS': False,
+            'RENDER_CONCURRENCY': 2,
+            'RENDER_QUEUE_LIMIT': 2,
+            'RENDER_QUEUE_TIMEOUT': 10.0,
+            'API_CONCURRENCY': 1,
+            'API_QUEUE_LIMIT': 1,
+            'API_QUEUE_TIMEOUT': 2.0,
+            'CUSTOMER_RENDERS_PER_MINUTE': 6,
+            'CUSTOMER_RENDER_BURST': 3,
+            'RESERVED_THREADS': 2,
+            'SMTP_HOST': 'localhost',
+            'SMTP_PORT': 1025,
+            'SMTP_USER': '',
+            'SMTP_PASSWORD': '',
+            'SMTP_STARTTLS': False,
+            'SMTP_CONNECTIONS': 8,
+            'SMTP_MESSAGES_PER_CONNECTION': 100,
+            'DELIVERY_SENDER': 'DBS Bank <statements@localhost>'
         }
 
-config = load_config()
+@lru_cache(maxsize=None)
+def get_config():
+    """Return the application configuration, loading it on first use."""
+    return load_config()
+
+@lru_cache(maxsize=None)
+def get_archive():
+    """Return the statement archive, opening it on first use."""
+    config = get_config()
+    return StatementArchive(config['ARCHIVE_DIR'], compress=config['ARCHIVE_COMPRESS'])
+
+def admission_limits(config):
+    """Route class -> (max_concurrent, max_queue, queue_timeout) from the [Admission] config."""
+    return {
+        'render': (config['RENDER_CONCURRENCY'], config['RENDER_QUEUE_LIMIT'], config['RENDER_QUEUE_TIMEOUT']),
+        'api': (config['API_CONCURRENCY'], config['API_QUEUE_LIMIT'], config['API_QUEUE_TIMEOUT'])
+    }
+
+@lru_cache(maxsize=None)
+def get_admission():
+    """Return this process's admission controller, created on first use."""
+    config = get_config()
+    return AdmissionController(
+        admission_limits(config),
+        customer_rate_per_minute=config['CUSTOMER_RENDERS_PER_MINUTE'],
+        customer_burst=config['CUSTOMER_RENDER_BURST']
+    )
+
+def check_worker_threads(threads):
+    """Raise ValueError if limited routes could occupy all of a worker's request threads."""
+    config = get_config()
+    check_thread_budget(threads, admission_limits(config), config['RESERVED_THREADS'])
+
+def parse_period(period):
+    """Parse a 'YYYY-MM' statement period into its [start, end) datetimes.
+
+    Raises ValueError for malformed periods.
+    """
+    start = datetime.strptime(period, '%Y-%m')
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
 
 # Translations dictionary
 translations = {
@@ -69,9 +191,15 @@ translations = {
         'total_fees': 'Total Fees',
         'total_credits': 'Total Credits',
         'current_balance': 'Current Balance',
+        'reward_points': 'Reward Points',
+        'tier_level': 'Rewards Tier',
         'transaction_details': 'Transaction Details',
         'footer_text': 'This statement is for informational purposes only. For questions or concerns, please contact our customer service.',
         'copyright': '© {year} DBS Bank. All rights reserved.',
+        'previous_page': 'Previous',
+        'next_page': 'Next',
+        'page_of': 'Page {page} of {pages}',
+        'download_pdf': 'Download PDF',
         'html_dir': 'ltr',  # left-to-right
         'font_family': 'Helvetica, Arial, sans-serif'
     },
@@ -96,9 +224,15 @@ translations = {
         'total_fees': '总费用',
         'total_credits': '总退款',
         'current_balance': '当前余额',
+        'reward_points': '奖励积分',
+        'tier_level': '奖励等级',
         'transaction_details': '交易明细',
         'footer_text': '此对账单仅供参考。如有疑问或顾虑，请联系我们的客户服务。',
         'copyright': '© {year} 星展银行。保留所有权利。',
+        'previous_page': '上一页',
+        'next_page': '下一页',
+        'page_of': '第 {page} 页，共 {pages} 页',
+        'download_pdf': '下载 PDF',
         'html_dir': 'ltr',
         'font_family': '"Noto Sans SC", Helvetica, Arial, sans-serif'
     },
@@ -123,9 +257,15 @@ translations = {
         'total_fees': 'Jumlah Yuran',
         'total_credits': 'Jumlah Kredit',
         'current_balance': 'Baki Semasa',
+        'reward_points': 'Mata Ganjaran',
+        'tier_level': 'Peringkat Ganjaran',
         'transaction_details': 'Butiran Transaksi',
         'footer_text': 'Penyata ini adalah untuk tujuan maklumat sahaja. Untuk pertanyaan atau kebimbangan, sila hubungi perkhidmatan pelanggan kami.',
         'copyright': '© {year} Bank DBS. Hak cipta terpelihara.',
+        'previous_page': 'Sebelumnya',
+        'next_page': 'Seterusnya',
+        'page_of': 'Halaman {page} daripada {pages}',
+        'download_pdf': 'Muat Turun PDF',
         'html_dir': 'ltr',
         'font_family': 'Helvetica, Arial, sans-serif'
     },
@@ -150,9 +290,15 @@ translations = {
         'total_fees': 'மொத்த கட்டணங்கள்',
         'total_credits': 'மொத்த வரவுகள்',
         'current_balance': 'தற்போதைய இருப்பு',
+        'reward_points': 'வெகுமதி புள்ளிகள்',
+        'tier_level': 'வெகுமதி நிலை',
         'transaction_details': 'பரிவர்த்தனை விவரங்கள்',
         'footer_text': 'இந்த அறிக்கை தகவல் நோக்கங்களுக்காக மட்டுமே. கேள்விகள் அல்லது கவலைகளுக்கு, எங்கள் வாடிக்கையாளர் சேவையைத் தொடர்பு கொள்ளவும்.',
         'copyright': '© {year} DBS வங்கி. அனைத்து உரிமைகளும் பாதுகாக்கப்பட்டவை.',
+        'previous_page': 'முந்தைய',
+        'next_page': 'அடுத்து',
+        'page_of': 'பக்கம் {page} / {pages}',
+        'download_pdf': 'PDF பதிவிறக்கு',
         'html_dir': 'ltr',
         'font_family': '"Noto Sans Tamil", Helvetica, Arial, sans-serif'
     }
@@ -167,71 +313,178 @@ class DatabaseConnection:
         self.db_user = config['DB_USER']
         self.db_password = config['DB_PASSWORD']
         self.db_name = config['DB_NAME']
+        self.db_port = config.get('DB_PORT', 3306)
+
+        # Read-only statement and preview queries are spread over the replicas
+        replicas = db_routing.parse_replicas(config.get('DB_REPLICAS'))
+        self.replica_router = db_routing.get_router(
+            replicas,
+            max_lag=config.get('DB_REPLICA_MAX_LAG', db_routing.DEFAULT_MAX_LAG),
+            retry_after=config.get('DB_REPLICA_RETRY_AFTER', db_routing.DEFAULT_RETRY_AFTER)
+        ) if replicas else None
+
+    def connect(self, host=None, port=None):
+        """Open a new connection returning rows as dictionaries.
+
+        Connects to the primary unless a replica host and port are given.
+        """
+        return pymysql.connect(
+            host=host or self.db_host,
+            port=port or self.db_port,
+            user=self.db_user,
+            password=self.db_password,
+            database=self.db_name,
+            cursorclass=pymysql.cursors.DictCursor  # Return results as dictionaries
+        )
+
+    def connect_for_read(self, read_your_writes=False):
+        """Open a connection for read-only queries.
+
+        Uses the next healthy replica, or the primary when no replicas are
+        configured, none is usable, or the caller must see its own writes.
+        """
+        if self.replica_router and not read_your_writes:
+            connection, _ = self.replica_router.acquire(self.connect)
+            if connection:
+                return connection
+        return self.connect()
 
-    def fetch_customer_data(self, customer_id):
-        """Fetch customer details and transactions from database."""
+    def fetch_customer_data(self, customer_id, period=None, read_your_writes=False):
+        """Fetch customer details and transactions from database.
+
+        period ('YYYY-MM') limits transactions to that statement month.
+        Reads go to a replica unless read_your_writes is set. Raises
+        fx.MissingRateError when a transaction's currency has no FX rate for
+        the cycle.
+        """
         connection = None
         try:
-            connection = pymysql.connect(
-                host=self.db_host,
-                user=self.db_user,
-                password=self.db_password,
-                database=self.db_name,
-                cursorclass=pymysql.cursors.DictCursor  # Return results as dictionaries
-            )
+            connection = self.connect_for_read(read_your_writes)
             
             with connection.cursor() as cursor:
                 # Query to fetch customer details
                 cursor.execute("""
                     SELECT customer_id, first_name, last_name, email, 
                            COALESCE(phone, 'N/A') as phone, 
-                           COALESCE(address, 'N/A') as address 
+                           COALESCE(address, 'N/A') as address,
+                           COALESCE(preferred_language, 'en') as preferred_language
                     FROM Customers 
                     WHERE customer_id = %s
                 """, (customer_id,))
                 customer = cursor.fetchone()
 
                 if not customer:
-                    logger.warning(f"No customer found with ID {customer_id}")
+                    logger.warning("No customer found", extra={'customer_id': customer_id})
                     return None, None, None
                 
-                # Query to fetch account details
+                # Query to fetch account details with the rewards summary
+                # (maintained by services/rewards.py)
                 cursor.execute("""
-                    SELECT account_id, account_number, account_type, 
-                           card_number, credit_limit 
-                    FROM Accounts 
-                    WHERE customer_id = %s
+                    SELECT a.account_id, a.account_number, a.account_type, 
+                           a.card_number, a.credit_limit, a.billing_currency,
+                           COALESCE(r.reward_points, 0) as reward_points,
+                           COALESCE(r.tier_level, 'Standard') as tier_level
+                    FROM Accounts a
+                    LEFT JOIN Rewards r ON r.account_id = a.account_id
+                    WHERE a.customer_id = %s
                 """, (customer_id,))
                 account = cursor.fetchone()
                 
                 if not account:
-                    logger.warning(f"No account found for customer ID {customer_id}")
+                    logger.warning("No account found for customer", extra={'customer_id': customer_id})
                     return customer, None, None
 
-                # Query to fetch transactions for the customer
-                cursor.execute("""
+                # Query to fetch transactions for the customer; merchant and
+                # category names are resolved from the in-process intern tables
+                params = [account['account_id']]
+                period_filter = ""
+                if period:
+                    period_filter = "AND t.transaction_date >= %s AND t.transaction_date < %s"
+                    params.extend(parse_period(period))
+
+                cursor.execute(f"""
                     SELECT 
                         t.transaction_id,
                         t.transaction_date, 
-                        t.merchant_name, 
+                        t.merchant_key, 
+                        t.category_key,
                         t.transaction_amount, 
                         t.transaction_type,
-                        COALESCE(t.category, 'General') as category
+                        t.currency
                     FROM Transactions t
-                    WHERE t.account_id = %s
+                    WHERE t.account_id = %s {period_filter}
                     ORDER BY t.transaction_date DESC
-                """, (account['account_id'],))
-                transactions = cursor.fetchall()
+                """, params)
+                transactions = dimensions.attach_names(connection, cursor.fetchall())
+
+                # Convert to the billing currency with the rates of the cycle's last day
+                as_of = parse_period(period)[1] - timedelta(days=1) if period else datetime.today()
+                rates = fx.rate_cache.get(connection, as_of)
+                fx.normalise(transactions, account['billing_currency'], rates)
 
                 return customer, account, transactions
 
         except pymysql.MySQLError as e:
-            logger.error(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return None, None, None
         finally:
             if connection:
                 connection.close()
 
+    def fetch_spending(self, customer_id, months=spending.DEFAULT_MONTHS, read_your_writes=False):
+        """Fetch a customer's spending summary for the last months months.
+
+        Reads only the SpendingRollup table. Returns None when the customer
+        does not exist.
+        """
+        connection = None
+        try:
+            connection = self.connect_for_read(read_your_writes)
+
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT customer_id FROM Customers WHERE customer_id = %s", (customer_id,))
+                if not cursor.fetchone():
+                    return None
+
+                cursor.execute(spending.SPENDING_SQL, (customer_id, spending.window_start(months)))
+                return spending.summarise(cursor.fetchall())
+        finally:
+            if connection:
+                connection.close()
+
+
+# WeasyPrint output options. WeasyPrint's defaults already give the smallest
+# output for these documents: fonts are subset without hinting and object
+# streams are compressed, and statements carry no raster images to optimise.
+# Each preset only lists options that change the output.
+PDF_PRESETS = {
+    'standard': {},
+    'print': {
+        'hinting': True  # keep TrueType hinting in the font subsets for print rasterisers
+    }
+}
+DEFAULT_PDF_PRESET = 'standard'
+
+# WeasyPrint layout time grows faster than linearly with table length, so
+# statements with at least CHUNKED_RENDER_MIN_ROWS transactions are split
+# into CHUNK_ROWS-row documents (keep it even so row striping lines up),
+# rendered in parallel in the render pool and merged
+CHUNKED_RENDER_MIN_ROWS = int(os.environ.get('STATEMENT_CHUNKED_MIN_ROWS', 2000))
+CHUNK_ROWS = int(os.environ.get('STATEMENT_CHUNK_ROWS', 500))
+
+# Page number margin box, shared by statements and the overlay stamped on
+# merged chunked statements
+PAGE_NUMBER_BOX = """@top-right {
+                        content: "Page " counter(page) " of " counter(pages);
+                        font-size: 9pt;
+                    }"""
+
+# HTML statement preview (/statement/preview)
+PREVIEW_PAGE_SIZE = 100
+PREVIEW_MAX_PAGE_SIZE = 500
+PREVIEW_STREAM_ROWS = 50  # transaction rows per streamed piece
+PREVIEW_CLOSED_MAX_AGE = 3600  # seconds; closed periods never change
+PREVIEW_ETAG_VERSION = '1'  # bump when the statement template changes
 
 class StatementGenerator:
     """Generates credit card statements in PDF format."""
@@ -241,7 +494,11 @@ class StatementGenerator:
         pass
     
     def calculate_totals(self, transactions):
-        """Calculate transaction totals by type."""
+        """Calculate transaction totals by type.
+
+        Uses billing_amount (the amount in the account's billing currency)
+        when the row has been normalised by services/fx.py.
+        """
         totals = {
             'purchases': Decimal('0.00'),
             'payments': Decimal('0.00'),
@@ -250,7 +507,7 @@ class StatementGenerator:
         }
         
         for transaction in transactions:
-            amount = Decimal(str(transaction['transaction_amount']))
+            amount = Decimal(str(transaction.get('billing_amount', transaction['transaction_amount'])))
             t_type = transaction['transaction_type'].lower()
             
             if t_type == 'purchase':
@@ -267,284 +524,528 @@ class StatementGenerator:
         
         return totals
     
-    def format_currency(self, amount):
-        """Format amount as currency string."""
+    def format_currency(self, amount, currency=None):
+        """Format amount as currency string, prefixed with the currency code when given."""
+        if currency:
+            digits = fx.minor_digits(currency)
+            sign = "-" if amount < 0 else ""
+            return f"{sign}{currency} {abs(amount):,.{digits}f}"
         if amount < 0:
             return f"-${abs(amount):,.2f}"
         return f"${amount:,.2f}"
     
-    def generate_statement_pdf(self, customer, account, transactions, language='en'):
-        """Generate a professional PDF statement in the specified language."""
-        try:
-            if not customer or not transactions:
-                logger.error("Insufficient data to generate statement")
-                return None
-            
-            # Use default language (English) as fallback
-            if language not in translations:
-                language = 'en'
-                logger.warning(f"Language {language} not supported, falling back to English")
-                
-            text = translations[language]
-            statement_date = datetime.today()
-            date_str = statement_date.strftime('%B %d, %Y')
-            
-            # Calculate transaction totals
+    def transaction_row_html(self, transaction, billing_currency):
+        """One row of the transaction table; database values are HTML-escaped."""
+        transaction_date = transaction['transaction_date'].strftime('%Y-%m-%d')
+        merchant_name = escape(transaction['merchant_name'])
+        amount = escape(self.format_currency(transaction.get('billing_amount', transaction['transaction_amount']),
+                                             billing_currency))
+        currency = transaction.get('currency')
+        original_html = ""
+        if billing_currency and currency and currency != billing_currency:
+            # Foreign currency transaction: show the original amount too
+            original = escape(self.format_currency(transaction['transaction_amount'], currency))
+            original_html = f'<br><span class="original-amount">{original}</span>'
+        transaction_type = transaction['transaction_type']
+        category = escape(transaction.get('category', 'General'))
+        
+        # Style debit/credit amounts differently
+        amount_class = "debit" if transaction_type.lower() in ['purchase', 'fee'] else "credit"
+        
+        return f"""
+            <tr>
+                <td>{transaction_date}</td>
+                <td>{merchant_name}</td>
+                <td>{category}</td>
+                <td>{escape(transaction_type)}</td>
+                <td class="{amount_class}">{amount}{original_html}</td>
+            </tr>
+            """
+
+    def build_statement_html(self, customer, account, transactions, language='en', totals=None,
+                             first=True, last=True, page_numbers=True):
+        """Build the statement HTML document in the specified language.
+
+        totals may be passed in when several documents share one aggregation.
+        first/last include the header and summary, and the totals and footer.
+        Chunks of a long statement render without page_numbers; those are
+        stamped on after the chunks are merged.
+        """
+        # Calculate transaction totals
+        if totals is None:
             totals = self.calculate_totals(transactions)
+
+        head, tail = self.statement_html_frame(customer, account, language, totals, first, last, page_numbers)
+        billing_currency = account.get('billing_currency')
+        transactions_html = "".join(self.transaction_row_html(t, billing_currency) for t in transactions)
+        return head + transactions_html + tail
+
+    def stream_statement_html(self, customer, account, transactions, language='en', totals=None,
+                              nav_html="", rows_per_piece=PREVIEW_STREAM_ROWS):
+        """Return an iterator over the statement HTML in pieces, for a streamed response.
+
+        The document is the PDF statement without page numbers, with nav_html
+        below the transaction table. The frame is built before returning, so
+        errors surface before the response starts.
+        """
+        if totals is None:
+            totals = self.calculate_totals(transactions)
+
+        head, tail = self.statement_html_frame(customer, account, language, totals, page_numbers=False,
+                                               nav_html=nav_html)
+        billing_currency = account.get('billing_currency')
+
+        def pieces():
+            yield head
+            for start in range(0, len(transactions), rows_per_piece):
+                yield "".join(self.transaction_row_html(t, billing_currency)
+                              for t in transactions[start:start + rows_per_piece])
+            yield tail
+
+        return pieces()
+
+    def statement_html_frame(self, customer, account, language, totals, first=True, last=True,
+                             page_numbers=True, nav_html=""):
+        """The statement document around its transaction rows, as (head, tail).
+
+        Customer and account values come from the database and are
+        HTML-escaped; nav_html is inserted as given.
+        """
+        # Use default language (English) as fallback
+        if language not in translations:
+            logger.warning("Language %s not supported, falling back to English", language)
+            language = 'en'
             
-            # Build transaction rows HTML
-            transactions_html = ""
-            for transaction in transactions:
-                transaction_date = transaction['transaction_date'].strftime('%Y-%m-%d')
-                merchant_name = transaction['merchant_name']
-                amount = self.format_currency(transaction['transaction_amount'])
-                transaction_type = transaction['transaction_type']
-                category = transaction.get('category', 'General')
-                
-                # Style debit/credit amounts differently
-                amount_class = "debit" if transaction_type.lower() in ['purchase', 'fee'] else "credit"
-                
-                transactions_html += f"""
-                <tr>
-                    <td>{transaction_date}</td>
-                    <td>{merchant_name}</td>
-                    <td>{category}</td>
-                    <td>{transaction_type}</td>
-                    <td class="{amount_class}">{amount}</td>
-                </tr>
-                """
-
-            # Create the HTML template for the statement
-            html_content = f"""
-            <!DOCTYPE html>
-            <html lang="{language}" dir="{text['html_dir']}">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>{text['statement_title']}</title>
-                <style>
-                    @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC&family=Noto+Sans+Tamil&display=swap');
-                    @page {{
-                        size: letter;
-                        margin: 2cm;
-                        @top-right {{
-                            content: "Page " counter(page) " of " counter(pages);
-                            font-size: 9pt;
-                        }}
-                    }}
-                    body {{
-                        font-family: {text['font_family']};
-                        font-size: 10pt;
-                        line-height: 1.6;
-                        color: #333333;
-                    }}
-                    .header {{
-                        border-bottom: 2px solid #0066b3;
-                        padding-bottom: 10px;
-                        margin-bottom: 20px;
-                    }}
-                    .logo {{
-                        font-size: 24pt;
-                        font-weight: bold;
-                        color: #0066b3;
-                    }}
-                    .statement-title {{
-                        font-size: 18pt;
-                        margin-top: 0;
-                        color: #333333;
-                    }}
-                    .customer-info {{
-                        margin-bottom: 30px;
-                    }}
-                    .account-summary {{
-                        background-color: #f7f7f7;
-                        border: 1px solid #e0e0e0;
-                        border-radius: 5px;
-                        padding: 15px;
-                        margin-bottom: 20px;
-                    }}
-                    .summary-title {{
-                        font-size: 14pt;
-                        font-weight: bold;
-                        margin-top: 0;
-                        margin-bottom: 10px;
-                        color: #0066b3;
-                    }}
-                    .info-grid {{
-                        display: grid;
-                        grid-template-columns: 1fr 1fr;
-                        gap: 15px;
-                    }}
-                    .info-item {{
-                        margin-bottom: 5px;
-                    }}
-                    .label {{
-                        font-weight: bold;
-                        color: #555555;
-                    }}
-                    table {{
-                        width: 100%;
-                        border-collapse: collapse;
-                        margin-top: 20px;
-                        font-size: 9pt;
-                    }}
-                    th, td {{
-                        border: 1px solid #e0e0e0;
-                        padding: 8px;
-                        text-align: left;
-                    }}
-                    th {{
-                        background-color: #0066b3;
-                        color: white;
-                        font-weight: normal;
-                    }}
-                    tr:nth-child(even) {{
-                        background-color: #f9f9f9;
-                    }}
-                    .debit {{
-                        color: #d9534f;
-                    }}
-                    .credit {{
-                        color: #5cb85c;
-                    }}
-                    .totals {{
-                        margin-top: 20px;
-                        border: 1px solid #e0e0e0;
-                        border-radius: 5px;
-                        padding: 15px;
-                        background-color: #f7f7f7;
-                    }}
-                    .totals-table {{
-                        width: 350px;
-                        margin-left: auto;
-                        border: none;
-                    }}
-                    .totals-table td {{
-                        border: none;
-                        padding: 3px 0;
-                    }}
-                    .totals-table .total-row {{
-                        font-weight: bold;
-                        font-size: 12pt;
-                        border-top: 1px solid #e0e0e0;
-                        padding-top: 8px;
-                    }}
-                    .footer {{
-                        margin-top: 30px;
-                        font-size: 9pt;
-                        color: #777777;
-                        text-align: center;
-                        border-top: 1px solid #e0e0e0;
-                        padding-top: 10px;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="header">
-                    <div class="logo">DBS Bank</div>
-                    <h1 class="statement-title">{text['statement_title']}</h1>
+        text = translations[language]
+        billing_currency = account.get('billing_currency')
+        statement_date = datetime.today()
+        date_str = statement_date.strftime('%B %d, %Y')
+
+        def money(amount):
+            return escape(self.format_currency(amount, billing_currency))
+
+        intro_html = ""
+        if first:
+            intro_html = f"""
+            <div class="header">
+                <div class="logo">DBS Bank</div>
+                <h1 class="statement-title">{text['statement_title']}</h1>
+            </div>
+            
+            <div class="customer-info info-grid">
+                <div>
+                    <div class="info-item">
+                        <span class="label">{text['customer']}:</span> {escape(customer['first_name'])} {escape(customer['last_name'])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">ID:</span> {escape(customer['customer_id'])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['email']}:</span> {escape(customer['email'])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['phone']}:</span> {escape(customer['phone'])}
+                    </div>
                 </div>
-                
-                <div class="customer-info info-grid">
-                    <div>
-                        <div class="info-item">
-                            <span class="label">{text['customer']}:</span> {customer['first_name']} {customer['last_name']}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">ID:</span> {customer['customer_id']}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['email']}:</span> {customer['email']}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['phone']}:</span> {customer['phone']}
-                        </div>
+                <div>
+                    <div class="info-item">
+                        <span class="label">{text['statement_date']}:</span> {date_str}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['account_number']}:</span> {escape(account['account_number'])}
                     </div>
-                    <div>
-                        <div class="info-item">
-                            <span class="label">{text['statement_date']}:</span> {date_str}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['account_number']}:</span> {account['account_number']}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['card_number']}:</span> {'XXXX-XXXX-XXXX-' + account['card_number'][-4:]}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['credit_limit']}:</span> {self.format_currency(account['credit_limit'])}
-                        </div>
+                    <div class="info-item">
+                        <span class="label">{text['card_number']}:</span> XXXX-XXXX-XXXX-{escape(account['card_number'][-4:])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['credit_limit']}:</span> {money(account['credit_limit'])}
                     </div>
                 </div>
-                
-                <div class="account-summary">
-                    <h2 class="summary-title">{text['account_summary']}</h2>
-                    <div class="info-grid">
-                        <div class="info-item">
-                            <span class="label">{text['total_purchases']}:</span> {self.format_currency(totals['purchases'])}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['total_payments']}:</span> {self.format_currency(totals['payments'])}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['total_fees']}:</span> {self.format_currency(totals['fees'])}
-                        </div>
-                        <div class="info-item">
-                            <span class="label">{text['total_credits']}:</span> {self.format_currency(totals['credits'])}
-                        </div>
+            </div>
+            
+            <div class="account-summary">
+                <h2 class="summary-title">{text['account_summary']}</h2>
+                <div class="info-grid">
+                    <div class="info-item">
+                        <span class="label">{text['total_purchases']}:</span> {money(totals['purchases'])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['total_payments']}:</span> {money(totals['payments'])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['total_fees']}:</span> {money(totals['fees'])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['total_credits']}:</span> {money(totals['credits'])}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['reward_points']}:</span> {account.get('reward_points', 0):,}
+                    </div>
+                    <div class="info-item">
+                        <span class="label">{text['tier_level']}:</span> {escape(account.get('tier_level', 'Standard'))}
                     </div>
                 </div>
-                
-                <h2 class="summary-title">{text['transaction_details']}</h2>
-                <table>
-                    <thead>
-                        <tr>
-                            <th>{text['date']}</th>
-                            <th>{text['merchant']}</th>
-                            <th>{text['category']}</th>
-                            <th>{text['transaction_type']}</th>
-                            <th>{text['amount']}</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {transactions_html}
-                    </tbody>
+            </div>
+            
+            <h2 class="summary-title">{text['transaction_details']}</h2>
+            """
+
+        closing_html = ""
+        if last:
+            closing_html = f"""
+            <div class="totals">
+                <table class="totals-table">
+                    <tr>
+                        <td class="label">{text['total_purchases']}:</td>
+                        <td class="debit">{money(totals['purchases'])}</td>
+                    </tr>
+                    <tr>
+                        <td class="label">{text['total_fees']}:</td>
+                        <td class="debit">{money(totals['fees'])}</td>
+                    </tr>
+                    <tr>
+                        <td class="label">{text['total_payments']}:</td>
+                        <td class="credit">{money(totals['payments'])}</td>
+                    </tr>
+                    <tr>
+                        <td class="label">{text['total_credits']}:</td>
+                        <td class="credit">{money(totals['credits'])}</td>
+                    </tr>
+                    <tr class="total-row">
+                        <td class="label">{text['current_balance']}:</td>
+                        <td class="{'debit' if totals['net_total'] > 0 else 'credit'}">{money(totals['net_total'])}</td>
+                    </tr>
                 </table>
-                
-                <div class="totals">
-                    <table class="totals-table">
-                        <tr>
-                            <td class="label">{text['total_purchases']}:</td>
-                            <td class="debit">{self.format_currency(totals['purchases'])}</td>
-                        </tr>
-                        <tr>
-                            <td class="label">{text['total_fees']}:</td>
-                            <td class="debit">{self.format_currency(totals['fees'])}</td>
-                        </tr>
-                        <tr>
-                            <td class="label">{text['total_payments']}:</td>
-                            <td class="credit">{self.format_currency(totals['payments'])}</td>
-                        </tr>
-                        <tr>
-                            <td class="label">{text['total_credits']}:</td>
-                            <td class="credit">{self.format_currency(totals['credits'])}</td>
-                        </tr>
-                        <tr class="total-row">
-                            <td class="label">{text['current_balance']}:</td>
-                            <td class="{'debit' if totals['net_total'] > 0 else 'credit'}">{self.format_currency(totals['net_total'])}</td>
-                        </tr>
-                    </table>
-                </div>
-                
-                <div class="footer">
-                    <p>{text['footer_text']}</p>
-                    <p>{text['copyright'].format(year=datetime.today().year)}</p>
-                </div>
-            </body>
-            </html>
+            </div>
+            
+            <div class="footer">
+                <p>{text['footer_text']}</p>
+                <p>{text['copyright'].format(year=datetime.today().year)}</p>
+            </div>
             """
 
-            # Generate PDF from HTML
-            pdf = HTML(string=html_content).write_pdf()
+        # Create the HTML template for the statement
+        head = f"""
+        <!DOCTYPE html>
+        <html lang="{language}" dir="{text['html_dir']}">
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>{text['statement_title']}</title>
+            <style>
+                @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC&family=Noto+Sans+Tamil&display=swap');
+                @page {{
+                    size: letter;
+                    margin: 2cm;
+                    {PAGE_NUMBER_BOX if page_numbers else ''}
+                }}
+                body {{
+                    font-family: {text['font_family']};
+                    font-size: 10pt;
+                    line-height: 1.6;
+                    color: #333333;
+                }}
+                .header {{
+                    border-bottom: 2px solid #0066b3;
+                    padding-bottom: 10px;
+                    margin-bottom: 20px;
+                }}
+                .logo {{
+                    font-size: 24pt;
+                    font-weight: bold;
+                    color: #0066b3;
+                }}
+                .statement-title {{
+                    font-size: 18pt;
+                    margin-top: 0;
+                    color: #333333;
+                }}
+                .customer-info {{
+                    margin-bottom: 30px;
+                }}
+                .account-summary {{
+                    background-color: #f7f7f7;
+                    border: 1px solid #e0e0e0;
+                    border-radius: 5px;
+                    padding: 15px;
+                    margin-bottom: 20px;
+                }}
+                .summary-title {{
+                    font-size: 14pt;
+                    font-weight: bold;
+                    margin-top: 0;
+                    margin-bottom: 10px;
+                    color: #0066b3;
+                }}
+                .info-grid {{
+                    display: grid;
+                    grid-template-columns: 1fr 1fr;
+                    gap: 15px;
+                }}
+                .info-item {{
+                    margin-bottom: 5px;
+                }}
+                .label {{
+                    font-weight: bold;
+                    color: #555555;
+                }}
+                table {{
+                    width: 100%;
+                    border-collapse: collapse;
+                    margin-top: 20px;
+                    font-size: 9pt;
+                }}
+                th, td {{
+                    border: 1px solid #e0e0e0;
+                    padding: 8px;
+                    text-align: left;
+                }}
+                th {{
+                    background-color: #0066b3;
+                    color: white;
+                    font-weight: normal;
+                }}
+                tr:nth-child(even) {{
+                    background-color: #f9f9f9;
+                }}
+                .debit {{
+                    color: #d9534f;
+                }}
+                .credit {{
+                    color: #5cb85c;
+                }}
+                .original-amount {{
+                    color: #777;
+                    font-size: 0.85em;
+                }}
+                .totals {{
+                    margin-top: 20px;
+                    border: 1px solid #e0e0e0;
+                    border-radius: 5px;
+                    padding: 15px;
+                    background-color: #f7f7f7;
+                }}
+                .totals-table {{
+                    width: 350px;
+                    margin-left: auto;
+                    border: none;
+                }}
+                .totals-table td {{
+                    border: none;
+                    padding: 3px 0;
+                }}
+                .totals-table .total-row {{
+                    font-weight: bold;
+                    font-size: 12pt;
+                    border-top: 1px solid #e0e0e0;
+                    padding-top: 8px;
+                }}
+                .preview-nav {{
+                    margin-top: 15px;
+                    text-align: center;
+                }}
+                .preview-nav a {{
+                    margin: 0 10px;
+                    color: #0066b3;
+                }}
+                .footer {{
+                    margin-top: 30px;
+                    font-size: 9pt;
+                    color: #777777;
+                    text-align: center;
+                    border-top: 1px solid #e0e0e0;
+                    padding-top: 10px;
+                }}
+            </style>
+        </head>
+        <body>
+            {intro_html}
+            <table>
+                <thead>
+                    <tr>
+                        <th>{text['date']}</th>
+                        <th>{text['merchant']}</th>
+                        <th>{text['category']}</th>
+                        <th>{text['transaction_type']}</th>
+                        <th>{text['amount']}</th>
+                    </tr>
+                </thead>
+                <tbody>"""
+        tail = f"""
+                </tbody>
+            </table>
+            {nav_html}
+            {closing_html}
+        </body>
+        </html>
+        """
+
+        return head, tail
+
+    def build_statement_chunks(self, customer, account, transactions, language='en', totals=None,
+                               rows_per_chunk=CHUNK_ROWS):
+        """Split a statement into HTML documents of at most rows_per_chunk transactions.
+
+        The first chunk carries the header and summary, the last the totals
+        and footer; every chunk repeats the table header on each page.
+        """
+        if totals is None:
+            totals = self.calculate_totals(transactions)
+        chunks = [transactions[start:start + rows_per_chunk]
+                  for start in range(0, len(transactions), rows_per_chunk)] or [[]]
+        return [
+            self.build_statement_html(customer, account, chunk, language, totals,
+                                      first=index == 0, last=index == len(chunks) - 1, page_numbers=False)
+            for index, chunk in enumerate(chunks)
+        ]
+
+    def page_number_overlay(self, page_count):
+        """HTML for page_count blank pages carrying only the page number box."""
+        pages = '<div class="page"></div>' * page_count
+        return f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                @page {{
+                    size: letter;
+                    margin: 2cm;
+                    {PAGE_NUMBER_BOX}
+                }}
+                .page {{
+                    height: 1px;
+                    break-after: page;
+                }}
+                .page:last-child {{
+                    break-after: auto;
+                }}
+            </style>
+        </head>
+        <body>{pages}</body>
+        </html>
+        """
+
+    def merge_chunks(self, pdfs, title):
+        """Merge chunk PDFs into one document numbered "Page n of N" throughout."""
+        from pypdf import PdfReader, PdfWriter
+
+        writer = PdfWriter()
+        for pdf in pdfs:
+            writer.append(io.BytesIO(pdf))
+
+        overlay = PdfReader(io.BytesIO(render_pool.render_pdf(self.page_number_overlay(len(writer.pages)))))
+        for page, numbers in zip(writer.pages, overlay.pages):
+            page.merge_page(numbers)
+        writer.add_metadata({'/Title': title})
+
+        merged = io.BytesIO()
+        writer.write(merged)
+        return merged.getvalue()
+
+    def render_statements(self, customer, account, transactions, languages, options, totals=None, chunked=None):
+        """Render one statement PDF per language, returning their bytes in order.
+
+        With chunked (by default when there are CHUNKED_RENDER_MIN_ROWS rows or
+        more) every language is split into chunks, all chunks are rendered in
+        parallel in the render pool, and each language's chunks are merged.
+        """
+        if totals is None:
+            totals = self.calculate_totals(transactions)
+        if chunked is None:
+            chunked = len(transactions) >= CHUNKED_RENDER_MIN_ROWS
+
+        if not chunked:
+            documents = [
+                self.build_statement_html(customer, account, transactions, language, totals)
+                for language in languages
+            ]
+            return render_pool.render_many(documents, options)
+
+        chunks = [self.build_statement_chunks(customer, account, transactions, language, totals)
+                  for language in languages]
+        rendered = render_pool.render_many([document for documents in chunks for document in documents], options)
+        logger.info("Rendered statement in chunks", extra={'chunks': len(rendered), 'rows': len(transactions),
+                                                           'languages': languages, 'sampled': True})
+
+        pdfs = []
+        start = 0
+        for language, documents in zip(languages, chunks):
+            title = translations.get(language, translations['en'])['statement_title']
+            pdfs.append(self.merge_chunks(rendered[start:start + len(documents)], title))
+            start += len(documents)
+        return pdfs
+
+    def generate_statement_bundle(self, customer, account, transactions, languages, bundle='zip',
+                                  preset=DEFAULT_PDF_PRESET, period=None):
+        """Generate one statement per language from a single data fetch.
+
+        Totals are calculated once and the language variants are rendered in
+        parallel worker processes. Returns a BytesIO holding either a ZIP of
+        the PDFs (bundle='zip') or one combined PDF (bundle='pdf'); period
+        names the ZIP members.
+        """
+        try:
+            if not customer or not transactions:
+                logger.error("Insufficient data to generate statement")
+                return None
+
+            if preset not in PDF_PRESETS:
+                logger.warning("PDF preset %s not supported, falling back to %s", preset, DEFAULT_PDF_PRESET)
+                preset = DEFAULT_PDF_PRESET
+
+            pdfs = self.render_statements(customer, account, transactions, languages, PDF_PRESETS[preset])
+
+            bundle_io = io.BytesIO()
+            if bundle == 'pdf':
+                from pypdf import PdfWriter
+
+                writer = PdfWriter()
+                for pdf in pdfs:
+                    writer.append(io.BytesIO(pdf))
+                writer.write(bundle_io)
+            else:
+                # PDF streams are already compressed, so store them as-is
+                with zipfile.ZipFile(bundle_io, 'w', compression=zipfile.ZIP_STORED) as archive:
+                    for language, pdf in zip(languages, pdfs):
+                        archive.writestr(f"{self.statement_filename(customer, language, period)}.pdf", pdf)
+
+            bundle_io.seek(0)
+            return bundle_io
+
+        except Exception:
+            logger.exception("Error generating statement bundle")
+            return None
+
+    def statement_filename(self, customer, language=None, period=None):
+        """Download filename (without extension) for a customer's statement."""
+        date_part = period.replace('-', '') if period else datetime.today().strftime('%Y%m%d')
+        filename = f"DBS_Statement_{customer['first_name']}_{customer['last_name']}_{date_part}"
+        if language:
+            filename += f"_{language}"
+        return filename
+
+    def generate_statement_pdf(self, customer, account, transactions, language='en',
+                               preset=DEFAULT_PDF_PRESET, chunked=None):
+        """Generate a professional PDF statement in the specified language.
+
+        preset selects the WeasyPrint output options from PDF_PRESETS.
+        chunked forces (True) or disables (False) parallel chunked rendering;
+        by default long statements are chunked.
+        """
+        try:
+            if not customer or not transactions:
+                logger.error("Insufficient data to generate statement")
+                return None
+
+            if preset not in PDF_PRESETS:
+                logger.warning("PDF preset %s not supported, falling back to %s", preset, DEFAULT_PDF_PRESET)
+                preset = DEFAULT_PDF_PRESET
+
+            # A single document is rendered in-process; WeasyPrint is imported
+            # on first render so that routes which never build a PDF do not pay
+            # for loading it
+            pdf = self.render_statements(customer, account, transactions, [language], PDF_PRESETS[preset],
+                                         chunked=chunked)[0]
 
             # Convert the PDF to a file-like object
             pdf_io = io.BytesIO(pdf)
@@ -553,26 +1054,146 @@ class StatementGenerator:
             return pdf_io
 
         except Exception as e:
-            logger.error(f"Error generating PDF statement: {e}", exc_info=True)
+            logger.exception("Error generating PDF statement")
             return None
 
 
+@app.before_request
+def assign_request_id():
+    """Tag the request with a correlation ID, reusing the caller's X-Request-ID."""
+    request_id_var.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex)
+
+@app.after_request
+def add_request_id_header(response):
+    response.headers['X-Request-ID'] = request_id_var.get()
+    return response
+
+_prebuilt_pages = {}
+
+def load_prebuilt_page(endpoint):
+    """Load a pre-rendered page and its compressed variants from the build manifest.
+
+    Returns None when build_static.py has not been run, so the caller can
+    fall back to rendering the template.
+    """
+    if endpoint in _prebuilt_pages:
+        return _prebuilt_pages[endpoint]
+
+    page = None
+    manifest_path = os.path.join(STATIC_DIST_DIR, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            entry = json.load(f).get(endpoint)
+        if entry:
+            path = os.path.join(STATIC_DIST_DIR, entry['file'])
+            page = {'etag': entry['etag'], 'bodies': {}}
+            for encoding, suffix in (('br', '.br'), ('gzip', '.gz'), (None, '')):
+                if os.path.exists(path + suffix):
+                    with open(path + suffix, 'rb') as f:
+                        page['bodies'][encoding] = f.read()
+
+    _prebuilt_pages[endpoint] = page
+    return page
+
+def serve_static_page(endpoint):
+    """Serve a pre-built page, negotiating the content encoding with the client."""
+    page = load_prebuilt_page(endpoint)
+    if not page:
+        return render_template(STATIC_PAGES[endpoint])
+
+    encoding = None
+    for candidate in ('br', 'gzip'):
+        if candidate in page['bodies'] and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+
+    response = Response(page['bodies'][encoding], mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(f"{page['etag']}-{encoding or 'identity'}")
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_MAX_AGE
+    return response.make_conditional(request)
+
+def warm_up():
+    """Load WeasyPrint and render a minimal document ahead of the first request.
+
+    Called from the gunicorn master in preload mode so that forked workers
+    share the imported modules and font configuration.
+    """
+    from weasyprint import HTML
+    HTML(string="<p>warm-up</p>").write_pdf()
+    logger.info("WeasyPrint warmed up")
+
+    connection = None
+    try:
+        connection = DatabaseConnection(get_config()).connect()
+        dimensions.preload(connection)
+    except pymysql.MySQLError as e:
+        logger.warning("Merchant/category preload skipped, workers will load on first use: %s", e)
+    finally:
+        if connection:
+            connection.close()
+
+def admission_rejected_response(rejected):
+    """503/429 response telling the client when to retry."""
+    response = jsonify({"error": "Service busy, please retry", "reason": rejected.reason})
+    response.status_code = rejected.status
+    response.headers['Retry-After'] = str(rejected.retry_after)
+    return response
+
+def wants_fresh_read():
+    """Whether the caller asked to read its own writes (`fresh=1`), bypassing replicas."""
+    return request.args.get('fresh', '').lower() in ('1', 'true', 'yes')
+
+def send_archived_statement(pdf_bytes, filename):
+    """Send a statement PDF retrieved from the archive."""
+    return send_file(
+        io.BytesIO(pdf_bytes),
+        as_attachment=True,
+        download_name=filename,
+        mimetype='application/pdf'
+    )
+
+def resolve_languages(language_param, customer):
+    """Turn the `language` query parameter into a list of statement languages.
+
+    Accepts a single code, a comma separated list (`en,zh`) or `all`. When no
+    language is requested the customer's preferred_language is used.
+    Unsupported codes are dropped, falling back to English.
+    """
+    if not language_param:
+        requested = [customer.get('preferred_language') or 'en']
+    elif language_param.strip().lower() == 'all':
+        requested = list(translations)
+    else:
+        requested = [code.strip().lower() for code in language_param.split(',')]
+
+    languages = []
+    for code in requested:
+        if code not in translations:
+            logger.warning("Language %s not supported, skipping", code)
+        elif code not in languages:
+            languages.append(code)
+    return languages or ['en']
+
 # Serve the index.html page
 @app.route("/")
 def home():
-    return render_template("first.html")
+    return serve_static_page('home')
 
 @app.route("/creditcards")
 def credit_cards():
-    return render_template("index.html")
+    return serve_static_page('credit_cards')
 
 @app.route("/login")
 def login():
-    return render_template("login.html")
+    return serve_static_page('login')
 
 @app.route("/signup")
 def signup():
-    return render_template("signup.html")
+    return serve_static_page('signup')
 
 
 @app.route('/api/languages')
@@ -588,8 +1209,16 @@ def get_languages():
 def get_customer(customer_id):
     """Return customer information for preview."""
     try:
-        db = DatabaseConnection(config)
-        customer, account, _ = db.fetch_customer_data(customer_id)
+        db = DatabaseConnection(get_config())
+        fresh = wants_fresh_read()
+        try:
+            customer, account, _ = get_admission().run(
+                'api', lambda: db.fetch_customer_data(customer_id, read_your_writes=fresh))
+        except AdmissionRejected as rejected:
+            return admission_rejected_response(rejected)
+        except fx.MissingRateError as missing:
+            logger.error("Missing FX rate", extra={'customer_id': customer_id, 'error': str(missing)})
+            return jsonify({"error": str(missing)}), 503
         
         if not customer:
             return jsonify({"error": "Customer not found"}), 404
@@ -603,17 +1232,124 @@ def get_customer(customer_id):
             "account": account
         })
     except Exception as e:
-        logger.error(f"Error fetching customer data: {e}", exc_info=True)
+        logger.exception("Error fetching customer data")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/customer/<int:customer_id>/spending')
+def get_customer_spending(customer_id):
+    """Return per-month and per-category spending for charts."""
+    try:
+        months = int(request.args.get('months', spending.DEFAULT_MONTHS))
+    except ValueError:
+        return jsonify({"error": "months must be a number"}), 400
+    if not 1 <= months <= spending.MAX_MONTHS:
+        return jsonify({"error": f"months must be between 1 and {spending.MAX_MONTHS}"}), 400
+
+    try:
+        db = DatabaseConnection(get_config())
+        fresh = wants_fresh_read()
+        try:
+            summary = get_admission().run('api', lambda: db.fetch_spending(customer_id, months, fresh))
+        except AdmissionRejected as rejected:
+            return admission_rejected_response(rejected)
+
+        if summary is None:
+            return jsonify({"error": "Customer not found"}), 404
+
+        return jsonify({"customer_id": customer_id, "months": months, **summary})
+    except Exception as e:
+        logger.exception("Error fetching spending summary")
+        return jsonify({"error": "Internal server error"}), 500
+
+class StatementRequestError(Exception):
+    """A statement request that cannot be served, with its HTTP status."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def produce_statement(customer_id, language_param, period, archivable, bundle, preset, fresh):
+    """Fetch data and render (or read from the archive) a statement download.
+
+    Returns (data, filename, mimetype); raises StatementRequestError.
+    """
+    # Fetch data from database
+    db = DatabaseConnection(get_config())
+    try:
+        customer, account, transactions = db.fetch_customer_data(customer_id, period, read_your_writes=fresh)
+    except fx.MissingRateError as missing:
+        logger.error("Missing FX rate", extra={'customer_id': customer_id, 'error': str(missing)})
+        raise StatementRequestError(f"Statement unavailable: {escape(missing)}", 503)
+    
+    logger.info("Database fetch results", extra={
+        'customer_found': customer is not None,
+        'account_found': account is not None,
+        'transaction_count': len(transactions) if transactions else 0,
+        'sampled': True
+    })
+
+    if not customer:
+        logger.warning("Customer not found", extra={'customer_id': customer_id})
+        raise StatementRequestError("Customer not found", 404)
+        
+    if not account:
+        logger.warning("No account found for customer", extra={'customer_id': customer_id})
+        raise StatementRequestError("No account found for this customer", 404)
+
+    get_archive().remember_preferred_language(customer_id, customer.get('preferred_language') or 'en')
+    languages = resolve_languages(language_param, customer)
+
+    if len(languages) == 1 and archivable and not fresh:
+        archived = get_archive().get(customer_id, period, languages[0], account['account_id'])
+        if archived:
+            pdf_bytes, filename = archived
+            return pdf_bytes, filename, 'application/pdf'
+
+    # Generate PDF
+    generator = StatementGenerator()
+    logger.info("Attempting to generate PDF...", extra={'languages': languages, 'sampled': True})
+    
+    try:
+        if len(languages) == 1:
+            pdf_io = generator.generate_statement_pdf(customer, account, transactions, languages[0], preset)
+            filename = f"{generator.statement_filename(customer, period=period)}.pdf"
+            mimetype = 'application/pdf'
+            if pdf_io and archivable:
+                get_archive().put(pdf_io.getvalue(), customer_id, account['account_id'], period,
+                                  languages[0], filename)
+        else:
+            pdf_io = generator.generate_statement_bundle(customer, account, transactions, languages,
+                                                         bundle, preset, period)
+            filename = f"{generator.statement_filename(customer, '_'.join(languages), period)}.{bundle}"
+            mimetype = 'application/zip' if bundle == 'zip' else 'application/pdf'
+    except Exception as pdf_error:
+        logger.exception("PDF generation error")
+        raise StatementRequestError(f"Error generating PDF: {escape(pdf_error)}", 500)
+
+    if not pdf_io:
+        logger.error("PDF generation returned None")
+        raise StatementRequestError("Failed to generate PDF statement", 500)
+        
+    logger.info("PDF generated successfully", extra={'sampled': True})
+    return pdf_io.getvalue(), filename, mimetype
+
 @app.route('/generate_statement', methods=['GET'])
 def generate_pdf_route():
     """Generate and return PDF statement."""
     try:
         customer_id = request.args.get('customer_id')
-        language = request.args.get('language', 'en')
+        language_param = request.args.get('language')
+        period = request.args.get('period')
+        bundle = request.args.get('bundle', 'zip')
+        preset = request.args.get('preset', DEFAULT_PDF_PRESET)
+        fresh = wants_fresh_read()
         
-        logger.info(f"Starting PDF generation for customer_id: {customer_id}, language: {language}")
+        logger.info("Starting PDF generation", extra={'customer_id': customer_id, 'language': language_param,
+                                                      'sampled': True})
+        
+        if bundle not in ('zip', 'pdf'):
+            return "Invalid bundle format. Must be one of: zip, pdf", 400
         
         if not customer_id:
             logger.warning("No customer_id provided")
@@ -622,54 +1358,171 @@ def generate_pdf_route():
         try:
             customer_id = int(customer_id)
         except ValueError:
-            logger.warning(f"Invalid customer_id format: {customer_id}")
+            logger.warning("Invalid customer_id format", extra={'customer_id': customer_id})
             return "Invalid customer ID format", 400
 
-        # Fetch data from database
-        db = DatabaseConnection(config)
-        customer, account, transactions = db.fetch_customer_data(customer_id)
+        # Closed (past) periods never change, so they are archived once
+        # rendered and served from the archive afterwards. The archive holds
+        # one PDF per statement, rendered with the default preset; fresh=1
+        # skips reading it and re-archives the new render.
+        archivable = False
+        if period:
+            try:
+                parse_period(period)
+            except ValueError:
+                return "Invalid period format. Use YYYY-MM", 400
+            archivable = period < datetime.today().strftime('%Y-%m') and preset == DEFAULT_PDF_PRESET
+
+        if archivable and not fresh:
+            archive = get_archive()
+            # With no language requested, use the preferred language recorded
+            # at the customer's last render so the lookup needs no MySQL fetch
+            language = language_param or archive.preferred_language(customer_id)
+            archived = archive.get(customer_id, period, language) if language in translations else None
+            if archived:
+                logger.info("Serving archived statement", extra={'customer_id': customer_id, 'period': period,
+                                                                 'sampled': True})
+                return send_archived_statement(*archived)
+
+        # Renders run under admission control; repeated clicks for the same
+        # statement share the in-flight render instead of starting another
+        try:
+            data, filename, mimetype = get_admission().run(
+                'render',
+                lambda: produce_statement(customer_id, language_param, period, archivable, bundle, preset, fresh),
+                customer_key=customer_id,
+                flight_key=(customer_id, language_param, period, bundle, preset, fresh)
+            )
+        except AdmissionRejected as rejected:
+            logger.warning("Statement request rejected", extra={'customer_id': customer_id,
+                                                               'reason': rejected.reason})
+            return admission_rejected_response(rejected)
+        except StatementRequestError as error:
+            return error.message, error.status
+
+        return send_file(
+            io.BytesIO(data),
+            as_attachment=True,
+            download_name=filename,
+            mimetype=mimetype
+        )
         
-        logger.info(f"Database fetch results - Customer: {customer is not None}, "
-                   f"Account: {account is not None}, "
-                   f"Transactions: {len(transactions) if transactions else 0}")
+    except Exception as e:
+        logger.exception("Error in generate_statement route")
+        return f"An error occurred while generating the statement: {escape(e)}", 500
+
+def preview_nav_html(text, customer_id, language, period, page, pages, page_size):
+    """Previous/next links and the PDF download link shown under a preview page."""
+    def link(endpoint, label, **args):
+        href = url_for(endpoint, customer_id=customer_id, language=language, period=period, **args)
+        return f'<a href="{escape(href)}">{label}</a>'
+
+    parts = []
+    if page > 1:
+        parts.append(link('statement_preview', text['previous_page'], page=page - 1, page_size=page_size))
+    parts.append(f"<span>{text['page_of'].format(page=page, pages=pages)}</span>")
+    if page < pages:
+        parts.append(link('statement_preview', text['next_page'], page=page + 1, page_size=page_size))
+    parts.append(link('generate_pdf_route', text['download_pdf']))
+    return f'<div class="preview-nav">{" ".join(parts)}</div>'
+
+def preview_etag(customer, account, rows, totals, language, period, page, pages, page_size):
+    """ETag for one preview page, derived from everything the page shows.
+
+    The statement date is printed on the page, so tags also change daily.
+    """
+    shown = [PREVIEW_ETAG_VERSION, datetime.today().strftime('%Y-%m-%d'), customer, account, rows, totals,
+             language, period, page, pages, page_size]
+    return hashlib.sha256(json.dumps(shown, default=str, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+@app.route('/statement/preview')
+def statement_preview():
+    """Show a statement as HTML, one page of transactions at a time, without rendering a PDF."""
+    try:
+        customer_id = request.args.get('customer_id')
+        language_param = request.args.get('language')
+        period = request.args.get('period')
+        fresh = wants_fresh_read()
+
+        if not customer_id:
+            return "Customer ID is required", 400
+
+        try:
+            customer_id = int(customer_id)
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', PREVIEW_PAGE_SIZE))
+        except ValueError:
+            return "customer_id, page and page_size must be numbers", 400
+        if page < 1 or not 1 <= page_size <= PREVIEW_MAX_PAGE_SIZE:
+            return f"page must be at least 1 and page_size between 1 and {PREVIEW_MAX_PAGE_SIZE}", 400
+
+        closed = False
+        if period:
+            try:
+                parse_period(period)
+            except ValueError:
+                return "Invalid period format. Use YYYY-MM", 400
+            closed = period < datetime.today().strftime('%Y-%m')
+
+        db = DatabaseConnection(get_config())
+        try:
+            customer, account, transactions = get_admission().run(
+                'api', lambda: db.fetch_customer_data(customer_id, period, read_your_writes=fresh))
+        except AdmissionRejected as rejected:
+            return admission_rejected_response(rejected)
+        except fx.MissingRateError as missing:
+            logger.error("Missing FX rate", extra={'customer_id': customer_id, 'error': str(missing)})
+            return f"Statement unavailable: {escape(missing)}", 503
 
         if not customer:
-            logger.warning(f"Customer not found for ID: {customer_id}")
             return "Customer not found", 404
-            
         if not account:
-            logger.warning(f"No account found for customer ID: {customer_id}")
             return "No account found for this customer", 404
 
-        # Generate PDF
+        pages = max(1, -(-len(transactions) // page_size))
+        if page > pages:
+            return f"Page {page} not found, the statement has {pages}", 404
+
+        language = resolve_languages(language_param, customer)[0]
         generator = StatementGenerator()
-        logger.info("Attempting to generate PDF...")
-        
-        try:
-            pdf_io = generator.generate_statement_pdf(customer, account, transactions, language)
-            if not pdf_io:
-                logger.error("PDF generation returned None")
-                return "Failed to generate PDF statement", 500
-                
-            logger.info("PDF generated successfully")
-            
-            # Format filename for download
-            filename = f"DBS_Statement_{customer['first_name']}_{customer['last_name']}_{datetime.today().strftime('%Y%m%d')}.pdf"
-            
-            return send_file(
-                pdf_io,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='application/pdf'
-            )
-            
-        except Exception as pdf_error:
-            logger.error(f"PDF generation error: {str(pdf_error)}", exc_info=True)
-            return f"Error generating PDF: {str(pdf_error)}", 500
-        
+        totals = generator.calculate_totals(transactions)
+        rows = transactions[(page - 1) * page_size:page * page_size]
+        etag = preview_etag(customer, account, rows, totals, language, period, page, pages, page_size)
+
+        # Answer revalidations before building any HTML. make_conditional is
+        # not used: it would read the whole stream to set Content-Length.
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            nav_html = preview_nav_html(translations[language], customer_id, language, period, page, pages,
+                                        page_size)
+            response = Response(generator.stream_statement_html(customer, account, rows, language, totals,
+                                                                nav_html),
+                                mimetype='text/html')
+            response.automatically_set_content_length = False
+        response.set_etag(etag)
+        # Statements are personal, so only the browser may keep a copy. The
+        # current period changes as transactions post and is revalidated on
+        # every view; closed periods can be reused for a while.
+        response.cache_control.private = True
+        if closed:
+            response.cache_control.max_age = PREVIEW_CLOSED_MAX_AGE
+        else:
+            response.cache_control.no_cache = True
+
+        logger.info("Serving statement preview", extra={'customer_id': customer_id, 'page': page,
+                                                        'rows': len(rows), 'status': response.status_code,
+                                                        'sampled': True})
+        return response
+
     except Exception as e:
-        logger.error(f"Error in generate_statement route: {str(e)}", exc_info=True)
-        return f"An error occurred while generating the statement: {str(e)}", 500
+        logger.exception("Error in statement preview route")
+        return f"An error occurred while previewing the statement: {escape(e)}", 500
+
+@app.route('/metrics')
+def metrics():
+    """Admission control metrics in Prometheus text format (per worker process)."""
+    return Response(get_admission().metrics(), mimetype='text/plain; version=0.0.4')
 
 @app.errorhandler(404)
 def not_found(error):
@@ -0,0 +1,38 @@
+"""
+gunicorn.conf.py
+
+Usage:
+    gunicorn -c gunicorn.conf.py generate_pdf:app
+
+Set STATEMENT_PRELOAD=1 to import the app and warm up WeasyPrint once in the
+master process. Forked workers then share the loaded modules and font
+configuration instead of each paying for them on their first PDF request.
+
+Workers use gthread so a worker busy rendering can still answer cheap routes
+on its other threads; admission control in the app caps how many of those
+threads may render or call the database API routes, running or queued (see
+[Admission] in config.ini). Each worker checks those caps against its thread
+count when it boots and fails to start if the limited routes could take every
+thread.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('STATEMENT_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('STATEMENT_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('STATEMENT_THREADS', 8))
+timeout = int(os.environ.get('STATEMENT_TIMEOUT', 120))
+preload_app = os.environ.get('STATEMENT_PRELOAD', '0') == '1'
+
+
+def when_ready(server):
+    if preload_app:
+        import generate_pdf
+        generate_pdf.warm_up()
+
+
+def post_worker_init(worker):
+    import generate_pdf
+    generate_pdf.check_worker_threads(worker.cfg.threads)
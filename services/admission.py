@@ -0,0 +1,242 @@
+"""
+admission.py
+
+Admission control and load shedding for expensive routes.
+
+* RouteLimiter caps concurrent requests per route class and queues a bounded
+  backlog; past that, or after waiting queue_timeout seconds, requests are
+  shed with 503 and a Retry-After estimated from recent service times.
+* CustomerRateLimiter is a per-customer token bucket (429 when empty).
+* Identical requests already in flight are coalesced: followers wait for
+  the leader's result instead of taking a slot or a token.
+
+State is per process (one controller per gunicorn worker).
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted."""
+
+    status = 503
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class Overloaded(AdmissionRejected):
+    status = 503
+
+
+class RateLimited(AdmissionRejected):
+    status = 429
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate tokens per second."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def take(self):
+        """Take one token; returns 0 on success or the seconds until one is available."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class CustomerRateLimiter:
+    """Per-customer token buckets, keeping at most max_keys customers."""
+
+    def __init__(self, rate_per_minute, burst, max_keys=100000, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self.rejected = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key):
+        """Consume a token for key or raise RateLimited."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self.clock)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take()
+            if wait:
+                self.rejected += 1
+                raise RateLimited("customer rate limit", wait)
+
+
+class RouteLimiter:
+    """Concurrency limit with a bounded wait queue for one route class."""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, clock=time.monotonic):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_service_time = 1.0  # EWMA of seconds a slot is held
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        return self.avg_service_time * (self.waiting + 1) / self.max_concurrent
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; raises Overloaded when shed."""
+        with self._cond:
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active += 1
+                self.admitted += 1
+                return
+
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"{self.name} backlog full", self.retry_after())
+
+            self.waiting += 1
+            deadline = self.clock() + self.queue_timeout
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise Overloaded(f"{self.name} queue timeout", self.retry_after())
+                    self._cond.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, service_time=None):
+        with self._cond:
+            self.active -= 1
+            if service_time is not None:
+                self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+            self._cond.notify()
+
+    def run(self, func):
+        """Call func while holding a slot."""
+        self.acquire()
+        started = self.clock()
+        try:
+            return func()
+        finally:
+            self.release(self.clock() - started)
+
+
+class AdmissionController:
+    """Route limiters, customer rate limiting and request coalescing."""
+
+    def __init__(self, limits, customer_rate_per_minute, customer_burst, clock=time.monotonic):
+        """limits maps route class -> (max_concurrent, max_queue, queue_timeout)."""
+        self.limiters = {
+            name: RouteLimiter(name, *limit, clock=clock) for name, limit in limits.items()
+        }
+        self.customers = CustomerRateLimiter(customer_rate_per_minute, customer_burst, clock=clock)
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def run(self, route_class, func, customer_key=None, flight_key=None):
+        """Run func under admission control for route_class.
+
+        Requests sharing a flight_key while one is in flight get the leader's
+        result (or exception). Raises AdmissionRejected when not admitted.
+        """
+        if flight_key is None:
+            return self._admit(route_class, func, customer_key)
+
+        with self._lock:
+            future = self._in_flight.get(flight_key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[flight_key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._admit(route_class, func, customer_key)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(flight_key, None)
+
+    def _admit(self, route_class, func, customer_key):
+        if customer_key is not None:
+            self.customers.check(customer_key)
+        return self.limiters[route_class].run(func)
+
+    def metrics(self):
+        """Prometheus text exposition of queue depth and admission counters."""
+        families = [
+            ('admission_active', 'gauge', "Requests currently holding a slot.", 'active'),
+            ('admission_queue_depth', 'gauge', "Requests waiting for a slot.", 'waiting'),
+            ('admission_admitted_total', 'counter', "Requests admitted.", 'admitted'),
+            ('admission_rejected_total', 'counter', "Requests shed with 503.", 'rejected'),
+        ]
+        lines = []
+        for metric, kind, help_text, attribute in families:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, limiter in sorted(self.limiters.items()):
+                lines.append(f'{metric}{{route_class="{name}"}} {getattr(limiter, attribute)}')
+        lines += [
+            "# HELP admission_rate_limited_total Requests rejected by the per-customer token bucket.",
+            "# TYPE admission_rate_limited_total counter",
+            f"admission_rate_limited_total {self.customers.rejected}",
+            "# HELP admission_coalesced_total Requests served from an identical in-flight request.",
+            "# TYPE admission_coalesced_total counter",
+            f"admission_coalesced_total {self.coalesced}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def check_thread_budget(threads, limits, reserved_threads):
+    """Raise ValueError unless the route classes leave reserved_threads of a worker's threads free.
+
+    limits maps route class -> (max_concurrent, max_queue, ...), as for
+    AdmissionController. Running and queued requests each hold a request
+    thread. If together they can take every thread, unlimited routes starve
+    and the queues never fill, so nothing is ever shed.
+    """
+    held = {name: limit[0] + limit[1] for name, limit in limits.items()}
+    if sum(held.values()) > threads - reserved_threads:
+        classes = ', '.join(f"{name} {count}" for name, count in held.items())
+        raise ValueError(
+            f"Running plus queued requests ({classes}: {sum(held.values())} in all) must leave "
+            f"RESERVED_THREADS ({reserved_threads}) of the worker's {threads} threads free for other routes"
+        )
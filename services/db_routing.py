@@ -0,0 +1,133 @@
+"""
+db_routing.py
+
+Round-robin routing of read-only queries across MySQL read replicas.
+
+A replica is skipped when it cannot be reached or when its replication lag
+exceeds the configured maximum; it is then left out of the rotation for
+retry_after seconds. Callers fall back to the primary when no replica is
+usable, and send writes and read-your-writes queries to the primary directly.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger("statement_web_app.db_routing")
+
+DEFAULT_PORT = 3306
+DEFAULT_MAX_LAG = 30          # seconds behind the primary before a replica is skipped
+DEFAULT_RETRY_AFTER = 30      # seconds a failed or lagging replica stays out of rotation
+DEFAULT_LAG_CHECK_INTERVAL = 5
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def parse_replicas(value):
+    """Parse 'host1:3307, host2' into [('host1', 3307), ('host2', 3306)]."""
+    replicas = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        replicas.append((host, int(port) if port else DEFAULT_PORT))
+    return replicas
+
+
+def get_router(replicas, **options):
+    """Return the shared router for a replica set.
+
+    Routers hold rotation and health state, so one instance is kept per
+    distinct configuration for the life of the process.
+    """
+    key = (tuple(replicas), tuple(sorted(options.items())))
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = ReplicaRouter(replicas, **options)
+        return _routers[key]
+
+
+def replication_lag(connection):
+    """Seconds the replica is behind its source, or None if replication is stopped."""
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22
+        status = cursor.fetchone()
+        if status and not isinstance(status, dict):
+            status = dict(zip([column[0] for column in cursor.description], status))
+
+    if not status:
+        return None
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else int(lag)
+
+
+class ReplicaRouter:
+    """Chooses a healthy replica for each read in round-robin order."""
+
+    def __init__(self, replicas, max_lag=DEFAULT_MAX_LAG, retry_after=DEFAULT_RETRY_AFTER,
+                 lag_check_interval=DEFAULT_LAG_CHECK_INTERVAL, lag_probe=replication_lag,
+                 clock=time.monotonic):
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.retry_after = retry_after
+        self.lag_check_interval = lag_check_interval
+        self.lag_probe = lag_probe
+        self.clock = clock
+        self._next = 0
+        self._down_until = {}
+        self._lag_checked_at = {}
+        self._lock = threading.Lock()
+
+    def _rotation(self):
+        """Replicas in the order to try for this read, skipping ones marked down."""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self.replicas), 1)
+            now = self.clock()
+            ordered = self.replicas[start:] + self.replicas[:start]
+            return [r for r in ordered if self._down_until.get(r, 0) <= now]
+
+    def mark_down(self, replica, reason):
+        with self._lock:
+            self._down_until[replica] = self.clock() + self.retry_after
+            self._lag_checked_at.pop(replica, None)
+        logger.warning("Replica %s:%s skipped: %s", replica[0], replica[1], reason)
+
+    def _lag_check_due(self, replica):
+        with self._lock:
+            checked_at = self._lag_checked_at.get(replica)
+            return checked_at is None or self.clock() - checked_at >= self.lag_check_interval
+
+    def acquire(self, connect):
+        """Return (connection, replica) for the next healthy replica, or (None, None).
+
+        connect(host, port) opens a connection; its exceptions mark the
+        replica down for retry_after seconds.
+        """
+        for replica in self._rotation():
+            try:
+                connection = connect(*replica)
+            except Exception as e:
+                self.mark_down(replica, f"connection failed ({e})")
+                continue
+
+            if self._lag_check_due(replica):
+                try:
+                    lag = self.lag_probe(connection)
+                except Exception as e:
+                    lag = None
+                    logger.warning("Replica %s:%s lag check failed: %s", replica[0], replica[1], e)
+                if lag is None or lag > self.max_lag:
+                    connection.close()
+                    self.mark_down(replica, "replication stopped" if lag is None else f"lagging {lag}s")
+                    continue
+                with self._lock:
+                    self._lag_checked_at[replica] = self.clock()
+
+            return connection, replica
+        return None, None
@@ -0,0 +1,497 @@
+"""
+delivery.py
+
+Bulk email delivery of archived statements.
+
+Each account's statement archived for a period (services/statement_archive.py)
+is sent as one PDF attachment to the customer's Customers.email, in the
+customer's preferred_language when it was archived in that language (else in
+English, else in whichever language was archived). Only archived
+statements are sent, and the archive fills as closed periods are rendered,
+so accounts are first checked against it: --render-missing renders and
+archives the statements that are not there yet, and any account still
+without one is reported and makes the run exit with status 1. Worker threads
+share a pool of SMTP connections that stay open for many messages, so a run
+pays for one connect, STARTTLS and login per connection rather than per
+message.
+
+* Transient failures (4xx replies, dropped connections, timeouts) are retried
+  per recipient with exponential backoff and jitter. Permanent 5xx refusals
+  are recorded as failed straight away.
+* Each account's outcome is recorded in a SQLite ledger. A re-run skips
+  accounts already sent and retries the failed ones, so an interrupted run
+  resumes where it stopped.
+* Sent, failed and retried counts and the delivery rate are logged as the
+  run progresses and can be written out in Prometheus text format.
+
+Point SMTP_HOST/SMTP_PORT at a local stand-in (for example
+`python -m aiosmtpd -n -l localhost:1025`) to try a run without sending mail.
+
+Usage:
+    python -m services.delivery --period 2025-04 [--render-missing] [--connections 8] [--limit 100]
+                                [--metrics-file delivery.prom]
+"""
+
+import argparse
+import logging
+import os
+import queue
+import random
+import smtplib
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from email.message import EmailMessage
+
+logger = logging.getLogger("statement_web_app.delivery")
+
+DEFAULT_CONNECTIONS = 8
+DEFAULT_MESSAGES_PER_CONNECTION = 100  # many servers cap messages per session
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF = 2.0  # seconds before the first retry, doubled after each
+MAX_BACKOFF = 60.0
+RECIPIENT_BATCH_SIZE = 1000  # statements whose recipients are looked up together
+PROGRESS_EVERY = 500  # messages between progress log lines
+MISSING_SHOWN = 20  # accounts without a statement listed in the run summary
+
+FALLBACK_LANGUAGE = 'en'  # sent when no statement is archived in the preferred language
+
+# One row per account and period; language is the statement that was sent
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    period TEXT NOT NULL,
+    customer_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    language TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    email TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (period, customer_id, account_id)
+);
+"""
+
+# Ledgers written when each language was delivered separately are re-keyed by
+# account, keeping a sent row over a failed one
+LEDGER_MIGRATION = """
+ALTER TABLE deliveries RENAME TO deliveries_by_language;
+""" + LEDGER_SCHEMA + """
+INSERT OR IGNORE INTO deliveries
+SELECT period, customer_id, account_id, language, digest, email, status, attempts, last_error, updated_at
+FROM deliveries_by_language ORDER BY status = 'sent' DESC, updated_at DESC;
+DROP TABLE deliveries_by_language;
+"""
+
+
+class DeliveryFailed(Exception):
+    """A message that could not be sent, after attempts tries."""
+
+    def __init__(self, error, attempts):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+
+
+def is_permanent(error):
+    """Whether an SMTP failure would fail again on retry (5xx replies)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def smtp_factory(host, port, user='', password='', starttls=False, timeout=30):
+    """Return a function opening a ready-to-send SMTP connection."""
+    def connect():
+        smtp = smtplib.SMTP(host, port, timeout=timeout)
+        if starttls:
+            smtp.starttls()
+        if user:
+            smtp.login(user, password)
+        return smtp
+    return connect
+
+
+class SMTPPool:
+    """A bounded pool of reusable SMTP connections.
+
+    Connections are opened on demand, up to size. Each one goes back to the
+    pool after a message and is closed after messages_per_connection
+    messages, or straight away if the connection itself failed, the server
+    is closing the session (421) or smtplib dropped the socket.
+    """
+
+    def __init__(self, factory, size=DEFAULT_CONNECTIONS,
+                 messages_per_connection=DEFAULT_MESSAGES_PER_CONNECTION):
+        self.factory = factory
+        self.size = size
+        self.messages_per_connection = messages_per_connection
+        self.opened = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for one message."""
+        with self._slots:
+            try:
+                smtp, sent = self._idle.get_nowait()
+            except queue.Empty:
+                smtp, sent = self.factory(), 0
+                with self._lock:
+                    self.opened += 1
+
+            reusable = True
+            try:
+                yield smtp
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as error:
+                # The server replied and smtplib reset the transaction, unless
+                # the reply was 421 (service closing the session)
+                reusable = getattr(error, 'smtp_code', None) != 421
+                raise
+            except BaseException:
+                reusable = False
+                raise
+            finally:
+                sent += 1
+                if reusable and smtp.sock is not None and sent < self.messages_per_connection:
+                    self._idle.put((smtp, sent))
+                else:
+                    self._close(smtp)
+
+    def _close(self, smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                smtp, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(smtp)
+
+
+def send_with_retry(pool, message, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF,
+                    sleep=time.sleep, on_retry=None):
+    """Send one message, retrying transient failures with exponential backoff.
+
+    Each wait is drawn between half and all of backoff * 2**(attempt - 1),
+    capped at MAX_BACKOFF, so retries from many workers spread out. Returns
+    the number of attempts made; raises DeliveryFailed when giving up.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with pool.connection() as smtp:
+                smtp.send_message(message)
+            return attempt
+        except (smtplib.SMTPException, OSError) as error:
+            if is_permanent(error) or attempt == max_attempts:
+                raise DeliveryFailed(error, attempt)
+            if on_retry:
+                on_retry(error)
+            delay = min(MAX_BACKOFF, backoff * 2 ** (attempt - 1))
+            sleep(random.uniform(delay / 2, delay))
+
+
+class DeliveryLedger:
+    """SQLite record of every statement's delivery outcome, used to resume runs."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        keys = [row[1] for row in connection.execute('PRAGMA table_info(deliveries)') if row[5]]
+        connection.executescript(LEDGER_MIGRATION if 'language' in keys else LEDGER_SCHEMA)
+        connection.commit()
+
+    def _connection(self):
+        """Return this thread's SQLite connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def sent(self, period):
+        """Return the (customer_id, account_id) keys already sent for a period."""
+        rows = self._connection().execute(
+            "SELECT customer_id, account_id FROM deliveries WHERE period = ? AND status = 'sent'", (period,))
+        return set(rows)
+
+    def record(self, entry, email, status, attempts, error=None):
+        """Record the outcome of an account's delivery of entry, replacing any earlier one."""
+        connection = self._connection()
+        connection.execute(
+            """INSERT OR REPLACE INTO deliveries
+               (period, customer_id, account_id, language, digest, email, status, attempts, last_error, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (entry['period'], entry['customer_id'], entry['account_id'], entry['language'], entry['digest'],
+             email, status, attempts, error, datetime.now().isoformat(timespec='seconds'))
+        )
+        connection.commit()
+
+    def counts(self, period):
+        """Return {status: accounts} for a period."""
+        rows = self._connection().execute(
+            'SELECT status, COUNT(*) FROM deliveries WHERE period = ? GROUP BY status', (period,))
+        return dict(rows)
+
+
+class DeliveryMetrics:
+    """Counters for one delivery run, safe to update from worker threads."""
+
+    COUNTERS = ('sent', 'failed', 'retried', 'skipped', 'unarchived', 'bytes_sent')
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        """Add to counters; returns the messages finished (sent or failed) so far."""
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+            return self.sent + self.failed
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(self.clock() - self.started, 1e-9)
+            values = {name: getattr(self, name) for name in self.COUNTERS}
+        values['elapsed_seconds'] = round(elapsed, 3)
+        values['messages_per_second'] = round(values['sent'] / elapsed, 2)
+        return values
+
+    def prometheus(self):
+        """The run's metrics in Prometheus text exposition format."""
+        values = self.snapshot()
+        lines = []
+        for name, metric, kind in (
+                ('sent', 'statement_delivery_sent_total', 'counter'),
+                ('failed', 'statement_delivery_failed_total', 'counter'),
+                ('retried', 'statement_delivery_retries_total', 'counter'),
+                ('skipped', 'statement_delivery_skipped_total', 'counter'),
+                ('unarchived', 'statement_delivery_unarchived', 'gauge'),
+                ('bytes_sent', 'statement_delivery_bytes_total', 'counter'),
+                ('elapsed_seconds', 'statement_delivery_duration_seconds', 'gauge'),
+                ('messages_per_second', 'statement_delivery_messages_per_second', 'gauge')):
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {values[name]}")
+        return '\n'.join(lines) + '\n'
+
+
+def build_message(entry, recipient, pdf_bytes, sender):
+    """The email carrying one statement PDF."""
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient['email']
+    message['Subject'] = f"Your DBS Bank credit card statement for {entry['period']}"
+    message.set_content(
+        f"Dear {recipient['first_name']},\n\n"
+        f"Your credit card statement for {entry['period']} is attached.\n\n"
+        "DBS Bank\n"
+    )
+    message.add_attachment(pdf_bytes, maintype='application', subtype='pdf', filename=entry['filename'])
+    return message
+
+
+def fetch_recipients(connection, customer_ids):
+    """Return {customer_id: Customers row} for the given customers."""
+    if not customer_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(customer_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT customer_id, first_name, last_name, email, "
+                       f"COALESCE(preferred_language, '{FALLBACK_LANGUAGE}') AS preferred_language "
+                       f"FROM Customers WHERE customer_id IN ({placeholders})", list(customer_ids))
+        return {row['customer_id']: row for row in cursor.fetchall()}
+
+
+def fetch_statement_accounts(connection, before):
+    """Return [(customer_id, account_id)] for every account opened before the given datetime."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT customer_id, account_id FROM Accounts WHERE creation_date < %s "
+                       "ORDER BY customer_id, account_id", (before,))
+        return [(row['customer_id'], row['account_id']) for row in cursor.fetchall()]
+
+
+def preferred_entry(entries, language):
+    """The one archived statement of an account to send, given the customer's preferred language."""
+    by_language = {entry['language']: entry for entry in entries}
+    return by_language.get(language) or by_language.get(FALLBACK_LANGUAGE) or entries[0]
+
+
+def unarchived_accounts(archive, accounts, period):
+    """The (customer_id, account_id) pairs in accounts with no statement archived for period."""
+    archived = {(entry['customer_id'], entry['account_id']) for entry in archive.entries(period)}
+    return [account for account in accounts if account not in archived]
+
+
+def render_missing(missing, render):
+    """Render and archive statements for the (customer_id, account_id) pairs in missing.
+
+    render(customer_id) renders and archives that customer's statement.
+    Failures are logged; accounts still missing afterwards are left for the
+    caller to report.
+    """
+    for customer_id in sorted({customer_id for customer_id, _ in missing}):
+        try:
+            render(customer_id)
+        except Exception as error:
+            logger.error("Could not render missing statement", extra={'customer_id': customer_id,
+                                                                      'error': str(error)})
+
+
+def run_delivery(archive, ledger, pool, lookup_recipients, period, sender, workers=None, limit=None,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF, sleep=time.sleep, metrics=None):
+    """Send one statement to every account archived for period that has not been sent one yet.
+
+    lookup_recipients(customer_ids) returns {customer_id: row with email,
+    first_name and preferred_language}; it is called from this thread, one
+    batch at a time. An account archived in several languages gets one
+    message, in the language chosen by preferred_entry. Workers default to
+    one per pool connection. Returns the run's DeliveryMetrics.
+    """
+    metrics = metrics or DeliveryMetrics()
+    statements = {}
+    for entry in archive.entries(period):
+        statements.setdefault((entry['customer_id'], entry['account_id']), []).append(entry)
+    done = ledger.sent(period)
+    pending = [entries for account, entries in statements.items() if account not in done]
+    metrics.add(skipped=len(done))
+    if limit is not None:
+        pending = pending[:limit]
+    logger.info("Starting statement delivery", extra={'period': period, 'pending': len(pending),
+                                                      'already_sent': len(done)})
+
+    def deliver(entries, recipients):
+        recipient = recipients.get(entries[0]['customer_id'])
+        entry = preferred_entry(entries, recipient.get('preferred_language') if recipient else None)
+        email = recipient.get('email') if recipient else None
+        pdf_bytes = archive.read(entry) if email else None
+        if not email or pdf_bytes is None:
+            error = "No email address" if not email else "Archived PDF missing"
+            ledger.record(entry, email, 'failed', 0, error)
+            finished = metrics.add(failed=1)
+        else:
+            try:
+                attempts = send_with_retry(pool, build_message(entry, recipient, pdf_bytes, sender),
+                                           max_attempts, backoff, sleep,
+                                           on_retry=lambda error: metrics.add(retried=1))
+            except DeliveryFailed as failure:
+                logger.warning("Statement delivery failed", extra={
+                    'customer_id': entry['customer_id'], 'attempts': failure.attempts, 'error': str(failure)})
+                ledger.record(entry, email, 'failed', failure.attempts, str(failure))
+                finished = metrics.add(failed=1)
+            else:
+                ledger.record(entry, email, 'sent', attempts)
+                finished = metrics.add(sent=1, bytes_sent=len(pdf_bytes))
+
+        if finished % PROGRESS_EVERY == 0:
+            logger.info("Statement delivery progress", extra={'period': period, **metrics.snapshot()})
+
+    with ThreadPoolExecutor(max_workers=workers or pool.size) as executor:
+        for start in range(0, len(pending), RECIPIENT_BATCH_SIZE):
+            batch = pending[start:start + RECIPIENT_BATCH_SIZE]
+            recipients = lookup_recipients(sorted({entries[0]['customer_id'] for entries in batch}))
+            # list() re-raises the first unexpected error (e.g. the ledger) here
+            list(executor.map(lambda entries: deliver(entries, recipients), batch))
+
+    logger.info("Finished statement delivery", extra={'period': period, **metrics.snapshot()})
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Email archived statements for a period to customers")
+    parser.add_argument('--period', required=True, help="Statement period to deliver, as YYYY-MM")
+    parser.add_argument('--render-missing', action='store_true',
+                        help="Render and archive statements for accounts that have none for the period "
+                             "before sending")
+    parser.add_argument('--connections', type=int,
+                        help="Concurrent SMTP connections (default: SMTP_CONNECTIONS in config.ini)")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Attempts per message before it is recorded as failed (default: %(default)s)")
+    parser.add_argument('--limit', type=int, help="Send at most this many statements in this run")
+    parser.add_argument('--ledger', help="Progress ledger (default: delivery.sqlite3 in the archive directory)")
+    parser.add_argument('--metrics-file', help="Write the run's metrics here in Prometheus text format")
+    args = parser.parse_args(argv)
+
+    from generate_pdf import DEFAULT_PDF_PRESET, DatabaseConnection, get_archive, get_config, parse_period, \
+        produce_statement
+
+    try:
+        period_end = parse_period(args.period)[1]
+    except ValueError:
+        parser.error("--period must be YYYY-MM")
+    if args.render_missing and period_end > datetime.today():
+        parser.error("--render-missing needs a closed period; the current period's statements are not archived")
+
+    config = get_config()
+    ledger = DeliveryLedger(args.ledger or os.path.join(config['ARCHIVE_DIR'], 'delivery.sqlite3'))
+    pool = SMTPPool(
+        smtp_factory(config['SMTP_HOST'], config['SMTP_PORT'], config['SMTP_USER'], config['SMTP_PASSWORD'],
+                     config['SMTP_STARTTLS']),
+        size=args.connections or config['SMTP_CONNECTIONS'],
+        messages_per_connection=config['SMTP_MESSAGES_PER_CONNECTION']
+    )
+    archive = get_archive()
+    metrics = DeliveryMetrics()
+    connection = DatabaseConnection(config).connect()
+    try:
+        accounts = fetch_statement_accounts(connection, period_end)
+        missing = unarchived_accounts(archive, accounts, args.period)
+        if missing and args.render_missing:
+            logger.info("Rendering missing statements", extra={'period': args.period, 'accounts': len(missing)})
+            render_missing(missing, lambda customer_id: produce_statement(
+                customer_id, None, args.period, True, 'zip', DEFAULT_PDF_PRESET, False))
+            missing = unarchived_accounts(archive, accounts, args.period)
+        if missing:
+            logger.error("Accounts without an archived statement", extra={
+                'period': args.period, 'count': len(missing), 'accounts': missing[:MISSING_SHOWN]})
+        metrics.add(unarchived=len(missing))
+
+        run_delivery(archive, ledger, pool, lambda ids: fetch_recipients(connection, ids),
+                     args.period, config['DELIVERY_SENDER'], limit=args.limit,
+                     max_attempts=args.max_attempts, metrics=metrics)
+    finally:
+        pool.close()
+        connection.close()
+
+    summary = metrics.snapshot()
+    print(f"Delivered statements for {args.period}: {summary['sent']} sent, {summary['failed']} failed, "
+          f"{summary['skipped']} already sent, {summary['retried']} retries, "
+          f"{summary['messages_per_second']} messages/s over {pool.opened} connection(s)")
+    if missing:
+        shown = ', '.join(f"customer {customer_id} (account {account_id})"
+                          for customer_id, account_id in missing[:MISSING_SHOWN])
+        more = f" and {len(missing) - MISSING_SHOWN} more" if len(missing) > MISSING_SHOWN else ""
+        hint = "" if args.render_missing else " Re-run with --render-missing to render them first."
+        print(f"{len(missing)} account(s) have no archived statement for {args.period} and were not emailed: "
+              f"{shown}{more}.{hint}", file=sys.stderr)
+    if args.metrics_file:
+        with open(args.metrics_file, 'w', encoding='utf-8') as f:
+            f.write(metrics.prometheus())
+    return 1 if summary['failed'] or missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+dimensions.py
+
+In-process intern tables for the merchant and category dimensions.
+
+Transactions store integer merchant_key/category_key columns instead of
+repeating merchant and category names (db/migrations/003_dimension_tables.sql).
+Statement queries fetch only the keys; names are resolved here from a
+per-process table that is loaded once and shared by every fetched row, so
+each name exists as one interned string however many rows reference it.
+
+Dimension rows are never renamed (a new name gets a new key), so cached
+entries never go stale; keys added after the preload are fetched on the
+first miss.
+"""
+
+import logging
+import sys
+import threading
+
+logger = logging.getLogger("statement_web_app.dimensions")
+
+DEFAULT_CATEGORY = 'General'
+
+
+class InternTable:
+    """Maps the integer keys of one dimension table to interned names."""
+
+    def __init__(self, table, key_column, name_column):
+        self.table = table
+        self.key_column = key_column
+        self.name_column = name_column
+        self.loaded = False
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def _store(self, rows):
+        with self._lock:
+            for row in rows:
+                self._names[row['dim_key']] = sys.intern(row['dim_name'])
+
+    def preload(self, connection):
+        """Load every row of the dimension table."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {self.key_column} AS dim_key, {self.name_column} AS dim_name FROM {self.table}")
+            self._store(cursor.fetchall())
+        self.loaded = True
+        logger.info("Loaded %s %s", len(self._names), self.table)
+
+    def resolve(self, connection, keys):
+        """Make sure every key in keys is cached, loading the table or the missing keys."""
+        if not self.loaded:
+            self.preload(connection)
+        missing = {key for key in keys if key is not None and key not in self._names}
+        if missing:
+            placeholders = ', '.join(['%s'] * len(missing))
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT {self.key_column} AS dim_key, {self.name_column} AS dim_name "
+                               f"FROM {self.table} WHERE {self.key_column} IN ({placeholders})", sorted(missing))
+                self._store(cursor.fetchall())
+
+    def name(self, key, default=None):
+        return self._names.get(key, default)
+
+
+merchants = InternTable('Merchants', 'merchant_key', 'merchant_name')
+categories = InternTable('Categories', 'category_key', 'category_name')
+
+
+def preload(connection):
+    """Load both intern tables (e.g. before gunicorn forks its workers)."""
+    merchants.preload(connection)
+    categories.preload(connection)
+
+
+def attach_names(connection, transactions):
+    """Fill merchant_name and category into transaction rows from their keys.
+
+    Uncategorised rows get DEFAULT_CATEGORY. Returns transactions.
+    """
+    merchants.resolve(connection, {t['merchant_key'] for t in transactions})
+    categories.resolve(connection, {t['category_key'] for t in transactions})
+    for transaction in transactions:
+        transaction['merchant_name'] = merchants.name(transaction['merchant_key'], '')
+        transaction['category'] = categories.name(transaction['category_key'], DEFAULT_CATEGORY)
+    return transactions
@@ -0,0 +1,156 @@
+"""
+fx.py
+
+Converts statement transactions into the account's billing currency.
+
+Rates come from the FxRates table, quoted as the value of one unit of each
+currency in BASE_CURRENCY. The rates in effect on a date are loaded with one
+query and cached per date, so a statement cycle loads them once however many
+statements are rendered. Conversion is done per currency batch in exact
+integer arithmetic on minor units: each (source, target) pair is reduced to
+one integer fraction and every amount in the batch is scaled by it, rounding
+half away from zero.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from math import gcd
+
+BASE_CURRENCY = 'SGD'
+DEFAULT_MINOR_DIGITS = 2
+MINOR_DIGITS = {'JPY': 0, 'KRW': 0}
+
+
+class MissingRateError(LookupError):
+    """Raised when no rate is known for a currency on the requested date."""
+
+
+def minor_digits(currency):
+    return MINOR_DIGITS.get(currency, DEFAULT_MINOR_DIGITS)
+
+
+def to_minor(amount, currency):
+    """Decimal amount -> integer minor units (cents), rounding half away from zero."""
+    scaled = Decimal(amount).scaleb(minor_digits(currency))
+    return int(scaled.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor, currency):
+    return Decimal(minor).scaleb(-minor_digits(currency))
+
+
+def scale_minor(minors, numerator, denominator):
+    """Multiply integer amounts by numerator/denominator, rounding half away from zero."""
+    half = denominator // 2
+    return [(m * numerator + half) // denominator if m >= 0 else -((-m * numerator + half) // denominator)
+            for m in minors]
+
+
+class RateTable:
+    """Rates in effect on one date: currency -> value of one unit in BASE_CURRENCY."""
+
+    def __init__(self, as_of, rates):
+        self.as_of = as_of
+        self.rates = {currency: Decimal(rate) for currency, rate in rates.items()}
+        self.rates[BASE_CURRENCY] = Decimal(1)
+        self._factors = {}
+
+    def factor(self, source, target):
+        """Reduced integer fraction converting source minor units to target minor units."""
+        key = (source, target)
+        if key not in self._factors:
+            missing = [currency for currency in (source, target) if currency not in self.rates]
+            if missing:
+                raise MissingRateError(f"No FX rate for {', '.join(missing)} on {self.as_of}")
+            source_num, source_den = self.rates[source].as_integer_ratio()
+            target_num, target_den = self.rates[target].as_integer_ratio()
+            numerator = source_num * target_den * 10 ** minor_digits(target)
+            denominator = source_den * target_num * 10 ** minor_digits(source)
+            divisor = gcd(numerator, denominator)
+            self._factors[key] = (numerator // divisor, denominator // divisor)
+        return self._factors[key]
+
+    def convert(self, amounts, source, target):
+        """Convert a batch of Decimal amounts from source to target currency."""
+        if source == target:
+            return [Decimal(amount) for amount in amounts]
+        numerator, denominator = self.factor(source, target)
+        minors = scale_minor([to_minor(amount, source) for amount in amounts], numerator, denominator)
+        return [from_minor(minor, target) for minor in minors]
+
+
+# The latest rate on or before a date (the one parameter) for every currency
+LATEST_RATES_SQL = """
+            SELECT r.currency, r.rate_to_base
+            FROM FxRates r
+            JOIN (
+                SELECT currency, MAX(rate_date) AS rate_date
+                FROM FxRates
+                WHERE rate_date <= %s
+                GROUP BY currency
+            ) latest ON latest.currency = r.currency AND latest.rate_date = r.rate_date
+"""
+
+
+def load_rates(connection, as_of):
+    """Load the latest rate on or before as_of for every currency."""
+    with connection.cursor() as cursor:
+        cursor.execute(LATEST_RATES_SQL, (as_of,))
+        return RateTable(as_of, {row['currency']: row['rate_to_base'] for row in cursor.fetchall()})
+
+
+class RateCache:
+    """Rate tables by date, loaded once per date.
+
+    Past dates are final. Tables for today are reloaded after current_ttl
+    seconds so rates published during the day are picked up.
+    """
+
+    def __init__(self, max_entries=36, current_ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.current_ttl = current_ttl
+        self.clock = clock
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, connection, as_of, loader=load_rates):
+        if isinstance(as_of, datetime):
+            as_of = as_of.date()
+        with self._lock:
+            entry = self._tables.get(as_of)
+            if entry and (entry[1] is None or entry[1] > self.clock()):
+                self._tables.move_to_end(as_of)
+                return entry[0]
+
+        table = loader(connection, as_of)
+        expires = self.clock() + self.current_ttl if as_of >= date.today() else None
+        with self._lock:
+            self._tables[as_of] = (table, expires)
+            self._tables.move_to_end(as_of)
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+        return table
+
+
+rate_cache = RateCache()
+
+
+def normalise(transactions, billing_currency, rates):
+    """Add billing_amount (in billing_currency) to each transaction row.
+
+    Rows are converted in one batch per original currency; transaction_amount
+    and currency keep the original values. Returns transactions.
+    """
+    batches = {}
+    for transaction in transactions:
+        currency = transaction.get('currency') or BASE_CURRENCY
+        batches.setdefault(currency, []).append(transaction)
+
+    for currency, rows in batches.items():
+        converted = rates.convert([row['transaction_amount'] for row in rows], currency, billing_currency)
+        for row, amount in zip(rows, converted):
+            row['billing_amount'] = amount
+    return transactions
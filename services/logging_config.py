@@ -0,0 +1,149 @@
+"""
+logging_config.py
+
+Non-blocking logging for the request hot path.
+
+Request threads only put records on an in-memory queue (QueueHandler); a
+single background QueueListener thread formats them as JSON lines and writes
+them to stderr and, optionally, a log file. Each record carries the request's
+correlation ID, and routine success lines logged with extra={'sampled': True}
+are kept only at the configured sample rate.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id', 'sampled'}
+
+_listeners = {}  # logger name -> QueueListener
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request's correlation ID to each record."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records flagged with extra={'sampled': True}."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'sampled', False):
+            return random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps extra fields instead of flattening to text.
+
+    The stock prepare() formats the record (including the traceback) into
+    record.msg; here only the message arguments are merged and the traceback
+    is rendered to exc_text so the record stays picklable and structured.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(logger_name, log_file=None, sample_rate=1.0, level=logging.INFO, stream=None):
+    """Route logger_name through a queue to a stream and, if log_file is set, a file.
+
+    The file is appended to by every worker process, so it is never rotated
+    here: WatchedFileHandler reopens it after an external tool such as
+    logrotate has moved it. Each logger name gets its own queue and listener
+    thread, so loggers configured with different files do not share
+    destinations. Calling it again for a configured name returns the logger
+    unchanged.
+    """
+    logger = logging.getLogger(logger_name)
+    if logger_name in _listeners:
+        return logger
+
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler(stream or sys.stderr)]
+    if log_file:
+        handlers.append(logging.handlers.WatchedFileHandler(log_file, encoding='utf-8', delay=True))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RequestIdFilter())
+
+    logger.setLevel(level)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[logger_name] = listener
+    return logger
+
+
+def _restart_listeners():
+    for name, listener in _listeners.items():
+        _listeners[name] = logging.handlers.QueueListener(listener.queue, *listener.handlers,
+                                                          respect_handler_level=True)
+        _listeners[name].start()
+
+
+def stop_logging(logger_name=None):
+    """Flush queued records and stop the listener thread of one logger, or of all."""
+    names = [logger_name] if logger_name is not None else list(_listeners)
+    for name in names:
+        listener = _listeners.pop(name, None)
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+
+atexit.register(stop_logging)
+# The listener thread does not survive fork (e.g. gunicorn preload mode)
+os.register_at_fork(after_in_child=_restart_listeners)
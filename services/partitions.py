@@ -0,0 +1,199 @@
+"""
+partitions.py
+
+Maintenance for the monthly RANGE partitions of Transactions.
+
+Transactions is partitioned by transaction_date with one partition per month
+(p202504 holds April 2025), a p_history partition below the first month and
+a p_future catch-all. This command
+
+* splits p_future so the current month and the next months_ahead months each
+  have their own partition, and
+* moves partitions that ended more than retention_months ago into the
+  compressed TransactionsArchive table and drops them, once every row of
+  the partition is found unchanged in the archive.
+
+Run it daily or monthly from cron; it only does work when a month boundary
+has passed, and re-running it is safe.
+
+Usage:
+    python -m services.partitions [--months-ahead 3] [--retention-months 24] [--dry-run]
+"""
+
+import argparse
+import logging
+import sys
+from datetime import date, datetime
+
+logger = logging.getLogger("statement_web_app.partitions")
+
+TABLE = 'Transactions'
+ARCHIVE_TABLE = 'TransactionsArchive'
+FUTURE_PARTITION = 'p_future'
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_RETENTION_MONTHS = 24
+
+# Column order shared by Transactions and TransactionsArchive
+COLUMNS = [
+    'transaction_id', 'account_id', 'transaction_date', 'settlement_date', 'merchant_key', 'category_key',
+    'transaction_amount', 'transaction_type', 'transaction_reference', 'transaction_status', 'currency',
+    'exchange_rate', 'description'
+]
+
+
+class ArchiveMismatchError(RuntimeError):
+    """Raised instead of dropping a partition whose rows are not all in the archive table."""
+
+
+def add_months(month, count):
+    """First day of the month count months after month's."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def parse_bound(description):
+    """Upper bound of a RANGE COLUMNS partition ("'2025-05-01'"), or None for MAXVALUE."""
+    value = description.strip().strip("'")
+    if value.upper() == 'MAXVALUE':
+        return None
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def list_partitions(connection, table=TABLE):
+    """Return [(name, upper_bound)] in partition order; upper_bound is None for MAXVALUE."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS description
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """, (table,))
+        return [(row['name'], parse_bound(row['description'])) for row in cursor.fetchall()]
+
+
+def plan(partitions, today, months_ahead=DEFAULT_MONTHS_AHEAD, retention_months=DEFAULT_RETENTION_MONTHS):
+    """Work out which monthly partitions to add and which to archive.
+
+    Returns (months_to_add, partitions_to_archive): the first days of the
+    months needing a partition, and the names of bounded partitions whose
+    whole range is older than the retention cutoff.
+    """
+    bounds = [bound for _, bound in partitions if bound is not None]
+    if not bounds:
+        raise ValueError(f"{TABLE} has no monthly partitions; apply db/migrations/004_partition_transactions.sql")
+
+    current_month = date(today.year, today.month, 1)
+    target = add_months(current_month, months_ahead + 1)
+    month = max(bounds)
+    months_to_add = []
+    while month < target:
+        months_to_add.append(month)
+        month = add_months(month, 1)
+
+    cutoff = add_months(current_month, -retention_months)
+    to_archive = [name for name, bound in partitions if bound is not None and bound <= cutoff]
+    return months_to_add, to_archive
+
+
+def reorganize_sql(months, table=TABLE):
+    """ALTER TABLE statement splitting the catch-all partition into monthly ones."""
+    clauses = [f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+               for month in months]
+    clauses.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return (f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO (\n    "
+            + ",\n    ".join(clauses) + "\n)")
+
+
+def archive_sql(partition, table=TABLE, archive_table=ARCHIVE_TABLE):
+    """Statements copying one partition into the archive table, checking the copy and dropping it.
+
+    Returns [insert, verify, drop]. The insert skips rows already archived,
+    so a retry after a failed DROP is harmless, and any other error fails
+    the statement rather than being downgraded to a warning as with INSERT
+    IGNORE. verify counts the partition's rows (partition_rows) and those
+    found with identical values in the archive (archived_rows); the
+    partition may only be dropped when the two are equal.
+    """
+    columns = ', '.join(COLUMNS)
+    selected = ', '.join(f"t.{column}" for column in COLUMNS)
+    identical = ' AND '.join(f"a.{column} <=> t.{column}" for column in COLUMNS)
+    return [
+        f"INSERT INTO {archive_table} ({columns}) SELECT {selected} FROM {table} PARTITION ({partition}) t "
+        f"LEFT JOIN {archive_table} a ON a.transaction_id = t.transaction_id WHERE a.transaction_id IS NULL",
+        f"SELECT COUNT(*) AS partition_rows, COUNT(a.transaction_id) AS archived_rows "
+        f"FROM {table} PARTITION ({partition}) t LEFT JOIN {archive_table} a ON {identical}",
+        f"ALTER TABLE {table} DROP PARTITION {partition}"
+    ]
+
+
+def run_maintenance(connection, today=None, months_ahead=DEFAULT_MONTHS_AHEAD,
+                    retention_months=DEFAULT_RETENTION_MONTHS, dry_run=False):
+    """Add upcoming partitions and archive expired ones.
+
+    Returns the SQL statements executed (or that would be, with dry_run).
+    Raises ArchiveMismatchError, leaving the partition in place, if a
+    partition's rows are not all in the archive table after the copy.
+    """
+    months_to_add, to_archive = plan(list_partitions(connection), today or date.today(),
+                                     months_ahead, retention_months)
+    statements = []
+    if months_to_add:
+        statements.append(reorganize_sql(months_to_add))
+    verifies = {}
+    for partition in to_archive:
+        insert, verify, drop = archive_sql(partition)
+        statements.extend((insert, verify, drop))
+        verifies[verify] = partition
+
+    if dry_run:
+        return statements
+
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+            if sql in verifies:
+                counts = cursor.fetchone()
+                if counts['partition_rows'] != counts['archived_rows']:
+                    raise ArchiveMismatchError(
+                        f"{TABLE} partition {verifies[sql]} has {counts['partition_rows']} rows but only "
+                        f"{counts['archived_rows']} are in {ARCHIVE_TABLE}; the partition was not dropped")
+                continue
+            connection.commit()
+            logger.info("Partition maintenance", extra={'statement': sql.splitlines()[0], 'rows': cursor.rowcount})
+    return statements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create upcoming Transactions partitions and archive old ones")
+    parser.add_argument('--months-ahead', type=int, default=DEFAULT_MONTHS_AHEAD,
+                        help="Future months to keep partitions for (default: %(default)s)")
+    parser.add_argument('--retention-months', type=int, default=DEFAULT_RETENTION_MONTHS,
+                        help="Months of history to keep in Transactions (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="Print the SQL without running it")
+    args = parser.parse_args(argv)
+
+    from generate_pdf import DatabaseConnection, get_config
+
+    connection = DatabaseConnection(get_config()).connect()
+    try:
+        statements = run_maintenance(connection, months_ahead=args.months_ahead,
+                                     retention_months=args.retention_months, dry_run=args.dry_run)
+    except ArchiveMismatchError as mismatch:
+        print(f"Partition maintenance stopped: {mismatch}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    for sql in statements:
+        print(sql + ';')
+    if not statements:
+        print("Partitions are up to date")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
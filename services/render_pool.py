@@ -0,0 +1,84 @@
+"""
+render_pool.py
+
+Renders statement HTML to PDF bytes in a pool of worker processes.
+
+WeasyPrint layout is pure Python and holds the GIL, so independent documents
+(language variants, chunks of a long statement) only render in parallel in
+separate processes. Workers are started with forkserver where available so
+they never inherit the web server's threads or locks, and they import only
+WeasyPrint, not the Flask app.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+RENDER_WORKERS = int(os.environ.get('STATEMENT_RENDER_WORKERS', os.cpu_count() or 1))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_pdf(html_content, options=None):
+    """Render one HTML document to PDF bytes with WeasyPrint write_pdf options."""
+    from weasyprint import HTML
+    return HTML(string=html_content).write_pdf(**(options or {}))
+
+
+def _load_weasyprint():
+    """Pool initializer: import WeasyPrint before the worker's first render."""
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        pass  # render_pdf raises the error for the render that needs it
+
+
+def get_executor():
+    """Return the shared process pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=context,
+                                            initializer=_load_weasyprint)
+        return _executor
+
+
+def render_many(documents, options=None):
+    """Render several HTML documents, returning their PDF bytes in order.
+
+    A single document (or a single configured worker) is rendered in-process
+    to avoid the round trip through the pool.
+    """
+    if len(documents) <= 1 or RENDER_WORKERS <= 1:
+        return [render_pdf(html_content, options) for html_content in documents]
+
+    executor = get_executor()
+    futures = [executor.submit(render_pdf, html_content, options) for html_content in documents]
+    return [future.result() for future in futures]
+
+
+def warm_up():
+    """Start every pool worker and render once in this process.
+
+    Lets benchmarks time renders without process start-up and the
+    WeasyPrint import landing in their first sample.
+    """
+    render_pdf("<p>warm-up</p>")
+    if RENDER_WORKERS > 1:
+        executor = get_executor()
+        # Each submit to a pool without idle workers starts another worker
+        for future in [executor.submit(_load_weasyprint) for _ in range(RENDER_WORKERS)]:
+            future.result()
+
+
+def shutdown():
+    """Stop the worker processes."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
@@ -0,0 +1,208 @@
+"""
+rewards.py
+
+Set-based reward points accrual for a statement cycle.
+
+Points for every account are computed in MySQL with one INSERT ... SELECT ...
+GROUP BY per batch of account IDs and upserted into Rewards, so a cycle costs
+a handful of statements rather than one round trip per account. Re-running a
+cycle is a no-op: Rewards.last_accrual_period records the last cycle applied.
+Spend is converted to fx.BASE_CURRENCY with the FxRates in effect on the
+cycle's last day, as statements are; a cycle with a currency that has no rate
+fails before any points are written.
+
+Usage:
+    python -m services.rewards --period 2025-04 [--batch-size 5000]
+"""
+
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from services import fx
+
+logger = logging.getLogger("statement_web_app.rewards")
+
+DEFAULT_BATCH_SIZE = 5000
+POINTS_PER_UNIT = 1           # points per whole unit (in fx.BASE_CURRENCY) of completed purchase spend
+CATEGORY_MULTIPLIERS = {      # bonus categories
+    'Travel': 2,
+    'Accommodation': 2,
+    'Dining': 2
+}
+POINTS_VALIDITY_MONTHS = 12
+
+# Minimum points for each tier, highest first
+TIER_THRESHOLDS = [
+    ('Platinum', 12000),
+    ('Gold', 7000),
+    ('Silver', 3000),
+    ('Standard', 0)
+]
+
+
+def tier_for_points(points):
+    """Tier earned by a points balance (mirrors the SQL CASE expression)."""
+    for tier, minimum in TIER_THRESHOLDS:
+        if points >= minimum:
+            return tier
+    return 'Standard'
+
+
+def _tier_case(points_expr):
+    whens = ' '.join(f"WHEN {points_expr} >= {minimum} THEN '{tier}'"
+                     for tier, minimum in TIER_THRESHOLDS[:-1])
+    return f"CASE {whens} ELSE 'Standard' END"
+
+
+def _base_amount_expr():
+    """SQL for a transaction row's amount in fx.BASE_CURRENCY (rates joined as `fx`)."""
+    return (f"t.transaction_amount * IF(COALESCE(t.currency, '{fx.BASE_CURRENCY}') = '{fx.BASE_CURRENCY}', "
+            f"1, fx.rate_to_base)")
+
+
+def _points_expr():
+    """SQL for the points a transaction row earns (refunds/credits claw back)."""
+    multiplier = ' '.join(f"WHEN '{category}' THEN {factor}" for category, factor in CATEGORY_MULTIPLIERS.items())
+    amount = _base_amount_expr()
+    return f"""
+        CASE t.transaction_type
+            WHEN 'Purchase' THEN {amount} * {POINTS_PER_UNIT}
+                * CASE c.category_name {multiplier} ELSE 1 END
+            WHEN 'Refund' THEN -{amount} * {POINTS_PER_UNIT}
+            WHEN 'Credit' THEN -{amount} * {POINTS_PER_UNIT}
+            ELSE 0
+        END"""
+
+
+def build_missing_rates_sql():
+    """SELECT of the cycle's foreign currencies that have no rate.
+
+    Parameters: rate date, cycle_start, cycle_end.
+    """
+    return f"""
+        SELECT DISTINCT t.currency
+        FROM Transactions t
+        LEFT JOIN ({fx.LATEST_RATES_SQL}) AS fx ON fx.currency = t.currency
+        WHERE t.transaction_date >= %s AND t.transaction_date < %s
+          AND t.transaction_status = 'Completed'
+          AND COALESCE(t.currency, '{fx.BASE_CURRENCY}') != '{fx.BASE_CURRENCY}'
+          AND fx.rate_to_base IS NULL
+        ORDER BY t.currency
+    """
+
+
+def build_points_sql():
+    """SELECT of (account_id, points) earned in one cycle by a range of accounts.
+
+    Parameters: rate date, cycle_start, cycle_end, first_account_id,
+    last_account_id.
+    """
+    return f"""
+            SELECT t.account_id, GREATEST(FLOOR(SUM({_points_expr()})), 0) AS points
+            FROM Transactions t
+            LEFT JOIN Categories c ON c.category_key = t.category_key
+            LEFT JOIN ({fx.LATEST_RATES_SQL}) AS fx ON fx.currency = t.currency
+            WHERE t.transaction_date >= %s AND t.transaction_date < %s
+              AND t.transaction_status = 'Completed'
+              AND t.account_id BETWEEN %s AND %s
+            GROUP BY t.account_id
+    """
+
+
+def build_accrual_sql():
+    """INSERT ... SELECT upsert accruing one cycle's points for a range of accounts.
+
+    Parameters: cycle_start (expiry base), period, rate date, cycle_start,
+    cycle_end, first_account_id, last_account_id.
+
+    ON DUPLICATE KEY UPDATE assignments run left to right, so points and
+    expiry are guarded by the old last_accrual_period, tier_level sees the
+    updated points, and last_accrual_period is written last.
+    """
+    applies = "(Rewards.last_accrual_period IS NULL OR Rewards.last_accrual_period < VALUES(last_accrual_period))"
+    return f"""
+        INSERT INTO Rewards (account_id, reward_points, tier_level, points_expiry_date, last_accrual_period)
+        SELECT accrued.account_id,
+               accrued.points,
+               {_tier_case('accrued.points')},
+               DATE_ADD(%s, INTERVAL {POINTS_VALIDITY_MONTHS} MONTH),
+               %s
+        FROM ({build_points_sql()}) AS accrued
+        ON DUPLICATE KEY UPDATE
+            reward_points = IF({applies}, Rewards.reward_points + VALUES(reward_points), Rewards.reward_points),
+            points_expiry_date = IF({applies}, VALUES(points_expiry_date), Rewards.points_expiry_date),
+            tier_level = {_tier_case('reward_points')},
+            last_accrual_period = GREATEST(COALESCE(Rewards.last_accrual_period, ''), VALUES(last_accrual_period))
+    """
+
+
+def cycle_bounds(period):
+    """Return the [start, end) datetimes of a 'YYYY-MM' cycle."""
+    start = datetime.strptime(period, '%Y-%m')
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def run_accrual(connection, period, batch_size=DEFAULT_BATCH_SIZE):
+    """Accrue points for every account for one cycle.
+
+    Each batch of account IDs is one set-based upsert committed on its own,
+    so a failure part-way keeps the finished batches (and re-running skips
+    them). Returns the number of Rewards rows inserted or changed.
+
+    Raises fx.MissingRateError, before accruing anything, if a currency spent
+    in the cycle has no rate on or before its last day.
+    """
+    cycle_start, cycle_end = cycle_bounds(period)
+    rate_date = (cycle_end - timedelta(days=1)).date()
+    sql = build_accrual_sql()
+    changed = 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(build_missing_rates_sql(), (rate_date, cycle_start, cycle_end))
+        missing = [row['currency'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()]
+        if missing:
+            raise fx.MissingRateError(f"No FX rate for {', '.join(missing)} on {rate_date}")
+
+        cursor.execute("SELECT MIN(account_id) AS first_id, MAX(account_id) AS last_id FROM Accounts")
+        bounds = cursor.fetchone()
+        first_id, last_id = (bounds['first_id'], bounds['last_id']) if isinstance(bounds, dict) else bounds
+        if first_id is None:
+            return 0
+
+        for batch_start in range(first_id, last_id + 1, batch_size):
+            batch_end = min(batch_start + batch_size - 1, last_id)
+            cursor.execute(sql, (cycle_start, period, rate_date, cycle_start, cycle_end, batch_start, batch_end))
+            changed += cursor.rowcount
+            connection.commit()
+            logger.info("Accrued rewards batch", extra={'period': period, 'first_account_id': batch_start,
+                                                        'last_account_id': batch_end, 'rows': cursor.rowcount})
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accrue reward points for a statement cycle")
+    parser.add_argument('--period', required=True, help="Cycle to accrue, as YYYY-MM")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Accounts per upsert statement (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    from generate_pdf import DatabaseConnection, get_config
+
+    connection = DatabaseConnection(get_config()).connect()
+    try:
+        changed = run_accrual(connection, args.period, args.batch_size)
+    except fx.MissingRateError as missing:
+        print(f"Cannot accrue rewards for {args.period}: {missing}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+    print(f"Accrued rewards for {args.period}: {changed} row change(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+spending.py
+
+Per-month and per-category spending summaries read from the SpendingRollup
+table.
+
+SpendingRollup holds one row per (account, month, category, currency) with
+completed purchase and refund totals. Triggers on Transactions keep it up to
+date as rows are inserted, updated or deleted (db/dbs_bankdb.sql,
+db/migrations/002_spending_rollup.sql), so a summary reads at most
+accounts x months x categories rows however long the account's history is.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 60
+
+SPENDING_SQL = """
+    SELECT r.spend_month, r.category, r.currency,
+           SUM(r.spend_amount) AS spend_amount,
+           SUM(r.refund_amount) AS refund_amount,
+           SUM(r.transaction_count) AS transaction_count
+    FROM Accounts a
+    JOIN SpendingRollup r ON r.account_id = a.account_id
+    WHERE a.customer_id = %s AND r.spend_month >= %s
+    GROUP BY r.spend_month, r.category, r.currency
+"""
+
+
+def window_start(months, today=None):
+    """First day of the earliest month in a window of months ending this month."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _amount(value):
+    return float(Decimal(value or 0).quantize(Decimal('0.01')))
+
+
+def summarise(rows):
+    """Shape rollup rows into month and category series, one per currency.
+
+    Amounts in different currencies are never added together.
+    """
+    by_month = {}
+    by_category = {}
+    for row in rows:
+        month = row['spend_month'].strftime('%Y-%m')
+        spend = Decimal(row['spend_amount'] or 0)
+        refunds = Decimal(row['refund_amount'] or 0)
+        count = int(row['transaction_count'] or 0)
+        for totals, key in ((by_month, (month, row['currency'])),
+                            (by_category, (row['category'], row['currency']))):
+            entry = totals.setdefault(key, [Decimal(0), Decimal(0), 0])
+            entry[0] += spend
+            entry[1] += refunds
+            entry[2] += count
+
+    def series(totals, label):
+        return [
+            {label: name, 'currency': currency, 'spend': _amount(spend), 'refunds': _amount(refunds),
+             'net': _amount(spend - refunds), 'transactions': count}
+            for (name, currency), (spend, refunds, count) in totals.items()
+        ]
+
+    return {
+        'by_month': sorted(series(by_month, 'month'), key=lambda item: (item['month'], item['currency'])),
+        'by_category': sorted(series(by_category, 'category'), key=lambda item: (-item['spend'], item['category']))
+    }
@@ -0,0 +1,183 @@
+"""
+statement_archive.py
+
+Content-addressed storage for generated statement PDFs.
+
+Each PDF is stored once under its SHA-256 digest in a sharded directory tree
+(blobs/ab/cd/<digest>.pdf, optionally gzip-compressed), and an embedded
+SQLite index maps (customer, account, period, language) to the blob so a past
+statement can be served without touching MySQL or WeasyPrint. The index also
+remembers each customer's preferred language as last read from MySQL, so a
+request that names no language can be answered from the archive too.
+"""
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    compressed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS statements (
+    customer_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    period TEXT NOT NULL,
+    language TEXT NOT NULL,
+    digest TEXT NOT NULL REFERENCES blobs(digest),
+    filename TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (customer_id, period, language, account_id)
+);
+CREATE TABLE IF NOT EXISTS preferred_languages (
+    customer_id INTEGER PRIMARY KEY,
+    language TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+ENTRY_COLUMNS = ('customer_id', 'account_id', 'period', 'language', 'digest', 'filename', 'size', 'compressed')
+ENTRY_SQL = """SELECT s.customer_id, s.account_id, s.period, s.language, s.digest, s.filename,
+                      b.size, b.compressed
+               FROM statements s JOIN blobs b ON b.digest = s.digest"""
+
+
+class StatementArchive:
+    """Stores statement PDFs by content hash with a local SQLite index."""
+
+    def __init__(self, root, compress=False):
+        """Open (creating if needed) the archive rooted at root.
+
+        compress gzips newly stored blobs; existing blobs are read in
+        whichever form they were written.
+        """
+        self.root = root
+        self.compress = compress
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.index_path = os.path.join(root, 'index.sqlite3')
+        self._local = threading.local()
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+        connection.commit()
+
+    def _connection(self):
+        """Return this thread's SQLite connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.index_path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def blob_path(self, digest, compressed):
+        """Sharded location of a blob: blobs/ab/cd/<digest>.pdf[.gz]."""
+        suffix = '.pdf.gz' if compressed else '.pdf'
+        return os.path.join(self.blob_dir, digest[:2], digest[2:4], digest + suffix)
+
+    def put(self, pdf_bytes, customer_id, account_id, period, language, filename):
+        """Store a statement PDF and index it, returning its digest.
+
+        Identical PDFs are written only once; re-archiving a key replaces
+        the index entry.
+        """
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
+        connection = self._connection()
+
+        row = connection.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            data = gzip.compress(pdf_bytes, mtime=0) if self.compress else pdf_bytes
+            self._write_atomic(self.blob_path(digest, self.compress), data)
+            connection.execute(
+                'INSERT OR IGNORE INTO blobs (digest, size, stored_size, compressed) VALUES (?, ?, ?, ?)',
+                (digest, len(pdf_bytes), len(data), int(self.compress))
+            )
+
+        connection.execute(
+            """INSERT OR REPLACE INTO statements
+               (customer_id, account_id, period, language, digest, filename, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (customer_id, account_id, period, language, digest, filename,
+             datetime.now().isoformat(timespec='seconds'))
+        )
+        connection.commit()
+        return digest
+
+    def lookup(self, customer_id, period, language, account_id=None):
+        """Return the index entry for a statement as a dict, or None."""
+        query = ENTRY_SQL + ' WHERE s.customer_id = ? AND s.period = ? AND s.language = ?'
+        params = [customer_id, period, language]
+        if account_id is not None:
+            query += ' AND s.account_id = ?'
+            params.append(account_id)
+
+        row = self._connection().execute(query, params).fetchone()
+        if row is None:
+            return None
+        return dict(zip(ENTRY_COLUMNS, row))
+
+    def entries(self, period):
+        """Return the index entries of every statement archived for a period."""
+        rows = self._connection().execute(
+            ENTRY_SQL + ' WHERE s.period = ? ORDER BY s.customer_id, s.account_id, s.language', (period,))
+        return [dict(zip(ENTRY_COLUMNS, row)) for row in rows]
+
+    def read(self, entry):
+        """Return the PDF bytes for an index entry, or None if its blob is missing."""
+        path = self.blob_path(entry['digest'], entry['compressed'])
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if entry['compressed']:
+            data = gzip.decompress(data)
+        return data
+
+    def remember_preferred_language(self, customer_id, language):
+        """Record the customer's preferred language as just read from MySQL."""
+        connection = self._connection()
+        connection.execute(
+            """INSERT INTO preferred_languages (customer_id, language, updated_at) VALUES (?, ?, ?)
+               ON CONFLICT (customer_id) DO UPDATE SET language = excluded.language, updated_at = excluded.updated_at
+               WHERE language != excluded.language""",
+            (customer_id, language, datetime.now().isoformat(timespec='seconds'))
+        )
+        connection.commit()
+
+    def preferred_language(self, customer_id):
+        """Return the last recorded preferred language for a customer, or None."""
+        row = self._connection().execute(
+            'SELECT language FROM preferred_languages WHERE customer_id = ?', (customer_id,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, customer_id, period, language, account_id=None):
+        """Return (pdf_bytes, filename) for an archived statement, or None."""
+        entry = self.lookup(customer_id, period, language, account_id)
+        if entry is None:
+            return None
+
+        data = self.read(entry)
+        if data is None:
+            return None
+        return data, entry['filename']
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,5 @@
+import os
+
+# Importing the app starts its logging; keep test runs from writing
+# statement_web_app.log into the working tree
+os.environ.setdefault('STATEMENT_LOG_FILE', '')
@@ -0,0 +1,58 @@
+"""Test doubles shared by the service tests."""
+
+
+class FakeClock:
+    """A monotonic clock the test moves by hand (clock.now += seconds)."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCursor:
+    """pymysql DictCursor stand-in answering from its connection's respond().
+
+    rowcount is the number of rows respond() returned for the last query.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append((sql, params))
+        self.rows = list(self.connection.respond(sql, params))
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    """pymysql connection stand-in recording executed (sql, params) and commits.
+
+    respond(sql, params) returns the rows a query produces; by default none.
+    """
+
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda sql, params: [])
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
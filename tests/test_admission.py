@@ -0,0 +1,137 @@
+import threading
+import unittest
+
+from services import admission
+from tests.helpers import FakeClock
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        limiter = admission.CustomerRateLimiter(rate_per_minute=6, burst=2, clock=clock)
+
+        limiter.check(1)
+        limiter.check(1)
+        with self.assertRaises(admission.RateLimited) as raised:
+            limiter.check(1)
+        self.assertEqual(raised.exception.status, 429)
+        self.assertEqual(raised.exception.retry_after, 10)
+
+        limiter.check(2)  # other customers have their own bucket
+        clock.now += 10
+        limiter.check(1)
+        self.assertEqual(limiter.rejected, 1)
+
+
+class TestRouteLimiter(unittest.TestCase):
+    def test_sheds_when_queue_full(self):
+        limiter = admission.RouteLimiter('render', max_concurrent=1, max_queue=0, queue_timeout=5)
+        limiter.acquire()
+
+        with self.assertRaises(admission.Overloaded) as raised:
+            limiter.acquire()
+        self.assertEqual(raised.exception.status, 503)
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual((limiter.admitted, limiter.rejected), (1, 1))
+
+        limiter.release(0.5)
+        limiter.acquire()
+        self.assertEqual(limiter.active, 1)
+
+    def test_queue_timeout(self):
+        limiter = admission.RouteLimiter('render', max_concurrent=1, max_queue=1, queue_timeout=0.01)
+        limiter.acquire()
+        with self.assertRaises(admission.Overloaded):
+            limiter.acquire()
+        self.assertEqual(limiter.waiting, 0)
+
+    def test_queued_request_runs_after_release(self):
+        limiter = admission.RouteLimiter('render', max_concurrent=1, max_queue=1, queue_timeout=5)
+        limiter.acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.run(lambda: 'done')))
+        waiter.start()
+        while limiter.waiting == 0:
+            pass
+        limiter.release()
+        waiter.join(5)
+        self.assertEqual(results, ['done'])
+        self.assertEqual(limiter.active, 0)
+
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.controller = admission.AdmissionController(
+            {'render': (2, 2, 5)}, customer_rate_per_minute=60, customer_burst=1)
+
+    def test_coalesces_identical_requests(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def render():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return b'%PDF'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(
+            self.controller.run('render', render, customer_key=7, flight_key=(7, 'en'))))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(
+            self.controller.run('render', render, customer_key=7, flight_key=(7, 'en'))))
+        follower.start()
+        while self.controller.coalesced == 0:
+            pass
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(results, [b'%PDF', b'%PDF'])
+        self.assertEqual(len(calls), 1)  # one render and one token for both clicks
+
+    def test_leader_error_reaches_followers_and_clears_flight(self):
+        with self.assertRaises(ValueError):
+            self.controller.run('render', lambda: int('x'), flight_key='k')
+        self.assertEqual(self.controller.run('render', lambda: 'ok', flight_key='k'), 'ok')
+
+    def test_metrics(self):
+        self.controller.run('render', lambda: None, customer_key=1)
+        with self.assertRaises(admission.RateLimited):
+            self.controller.run('render', lambda: None, customer_key=1)
+
+        text = self.controller.metrics()
+        self.assertIn('admission_queue_depth{route_class="render"} 0', text)
+        self.assertIn('admission_admitted_total{route_class="render"} 1', text)
+        self.assertIn('admission_rate_limited_total 1', text)
+        self.assertIn('# TYPE admission_rejected_total counter', text)
+
+    def test_metrics_keep_each_family_together(self):
+        controller = admission.AdmissionController(
+            {'render': (2, 2, 5), 'api': (4, 4, 2)}, customer_rate_per_minute=60, customer_burst=1)
+        lines = controller.metrics().splitlines()
+        families = []
+        for line in lines:
+            name = line.split()[2] if line.startswith('#') else line.split('{')[0].split()[0]
+            if not families or families[-1] != name:
+                families.append(name)
+        self.assertEqual(len(families), len(set(families)))
+
+        help_at = lines.index('# HELP admission_active Requests currently holding a slot.')
+        self.assertEqual(lines[help_at + 1], '# TYPE admission_active gauge')
+        self.assertTrue(lines[help_at + 2].startswith('admission_active{route_class='))
+
+
+class TestThreadBudget(unittest.TestCase):
+    def test_route_classes_must_leave_reserved_threads_free(self):
+        limits = {'render': (2, 2, 10), 'api': (1, 1, 2)}
+        admission.check_thread_budget(threads=8, limits=limits, reserved_threads=2)
+        with self.assertRaisesRegex(ValueError, 'render 4, api 2: 6 in all'):
+            admission.check_thread_budget(threads=8, limits=limits, reserved_threads=3)
+        with self.assertRaises(ValueError):
+            admission.check_thread_budget(threads=8, limits={**limits, 'api': (16, 32, 2)}, reserved_threads=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from benchmarks import bench_statement
+
+
+class TestBenchmarkComparison(unittest.TestCase):
+    def setUp(self):
+        self.baseline = {'results': {
+            'calculate_totals[rows=10]': {'median': 0.010},
+            'format_currency': {'median': 0.020},
+            'build_statement_html[rows=10,lang=en]': {'median': 0.030},
+            'validate_email': {'median': 0.001}
+        }}
+        self.current = {'results': {
+            'calculate_totals[rows=10]': {'median': 0.012},
+            'format_currency': {'median': 0.0205},
+            'build_statement_html[rows=10,lang=en]': {'median': 0.015},
+            'validate_date': {'median': 0.001}
+        }}
+
+    def test_compare_results_flags_regressions_over_threshold(self):
+        rows = {row[0]: row for row in bench_statement.compare_results(self.baseline, self.current, threshold=10)}
+        self.assertEqual(rows['calculate_totals[rows=10]'][4], 'regression')
+        self.assertAlmostEqual(rows['calculate_totals[rows=10]'][3], 20.0)
+        self.assertEqual(rows['format_currency'][4], 'ok')
+        self.assertEqual(rows['build_statement_html[rows=10,lang=en]'][4], 'improvement')
+        self.assertEqual(rows['validate_email'][4], 'missing')
+        self.assertEqual(rows['validate_date'][4], 'new')
+
+    def test_compare_results_respects_threshold(self):
+        rows = {row[0]: row for row in bench_statement.compare_results(self.baseline, self.current, threshold=25)}
+        self.assertEqual(rows['calculate_totals[rows=10]'][4], 'ok')
+
+    def test_measure_returns_per_call_statistics(self):
+        stats = bench_statement.measure(lambda: sum(range(100)), repeat=3, min_time=0.001)
+        self.assertEqual(stats['repeat'], 3)
+        self.assertGreaterEqual(stats['loops'], 1)
+        self.assertLessEqual(stats['min'], stats['median'])
+        self.assertLessEqual(stats['median'], stats['max'])
+
+    def test_make_transactions_is_deterministic(self):
+        self.assertEqual(bench_statement.make_transactions(5), bench_statement.make_transactions(5))
+        self.assertEqual(len(bench_statement.make_transactions(50)), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
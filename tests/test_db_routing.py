@@ -0,0 +1,70 @@
+import unittest
+
+from services import db_routing
+from tests.helpers import FakeClock
+
+
+class FakeConnection:
+    def __init__(self, replica):
+        self.replica = replica
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestReplicaRouting(unittest.TestCase):
+    def setUp(self):
+        self.replicas = [('replica-a', 3307), ('replica-b', 3308)]
+        self.lags = {replica: 0 for replica in self.replicas}
+        self.down = set()
+        self.clock = FakeClock()
+        self.router = db_routing.ReplicaRouter(
+            self.replicas, max_lag=30, retry_after=60, lag_check_interval=0,
+            lag_probe=lambda connection: self.lags[connection.replica], clock=self.clock)
+
+    def connect(self, host, port):
+        if (host, port) in self.down:
+            raise ConnectionError("refused")
+        return FakeConnection((host, port))
+
+    def acquired(self):
+        return self.router.acquire(self.connect)[1]
+
+    def test_parse_replicas(self):
+        self.assertEqual(db_routing.parse_replicas('db1:3307, db2'), [('db1', 3307), ('db2', 3306)])
+        self.assertEqual(db_routing.parse_replicas(''), [])
+
+    def test_round_robin(self):
+        self.assertEqual([self.acquired() for _ in range(4)], self.replicas * 2)
+
+    def test_failed_replica_is_skipped_until_retry(self):
+        self.down.add(self.replicas[0])
+        self.assertEqual([self.acquired() for _ in range(3)], [self.replicas[1]] * 3)
+
+        self.down.clear()
+        self.clock.now += 61
+        self.assertIn(self.replicas[0], [self.acquired() for _ in range(2)])
+
+    def test_lagging_replica_is_skipped_and_closed(self):
+        self.lags[self.replicas[0]] = 120
+        connection, replica = self.router.acquire(self.connect)
+        self.assertEqual(replica, self.replicas[1])
+        self.assertEqual([self.acquired() for _ in range(2)], [self.replicas[1]] * 2)
+
+    def test_stopped_replication_counts_as_lagging(self):
+        self.lags[self.replicas[0]] = None
+        self.assertEqual(self.acquired(), self.replicas[1])
+
+    def test_no_usable_replica_returns_none(self):
+        self.down.update(self.replicas)
+        self.assertEqual(self.router.acquire(self.connect), (None, None))
+
+    def test_shared_router_per_configuration(self):
+        first = db_routing.get_router(self.replicas, max_lag=5)
+        self.assertIs(first, db_routing.get_router(self.replicas, max_lag=5))
+        self.assertIsNot(first, db_routing.get_router(self.replicas, max_lag=10))
+
+
+if __name__ == '__main__':
+    unittest.main()
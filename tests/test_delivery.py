@@ -0,0 +1,237 @@
+import os
+import smtplib
+import sqlite3
+import tempfile
+import unittest
+
+from services import delivery
+from services.statement_archive import StatementArchive
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; failures pops errors to raise, one per send.
+
+    With the server's drops_socket set, a failing send first closes the
+    socket, as smtplib does when the server disconnects.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+        self.sock = object()
+
+    def send_message(self, message):
+        if self.server.failures:
+            error = self.server.failures.pop(0)
+            if error is not None:
+                if self.server.drops_socket:
+                    self.sock = None
+                raise error
+        self.server.messages.append(message)
+
+    def quit(self):
+        self.close()
+
+    def close(self):
+        self.closed = True
+        self.sock = None
+
+
+class FakeServer:
+    def __init__(self, failures=(), drops_socket=False):
+        self.failures = list(failures)
+        self.drops_socket = drops_socket
+        self.messages = []
+        self.connections = []
+
+    def connect(self):
+        smtp = FakeSMTP(self)
+        self.connections.append(smtp)
+        return smtp
+
+
+class TestSMTPPool(unittest.TestCase):
+    def test_reuses_connections_up_to_message_limit(self):
+        server = FakeServer()
+        pool = delivery.SMTPPool(server.connect, size=2, messages_per_connection=3)
+        for _ in range(7):
+            with pool.connection() as smtp:
+                smtp.send_message('m')
+        self.assertEqual(pool.opened, 3)
+        self.assertEqual([smtp.closed for smtp in server.connections], [True, True, False])
+
+    def test_dropped_connection_is_discarded(self):
+        server = FakeServer([smtplib.SMTPServerDisconnected('gone')])
+        pool = delivery.SMTPPool(server.connect, size=1)
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            with pool.connection() as smtp:
+                smtp.send_message('m')
+        with pool.connection() as smtp:
+            smtp.send_message('m')
+        self.assertEqual(pool.opened, 2)
+        self.assertTrue(server.connections[0].closed)
+
+    def test_refused_recipient_keeps_connection(self):
+        server = FakeServer([smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'no such user')})])
+        pool = delivery.SMTPPool(server.connect, size=1)
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            with pool.connection() as smtp:
+                smtp.send_message('m')
+        with pool.connection() as smtp:
+            smtp.send_message('m')
+        self.assertEqual(pool.opened, 1)
+
+    def discarded_after(self, server, error_type):
+        pool = delivery.SMTPPool(server.connect, size=1)
+        with self.assertRaises(error_type):
+            with pool.connection() as smtp:
+                smtp.send_message('m')
+        with pool.connection() as smtp:
+            smtp.send_message('m')
+        return pool.opened == 2 and server.connections[0].closed
+
+    def test_service_closing_reply_discards_connection(self):
+        server = FakeServer([smtplib.SMTPDataError(421, b'closing channel')])
+        self.assertTrue(self.discarded_after(server, smtplib.SMTPDataError))
+
+    def test_reply_after_socket_closed_discards_connection(self):
+        server = FakeServer([smtplib.SMTPDataError(451, b'try later')], drops_socket=True)
+        self.assertTrue(self.discarded_after(server, smtplib.SMTPDataError))
+
+    def test_other_replies_keep_connection(self):
+        server = FakeServer([smtplib.SMTPDataError(451, b'try later')])
+        self.assertFalse(self.discarded_after(server, smtplib.SMTPDataError))
+
+
+class TestSendWithRetry(unittest.TestCase):
+    def test_transient_errors_are_retried_with_backoff(self):
+        server = FakeServer([smtplib.SMTPServerDisconnected('gone'), smtplib.SMTPDataError(451, b'try later')])
+        pool = delivery.SMTPPool(server.connect, size=1)
+        waits = []
+        attempts = delivery.send_with_retry(pool, 'm', max_attempts=3, backoff=2, sleep=waits.append)
+        self.assertEqual(attempts, 3)
+        self.assertEqual(len(server.messages), 1)
+        self.assertTrue(1 <= waits[0] <= 2 and 2 <= waits[1] <= 4)
+
+    def test_permanent_error_is_not_retried(self):
+        server = FakeServer([smtplib.SMTPDataError(554, b'rejected')])
+        pool = delivery.SMTPPool(server.connect, size=1)
+        waits = []
+        with self.assertRaises(delivery.DeliveryFailed) as raised:
+            delivery.send_with_retry(pool, 'm', sleep=waits.append)
+        self.assertEqual((raised.exception.attempts, waits), (1, []))
+
+    def test_gives_up_after_max_attempts(self):
+        server = FakeServer([OSError('refused')] * 5)
+        pool = delivery.SMTPPool(server.connect, size=1)
+        with self.assertRaises(delivery.DeliveryFailed) as raised:
+            delivery.send_with_retry(pool, 'm', max_attempts=2, sleep=lambda _: None)
+        self.assertEqual(raised.exception.attempts, 2)
+
+
+class TestRunDelivery(unittest.TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.archive = StatementArchive(root)
+        for customer_id in (1, 2, 3):
+            pdf = b'%PDF-1.7\n' + str(customer_id).encode() * 50
+            self.archive.put(pdf, customer_id, customer_id * 10, '2025-03', 'en', f'statement_{customer_id}.pdf')
+        self.ledger = delivery.DeliveryLedger(os.path.join(root, 'delivery.sqlite3'))
+        self.recipients = {
+            1: {'customer_id': 1, 'first_name': 'John', 'email': 'john@example.com', 'preferred_language': 'en'},
+            2: {'customer_id': 2, 'first_name': 'Mei', 'email': 'mei@example.com', 'preferred_language': 'en'},
+            3: {'customer_id': 3, 'first_name': 'Ravi', 'email': None, 'preferred_language': 'en'}
+        }
+        self.lookups = []
+
+    def lookup(self, customer_ids):
+        self.lookups.append(customer_ids)
+        return {customer_id: self.recipients[customer_id] for customer_id in customer_ids}
+
+    def run_once(self, server):
+        pool = delivery.SMTPPool(server.connect, size=2)
+        return delivery.run_delivery(self.archive, self.ledger, pool, self.lookup, '2025-03',
+                                     'DBS Bank <statements@localhost>', sleep=lambda _: None)
+
+    def test_sends_statements_and_records_progress(self):
+        server = FakeServer([smtplib.SMTPServerDisconnected('gone')])
+        metrics = self.run_once(server)
+
+        self.assertEqual(sorted(m['To'] for m in server.messages), ['john@example.com', 'mei@example.com'])
+        attachment = next(server.messages[0].iter_attachments())
+        self.assertEqual(attachment.get_content_type(), 'application/pdf')
+        self.assertEqual(self.lookups, [[1, 2, 3]])
+        self.assertEqual((metrics.sent, metrics.failed, metrics.retried), (2, 1, 1))
+        self.assertEqual(self.ledger.counts('2025-03'), {'sent': 2, 'failed': 1})
+
+    def test_rerun_resumes_with_unsent_statements(self):
+        self.run_once(FakeServer())
+        self.recipients[3]['email'] = 'ravi@example.com'
+
+        server = FakeServer()
+        metrics = self.run_once(server)
+        self.assertEqual([m['To'] for m in server.messages], ['ravi@example.com'])
+        self.assertEqual((metrics.sent, metrics.skipped), (1, 2))
+        self.assertEqual(self.ledger.counts('2025-03'), {'sent': 3})
+
+    def test_one_message_per_account_in_the_preferred_language(self):
+        self.archive.put(b'%PDF-1.7\n' + b'zh' * 50, 2, 20, '2025-03', 'zh', 'statement_2_zh.pdf')
+        self.archive.put(b'%PDF-1.7\n' + b'ta' * 50, 1, 10, '2025-03', 'ta', 'statement_1_ta.pdf')
+        self.recipients[2]['preferred_language'] = 'zh'
+        self.recipients[1]['preferred_language'] = 'ms'  # not archived: English is sent
+
+        server = FakeServer()
+        metrics = self.run_once(server)
+
+        sent = {m['To']: next(m.iter_attachments()).get_filename() for m in server.messages}
+        self.assertEqual(sent, {'john@example.com': 'statement_1.pdf', 'mei@example.com': 'statement_2_zh.pdf'})
+        self.assertEqual((metrics.sent, metrics.failed), (2, 1))
+        self.assertEqual(self.ledger.counts('2025-03'), {'sent': 2, 'failed': 1})
+        self.assertEqual(self.ledger.sent('2025-03'), {(1, 10), (2, 20)})
+
+        rerun = FakeServer()
+        self.assertEqual(self.run_once(rerun).skipped, 2)
+        self.assertEqual(rerun.messages, [])
+
+    def test_ledger_keyed_by_language_is_migrated(self):
+        path = os.path.join(tempfile.mkdtemp(), 'delivery.sqlite3')
+        connection = sqlite3.connect(path)
+        connection.executescript(delivery.LEDGER_SCHEMA.replace(
+            'PRIMARY KEY (period, customer_id, account_id)', 'PRIMARY KEY (period, customer_id, account_id, language)'))
+        connection.executemany(
+            "INSERT INTO deliveries VALUES ('2025-03', 1, 10, ?, 'd', 'john@example.com', ?, 1, NULL, ?)",
+            [('en', 'sent', '2025-04-01T10:00:00'), ('zh', 'failed', '2025-04-01T10:01:00')])
+        connection.commit()
+        connection.close()
+
+        ledger = delivery.DeliveryLedger(path)
+        self.assertEqual(ledger.sent('2025-03'), {(1, 10)})
+        self.assertEqual(ledger.counts('2025-03'), {'sent': 1})
+
+        entry = {'period': '2025-03', 'customer_id': 1, 'account_id': 10, 'language': 'zh', 'digest': 'e'}
+        ledger.record(entry, 'john@example.com', 'failed', 2, 'try later')
+        self.assertEqual(ledger.counts('2025-03'), {'failed': 1})
+
+    def test_accounts_without_archived_statements(self):
+        accounts = [(1, 10), (2, 20), (3, 30), (4, 40), (5, 50)]
+        self.assertEqual(delivery.unarchived_accounts(self.archive, accounts, '2025-03'), [(4, 40), (5, 50)])
+
+        def render(customer_id):
+            if customer_id == 5:
+                raise RuntimeError("no account")
+            self.archive.put(b'%PDF-1.7\n4', customer_id, customer_id * 10, '2025-03', 'en', 'statement_4.pdf')
+
+        delivery.render_missing([(4, 40), (5, 50)], render)
+        self.assertEqual(delivery.unarchived_accounts(self.archive, accounts, '2025-03'), [(5, 50)])
+
+    def test_prometheus_metrics(self):
+        text = self.run_once(FakeServer()).prometheus()
+        self.assertIn('# TYPE statement_delivery_sent_total counter', text)
+        self.assertIn('statement_delivery_sent_total 2', text)
+        self.assertIn('statement_delivery_failed_total 1', text)
+        self.assertIn('statement_delivery_messages_per_second', text)
+        self.assertIn('statement_delivery_unarchived 0', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock
+
+from services import dimensions
+from tests.helpers import FakeConnection
+
+
+def dimension_tables(merchants, categories):
+    """A connection serving the Merchants and Categories tables from {key: name} dicts.
+
+    Names are copied per query, as pymysql would, so interning is observable.
+    """
+    tables = {'Merchants': merchants, 'Categories': categories}
+
+    def respond(sql, params):
+        names = tables['Merchants' if 'FROM Merchants' in sql else 'Categories']
+        keys = params if params else names.keys()
+        return [{'dim_key': key, 'dim_name': ''.join(list(names[key]))} for key in keys if key in names]
+
+    return FakeConnection(respond)
+
+
+def transaction(merchant_key, category_key):
+    return {'transaction_id': 1, 'transaction_date': datetime(2025, 4, 1), 'merchant_key': merchant_key,
+            'category_key': category_key, 'transaction_amount': Decimal('10.00'), 'transaction_type': 'Purchase'}
+
+
+class TestDimensions(unittest.TestCase):
+    def setUp(self):
+        for name, table in (('merchants', dimensions.InternTable('Merchants', 'merchant_key', 'merchant_name')),
+                            ('categories', dimensions.InternTable('Categories', 'category_key', 'category_name'))):
+            patcher = mock.patch.object(dimensions, name, table)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.merchants = {1: 'Starbucks', 2: 'Grab'}
+        self.connection = dimension_tables(self.merchants, {1: 'Dining', 2: 'Transportation'})
+
+    def test_attach_names_preloads_once(self):
+        rows = dimensions.attach_names(self.connection, [transaction(1, 1), transaction(2, None)])
+
+        self.assertEqual([(t['merchant_name'], t['category']) for t in rows],
+                         [('Starbucks', 'Dining'), ('Grab', dimensions.DEFAULT_CATEGORY)])
+        self.assertEqual(len(self.connection.executed), 2)
+
+        dimensions.attach_names(self.connection, [transaction(2, 2)])
+        self.assertEqual(len(self.connection.executed), 2)  # served from the intern tables
+
+    def test_names_are_shared_between_rows(self):
+        first, second = dimensions.attach_names(self.connection, [transaction(1, 1), transaction(1, 1)])
+        self.assertIs(first['merchant_name'], second['merchant_name'])
+
+    def test_new_keys_fetched_on_miss(self):
+        dimensions.preload(self.connection)
+        self.merchants[3] = 'Cold Storage'
+
+        rows = dimensions.attach_names(self.connection, [transaction(3, 1)])
+        self.assertEqual(rows[0]['merchant_name'], 'Cold Storage')
+        sql, params = self.connection.executed[-1]
+        self.assertIn('WHERE merchant_key IN (%s)', sql)
+        self.assertEqual(params, [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
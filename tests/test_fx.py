@@ -0,0 +1,70 @@
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+
+from services import fx
+from tests.helpers import FakeClock
+
+
+class TestFx(unittest.TestCase):
+    def setUp(self):
+        self.rates = fx.RateTable(date(2025, 4, 30), {'HKD': Decimal('0.1745'), 'JPY': Decimal('0.00865')})
+
+    def test_convert_batch_to_billing_currency(self):
+        converted = self.rates.convert([Decimal('12500.00'), Decimal('0.03'), Decimal('98.00')], 'HKD', 'SGD')
+        # 12500 * 0.1745 = 2181.25; 0.03 * 0.1745 = 0.005235 -> 0.01; 98 * 0.1745 = 17.101
+        self.assertEqual(converted, [Decimal('2181.25'), Decimal('0.01'), Decimal('17.10')])
+
+    def test_cross_rate_and_minor_digits(self):
+        # 1000 JPY -> HKD: 1000 * 0.00865 / 0.1745 = 49.570...
+        self.assertEqual(self.rates.convert([Decimal('1000')], 'JPY', 'HKD'), [Decimal('49.57')])
+        # 100 SGD -> JPY has no minor unit: 100 / 0.00865 = 11560.69...
+        self.assertEqual(self.rates.convert([Decimal('100.00')], 'SGD', 'JPY'), [Decimal('11561')])
+
+    def test_rounds_half_away_from_zero(self):
+        self.assertEqual(fx.scale_minor([5, -5, 4], 1, 10), [1, -1, 0])
+
+    def test_missing_rate(self):
+        with self.assertRaises(fx.MissingRateError):
+            self.rates.convert([Decimal('1.00')], 'EUR', 'SGD')
+
+    def test_normalise_keeps_original_amounts(self):
+        transactions = [
+            {'transaction_amount': Decimal('100.00'), 'currency': 'SGD'},
+            {'transaction_amount': Decimal('12500.00'), 'currency': 'HKD'},
+            {'transaction_amount': Decimal('5.00'), 'currency': None},
+        ]
+        fx.normalise(transactions, 'SGD', self.rates)
+        self.assertEqual([t['billing_amount'] for t in transactions],
+                         [Decimal('100.00'), Decimal('2181.25'), Decimal('5.00')])
+        self.assertEqual(transactions[1]['transaction_amount'], Decimal('12500.00'))
+
+    def test_rate_cache_loads_once_per_date(self):
+        clock = FakeClock()
+        cache = fx.RateCache(max_entries=2, current_ttl=60, clock=clock)
+        loads = []
+
+        def loader(connection, as_of):
+            loads.append(as_of)
+            return fx.RateTable(as_of, {})
+
+        past = date(2025, 4, 30)
+        cache.get(None, past, loader)
+        clock.now += 10 ** 6
+        cache.get(None, past, loader)  # past dates never expire
+        self.assertEqual(loads, [past])
+
+        today = date.today()
+        cache.get(None, today, loader)
+        cache.get(None, today, loader)
+        clock.now += 61
+        cache.get(None, today, loader)
+        self.assertEqual(loads, [past, today, today])
+
+        cache.get(None, today - timedelta(days=400), loader)  # evicts the least recently used
+        cache.get(None, past, loader)
+        self.assertEqual(len(loads), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
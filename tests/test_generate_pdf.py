@@ -0,0 +1,452 @@
+import copy
+import io
+import re
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from datetime import datetime
+from unittest import mock
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+import generate_pdf
+from benchmarks.bench_statement import make_account, make_customer, make_transactions
+from services import fx, render_pool
+from services.admission import AdmissionController
+from services.statement_archive import StatementArchive
+
+ROWS_PER_FAKE_PAGE = 30
+
+
+def weasyprint_available():
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def text_pdf(pages):
+    """A real PDF with one page per list of text lines, readable by pypdf's extract_text."""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica')
+    }))
+    for lines in pages:
+        page = writer.add_blank_page(612, 792)
+        shown = ' T* '.join('(' + re.sub(r'([\\()])', r'\\\1', line) + ') Tj' for line in lines)
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 8 Tf 10 TL 20 770 Td {shown} ET".encode('latin-1', 'replace'))
+        page[NameObject('/Contents')] = writer._add_object(content)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+        })
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def statement_rows(html_content):
+    """Merchant names of the transaction rows in a statement document, in order."""
+    return re.findall(r'<tr>\s*<td>[^<]*</td>\s*<td>([^<]*)</td>', html_content)
+
+
+def fake_render(html_content, options=None):
+    """Stands in for WeasyPrint.
+
+    A page-number overlay becomes one "Page n of N" page per blank page. A
+    statement becomes pages of ROWS_PER_FAKE_PAGE merchant names, the first
+    line naming the language and the write_pdf options.
+    """
+    blank_pages = html_content.count('<div class="page"></div>')
+    if blank_pages:
+        return text_pdf([[f"Page {n} of {blank_pages}"] for n in range(1, blank_pages + 1)])
+
+    language = re.search(r'<html lang="(\w+)"', html_content).group(1)
+    rows = statement_rows(html_content)
+    pages = [rows[start:start + ROWS_PER_FAKE_PAGE] for start in range(0, len(rows), ROWS_PER_FAKE_PAGE)] or [[]]
+    pages[0] = [f"lang={language} options={sorted((options or {}).items())}"] + pages[0]
+    return text_pdf(pages)
+
+
+def page_texts(pdf_bytes):
+    return [page.extract_text() for page in PdfReader(io.BytesIO(pdf_bytes)).pages]
+
+
+def make_rows(count):
+    """Transactions with unique merchant names, so row order can be checked."""
+    rows = make_transactions(count)
+    for index, row in enumerate(rows):
+        row['merchant_name'] = f"Shop{index:05d}"
+    return rows
+
+
+class RenderStubTestCase(unittest.TestCase):
+    """Replaces WeasyPrint with render() and keeps rendering in-process."""
+
+    def render(self, html_content, options=None):
+        self.rendered.append(html_content)
+        return fake_render(html_content, options)
+
+    def setUp(self):
+        self.rendered = []
+        for patcher in (mock.patch.object(render_pool, 'RENDER_WORKERS', 1),
+                        mock.patch.object(render_pool, 'render_pdf', self.render)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.generator = generate_pdf.StatementGenerator()
+        self.customer, self.account = make_customer(), make_account()
+
+
+class RouteTestCase(RenderStubTestCase):
+    """Flask test client with the database, archive and admission limits stubbed."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer['preferred_language'] = 'en'
+        self.account['billing_currency'] = 'SGD'
+        self.transactions = make_rows(12)
+        self.fetches = []
+        self.fetch_error = None
+        self.archive = StatementArchive(tempfile.mkdtemp())
+        admission = AdmissionController({'render': (4, 4, 5), 'api': (4, 4, 5)},
+                                        customer_rate_per_minute=600, customer_burst=100)
+
+        test = self
+
+        def fetch_customer_data(db, customer_id, period=None, read_your_writes=False):
+            test.fetches.append((customer_id, period, read_your_writes))
+            if test.fetch_error:
+                raise test.fetch_error
+            if customer_id != test.customer['customer_id']:
+                return None, None, []
+            return copy.deepcopy(test.customer), copy.deepcopy(test.account), copy.deepcopy(test.transactions)
+
+        for patcher in (mock.patch.object(generate_pdf.DatabaseConnection, 'fetch_customer_data',
+                                          fetch_customer_data),
+                        mock.patch.object(generate_pdf, 'get_archive', lambda: self.archive),
+                        mock.patch.object(generate_pdf, 'get_admission', lambda: admission)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = generate_pdf.app.test_client()
+
+    def download_name(self, response):
+        return re.search(r'filename=([^;]+)', response.headers['Content-Disposition']).group(1).strip('"')
+
+
+class TestPdfPresets(RenderStubTestCase):
+    def test_presets_set_distinct_options(self):
+        options = [tuple(sorted(preset.items())) for preset in generate_pdf.PDF_PRESETS.values()]
+        self.assertEqual(len(set(options)), len(options))
+
+    def test_preset_options_reach_the_renderer(self):
+        first_lines = {
+            preset: page_texts(self.generator.generate_statement_pdf(
+                self.customer, self.account, make_transactions(5), preset=preset).getvalue())[0].splitlines()[0]
+            for preset in generate_pdf.PDF_PRESETS
+        }
+        self.assertEqual(len(set(first_lines.values())), len(first_lines))
+        self.assertIn("('hinting', True)", first_lines['print'])
+
+
+@unittest.skipUnless(weasyprint_available(), "WeasyPrint cannot load its native libraries")
+class TestPdfPresetsRendered(unittest.TestCase):
+    def test_presets_render_differently(self):
+        generator = generate_pdf.StatementGenerator()
+        sizes = {
+            preset: len(generator.generate_statement_pdf(make_customer(), make_account(), make_transactions(20),
+                                                         preset=preset).getvalue())
+            for preset in generate_pdf.PDF_PRESETS
+        }
+        self.assertEqual(len(set(sizes.values())), len(sizes))
+
+
+class TestChunkedRender(RenderStubTestCase):
+    def test_long_statement_renders_in_chunks_and_merges_in_order(self):
+        rows = make_rows(2 * generate_pdf.CHUNK_ROWS + 100)
+        with mock.patch.object(generate_pdf, 'CHUNKED_RENDER_MIN_ROWS', len(rows)):
+            pdf = self.generator.generate_statement_pdf(self.customer, self.account, rows).getvalue()
+
+        chunks, overlay = self.rendered[:-1], self.rendered[-1]
+        self.assertEqual([len(statement_rows(chunk)) for chunk in chunks],
+                         [generate_pdf.CHUNK_ROWS, generate_pdf.CHUNK_ROWS, 100])
+        self.assertEqual([('class="header"' in chunk, 'class="totals"' in chunk) for chunk in chunks],
+                         [(True, False), (False, False), (False, True)])
+
+        # Each chunk paginates on its own; the overlay numbers the merged pages
+        pages_per_chunk = [-(-len(statement_rows(chunk)) // ROWS_PER_FAKE_PAGE) for chunk in chunks]
+        texts = page_texts(pdf)
+        self.assertEqual(len(texts), sum(pages_per_chunk))
+        self.assertEqual(overlay.count('<div class="page"></div>'), len(texts))
+        for number, text in enumerate(texts, start=1):
+            self.assertIn(f"Page {number} of {len(texts)}", text)
+
+        merchants = [line for text in texts for line in text.splitlines() if line.startswith('Shop')]
+        self.assertEqual(merchants, [row['merchant_name'] for row in rows])
+
+    def test_short_statement_renders_as_one_document(self):
+        rows = make_rows(40)
+        with mock.patch.object(generate_pdf, 'CHUNKED_RENDER_MIN_ROWS', 41):
+            pdf = self.generator.generate_statement_pdf(self.customer, self.account, rows).getvalue()
+
+        self.assertEqual(len(self.rendered), 1)
+        self.assertEqual(len(page_texts(pdf)), 2)
+
+
+class TestWorkerThreads(unittest.TestCase):
+    def test_render_limits_fit_the_default_gunicorn_threads(self):
+        generate_pdf.check_worker_threads(8)
+        with self.assertRaises(ValueError):
+            generate_pdf.check_worker_threads(4)
+
+
+class TestApiAdmission(RouteTestCase):
+    URLS = ('/api/customer/1', '/api/customer/1/spending', '/statement/preview?customer_id=1&period=2025-04')
+
+    def setUp(self):
+        super().setUp()
+        # The configured limits rather than RouteTestCase's roomy ones
+        self.admission = AdmissionController(generate_pdf.admission_limits(generate_pdf.get_config()),
+                                             customer_rate_per_minute=600, customer_burst=100)
+        patcher = mock.patch.object(generate_pdf, 'get_admission', lambda: self.admission)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_api_routes_are_shed_when_saturated(self):
+        limiter = self.admission.limiters['api']
+        for _ in range(limiter.max_concurrent):
+            limiter.acquire()
+        waiters = [threading.Thread(target=limiter.acquire) for _ in range(limiter.max_queue)]
+        for waiter in waiters:
+            waiter.start()
+        while limiter.waiting < limiter.max_queue:
+            time.sleep(0.001)
+
+        for url in self.URLS:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 503, url)
+            self.assertIn('Retry-After', response.headers)
+        self.assertEqual(self.fetches, [])
+        self.assertEqual(limiter.rejected, len(self.URLS))
+
+        for _ in range(limiter.max_concurrent):
+            limiter.release()
+        for waiter in waiters:
+            waiter.join()
+            limiter.release()
+        self.assertEqual(self.client.get('/api/customer/1').status_code, 200)
+
+
+class TestResolveLanguages(unittest.TestCase):
+    def test_defaults_to_preferred_language(self):
+        self.assertEqual(generate_pdf.resolve_languages(None, {'preferred_language': 'zh'}), ['zh'])
+        self.assertEqual(generate_pdf.resolve_languages('', {}), ['en'])
+
+    def test_comma_list_is_normalised_and_deduplicated(self):
+        self.assertEqual(generate_pdf.resolve_languages(' ZH, en ,zh,xx', {}), ['zh', 'en'])
+
+    def test_all_and_unsupported(self):
+        self.assertEqual(generate_pdf.resolve_languages('ALL', {}), list(generate_pdf.translations))
+        self.assertEqual(generate_pdf.resolve_languages('xx,yy', {'preferred_language': 'zh'}), ['en'])
+
+
+class TestStatementBundles(RouteTestCase):
+    def test_zip_bundle_for_a_period(self):
+        response = self.client.get('/generate_statement?customer_id=1&language=en,zh&period=2025-04')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/zip')
+        self.assertEqual(self.download_name(response), 'DBS_Statement_John_Tan_202504_en_zh.zip')
+        self.assertEqual(len(self.fetches), 1)
+        with zipfile.ZipFile(io.BytesIO(response.data)) as bundle:
+            self.assertEqual(bundle.namelist(), ['DBS_Statement_John_Tan_202504_en.pdf',
+                                                 'DBS_Statement_John_Tan_202504_zh.pdf'])
+            self.assertIn('lang=zh', page_texts(bundle.read('DBS_Statement_John_Tan_202504_zh.pdf'))[0])
+
+    def test_combined_pdf_bundle_keeps_language_order(self):
+        response = self.client.get('/generate_statement?customer_id=1&language=all&bundle=pdf&period=2025-04')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/pdf')
+        languages = '_'.join(generate_pdf.translations)
+        self.assertEqual(self.download_name(response), f'DBS_Statement_John_Tan_202504_{languages}.pdf')
+        first_lines = [text.splitlines()[0] for text in page_texts(response.data)]
+        self.assertEqual([line.split()[0] for line in first_lines],
+                         [f'lang={language}' for language in generate_pdf.translations])
+
+    def test_invalid_bundle_format(self):
+        response = self.client.get('/generate_statement?customer_id=1&language=en,zh&bundle=tar')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.fetches, [])
+
+
+class TestStatementArchiveRouting(RouteTestCase):
+    PAST = '/generate_statement?customer_id=1&language=en&period=2025-04'
+
+    def test_closed_period_is_served_from_the_archive(self):
+        first = self.client.get(self.PAST)
+        second = self.client.get(self.PAST)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(len(self.rendered), 1)
+
+    def test_other_presets_are_not_served_the_archived_standard_pdf(self):
+        self.client.get(self.PAST)
+        response = self.client.get(self.PAST + '&preset=print')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.rendered), 2)
+        self.assertIn("('hinting', True)", page_texts(response.data)[0])
+        # The archived copy is still the standard one
+        archived, _ = self.archive.get(1, '2025-04', 'en')
+        self.assertNotIn('hinting', page_texts(archived)[0])
+
+    def test_fresh_bypasses_and_replaces_the_archive(self):
+        self.client.get(self.PAST)
+        self.transactions = make_rows(3)
+        response = self.client.get(self.PAST + '&fresh=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.rendered), 2)
+        self.assertEqual(self.fetches[-1], (1, '2025-04', True))
+        self.assertEqual(statement_rows(self.rendered[-1]), ['Shop00000', 'Shop00001', 'Shop00002'])
+        archived, _ = self.archive.get(1, '2025-04', 'en')
+        self.assertEqual(archived, response.data)
+
+    def test_default_language_is_served_without_a_fetch(self):
+        default = '/generate_statement?customer_id=1&period=2025-04'
+        self.client.get(default)
+        self.assertEqual(len(self.fetches), 1)
+
+        for url in (default, '/generate_statement?customer_id=1&language=en&period=2025-04'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(len(self.rendered), 1)
+
+    def test_default_language_follows_the_latest_fetch(self):
+        self.client.get(self.PAST)
+        self.customer['preferred_language'] = 'zh'
+        self.client.get('/generate_statement?customer_id=1&period=2025-05')
+        response = self.client.get('/generate_statement?customer_id=1&period=2025-04')
+
+        self.assertEqual(len(self.fetches), 3)
+        self.assertEqual(self.archive.get(1, '2025-04', 'zh')[0], response.data)
+        self.assertEqual(self.archive.preferred_language(1), 'zh')
+
+    def test_current_period_is_not_archived(self):
+        current = datetime.today().strftime('%Y-%m')
+        self.client.get(f'/generate_statement?customer_id=1&language=en&period={current}')
+        self.client.get(f'/generate_statement?customer_id=1&language=en&period={current}')
+
+        self.assertEqual(len(self.rendered), 2)
+        self.assertIsNone(self.archive.get(1, current, 'en'))
+
+
+class TestStatementPreview(RouteTestCase):
+    PAST = '/statement/preview?customer_id=1&language=en&period=2025-04'
+
+    def test_database_values_are_escaped(self):
+        self.customer.update(first_name='<script>alert(1)</script>', email='a@b.co"><img src=x onerror=alert(1)>')
+        self.account['tier_level'] = '<b>Gold</b>'
+        self.transactions[0].update(merchant_name='<script>steal()</script>', category='<i>Dining</i>')
+
+        preview = self.client.get(self.PAST).get_data(as_text=True)
+        self.client.get('/generate_statement?customer_id=1&language=en&period=2025-04')
+        for html_content in (preview, self.rendered[-1]):
+            self.assertNotIn('<script>', html_content)
+            self.assertNotIn('<img', html_content)
+            self.assertNotIn('<b>Gold', html_content)
+            self.assertNotIn('<i>Dining', html_content)
+            self.assertIn('&lt;script&gt;steal()&lt;/script&gt;', html_content)
+            self.assertIn('&lt;script&gt;alert(1)&lt;/script&gt;', html_content)
+
+    def test_pages(self):
+        first = self.client.get(self.PAST + '&page_size=5')
+        last = self.client.get(self.PAST + '&page_size=5&page=3')
+
+        self.assertEqual(statement_rows(first.get_data(as_text=True)), ['Shop00000', 'Shop00001', 'Shop00002',
+                                                                        'Shop00003', 'Shop00004'])
+        self.assertEqual(statement_rows(last.get_data(as_text=True)), ['Shop00010', 'Shop00011'])
+        self.assertIn('page=2', last.get_data(as_text=True))
+        self.assertEqual(self.client.get(self.PAST + '&page_size=5&page=4').status_code, 404)
+        self.assertEqual(self.client.get(self.PAST + '&page=0').status_code, 400)
+        self.assertEqual(self.client.get(self.PAST + '&page_size=501').status_code, 400)
+        self.assertEqual(self.rendered, [])
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.PAST)
+        etag = response.headers['ETag']
+
+        unchanged = self.client.get(self.PAST, headers={'If-None-Match': etag})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.data, b'')
+
+        self.assertNotEqual(self.client.get(self.PAST + '&page_size=5').headers['ETag'], etag)
+        self.transactions[0]['merchant_name'] = 'Renamed'
+        changed = self.client.get(self.PAST, headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_not_modified_builds_no_rows(self):
+        row_html = generate_pdf.StatementGenerator.transaction_row_html
+        with mock.patch.object(generate_pdf.StatementGenerator, 'transaction_row_html',
+                               autospec=True, side_effect=row_html) as built:
+            response = self.client.get(self.PAST, buffered=False)
+            self.assertNotIn('Content-Length', response.headers)
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(built.call_count, 0)
+            self.assertEqual(len(statement_rows(response.get_data(as_text=True))), 12)
+            self.assertEqual(built.call_count, 12)
+
+            built.reset_mock()
+            unchanged = self.client.get(self.PAST, headers={'If-None-Match': response.headers['ETag']})
+            self.assertEqual(unchanged.status_code, 304)
+            self.assertEqual(unchanged.headers['ETag'], response.headers['ETag'])
+            self.assertTrue(unchanged.cache_control.private)
+            self.assertEqual(built.call_count, 0)
+
+    def test_cache_control(self):
+        closed = self.client.get(self.PAST).cache_control
+        self.assertTrue(closed.private)
+        self.assertEqual(closed.max_age, generate_pdf.PREVIEW_CLOSED_MAX_AGE)
+        self.assertFalse(closed.no_cache)
+
+        current = datetime.today().strftime('%Y-%m')
+        open_period = self.client.get(f'/statement/preview?customer_id=1&period={current}').cache_control
+        self.assertTrue(open_period.private)
+        self.assertTrue(open_period.no_cache)
+        self.assertIsNone(open_period.max_age)
+
+    def test_unknown_customer(self):
+        self.assertEqual(self.client.get('/statement/preview?customer_id=2').status_code, 404)
+
+
+class TestMissingFxRate(RouteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fetch_error = fx.MissingRateError("No FX rate for JPY on 2025-04-30")
+
+    def test_statement_names_the_missing_currency(self):
+        for url in ('/generate_statement?customer_id=1&language=en&period=2025-04',
+                    '/statement/preview?customer_id=1&period=2025-04'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 503, url)
+            self.assertIn('No FX rate for JPY', response.get_data(as_text=True))
+        self.assertEqual(self.rendered, [])
+
+    def test_customer_api_names_the_missing_currency(self):
+        response = self.client.get('/api/customer/1')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json(), {'error': 'No FX rate for JPY on 2025-04-30'})
+
+
+if __name__ == '__main__':
+    unittest.main()
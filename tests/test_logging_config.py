@@ -0,0 +1,101 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from services import logging_config
+
+
+class TestQueuedLogging(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.log_dir, 'app.log')
+        self.stream = io.StringIO()
+        self.logger = logging_config.configure_logging('test.queued', self.log_file, sample_rate=0.0,
+                                                       stream=self.stream)
+
+    def tearDown(self):
+        logging_config.stop_logging('test.queued')
+        self.logger.handlers = []
+
+    def records(self):
+        logging_config.stop_logging('test.queued')  # flushes the queue
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_are_structured_json_with_request_id(self):
+        token = logging_config.request_id_var.set('req-123')
+        try:
+            self.logger.warning("Customer not found", extra={'customer_id': 42})
+        finally:
+            logging_config.request_id_var.reset(token)
+
+        [record] = self.records()
+        self.assertEqual(record['message'], "Customer not found")
+        self.assertEqual(record['level'], 'WARNING')
+        self.assertEqual(record['request_id'], 'req-123')
+        self.assertEqual(record['customer_id'], 42)
+
+    def test_sampled_records_are_dropped_at_zero_rate(self):
+        self.logger.info("PDF generated successfully", extra={'sampled': True})
+        self.logger.info("Starting PDF generation")
+        messages = [record['message'] for record in self.records()]
+        self.assertEqual(messages, ["Starting PDF generation"])
+
+    def test_exceptions_are_rendered_into_the_record(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.logger.exception("PDF generation error")
+
+        [record] = self.records()
+        self.assertIn("ValueError: boom", record['exception'])
+
+    def test_each_logger_name_gets_its_own_pipeline(self):
+        other_stream = io.StringIO()
+        other = logging_config.configure_logging('test.other', os.path.join(self.log_dir, 'other.log'),
+                                                 stream=other_stream)
+        self.addCleanup(setattr, other, 'handlers', [])
+        self.assertTrue(self.logger.handlers)
+        self.assertTrue(other.handlers)
+
+        other.warning("Queued elsewhere")
+        logging_config.stop_logging('test.other')
+        self.assertEqual(json.loads(other_stream.getvalue())['message'], "Queued elsewhere")
+        self.assertEqual(self.records(), [])
+
+    def test_records_reach_the_log_file(self):
+        self.logger.error("Database error: %s", "timeout")
+        self.records()
+        with open(self.log_file, encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.readline())['message'], "Database error: timeout")
+
+    def test_file_is_reopened_after_external_rotation(self):
+        self.logger.error("Before rotation")
+        deadline = time.monotonic() + 5
+        while not (os.path.exists(self.log_file) and os.path.getsize(self.log_file)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        os.rename(self.log_file, self.log_file + '.1')  # what logrotate does
+
+        self.logger.error("After rotation")
+        self.records()
+        with open(self.log_file + '.1', encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['message'] for line in f], ["Before rotation"])
+        with open(self.log_file, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['message'] for line in f], ["After rotation"])
+
+    def test_stream_only_without_a_log_file(self):
+        stream = io.StringIO()
+        logger = logging_config.configure_logging('test.stream_only', None, stream=stream)
+        self.addCleanup(setattr, logger, 'handlers', [])
+        logger.error("Stream only")
+        logging_config.stop_logging('test.stream_only')
+
+        self.assertEqual(json.loads(stream.getvalue())['message'], "Stream only")
+        self.assertEqual(os.listdir(self.log_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
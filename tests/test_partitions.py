@@ -0,0 +1,98 @@
+import unittest
+from datetime import date
+
+from services import partitions
+from tests.helpers import FakeConnection
+
+
+def monthly(first, count):
+    months = [partitions.add_months(first, i) for i in range(count)]
+    return ([('p_history', first)]
+            + [(partitions.partition_name(m), partitions.add_months(m, 1)) for m in months]
+            + [('p_future', None)])
+
+
+def partitioned(existing, archived_rows=None):
+    """A connection whose Transactions table has the (name, upper_bound) partitions in existing.
+
+    Each partition holds 10 rows; the archive check finds archived_rows of
+    them (default all).
+    """
+    def respond(sql, params):
+        if 'archived_rows' in sql:
+            return [{'partition_rows': 10, 'archived_rows': 10 if archived_rows is None else archived_rows}]
+        if 'information_schema.PARTITIONS' not in sql:
+            return []
+        return [{'name': name, 'description': f"'{bound.isoformat()}'" if bound else 'MAXVALUE'}
+                for name, bound in existing]
+
+    return FakeConnection(respond)
+
+
+class TestPartitions(unittest.TestCase):
+    def test_parse_bound(self):
+        self.assertEqual(partitions.parse_bound("'2025-05-01'"), date(2025, 5, 1))
+        self.assertEqual(partitions.parse_bound("'2025-05-01 00:00:00'"), date(2025, 5, 1))
+        self.assertIsNone(partitions.parse_bound('MAXVALUE'))
+
+    def test_plan_adds_upcoming_months(self):
+        existing = monthly(date(2025, 1, 1), 24)  # through 2026-12
+        to_add, to_archive = partitions.plan(existing, date(2026, 11, 15), months_ahead=3, retention_months=24)
+        self.assertEqual(to_add, [date(2027, 1, 1), date(2027, 2, 1)])
+        self.assertEqual(to_archive, [])
+
+    def test_plan_archives_expired_partitions(self):
+        existing = monthly(date(2025, 1, 1), 24)
+        to_add, to_archive = partitions.plan(existing, date(2026, 3, 2), months_ahead=3, retention_months=12)
+        self.assertEqual(to_add, [])
+        self.assertEqual(to_archive, ['p_history', 'p202501', 'p202502'])
+
+    def test_plan_requires_partitioned_table(self):
+        with self.assertRaises(ValueError):
+            partitions.plan([], date(2026, 1, 1))
+
+    def test_reorganize_sql(self):
+        sql = partitions.reorganize_sql([date(2027, 1, 1)])
+        self.assertIn("REORGANIZE PARTITION p_future INTO", sql)
+        self.assertIn("PARTITION p202701 VALUES LESS THAN ('2027-02-01')", sql)
+        self.assertTrue(sql.rstrip().endswith("PARTITION p_future VALUES LESS THAN (MAXVALUE)\n)"))
+
+    def test_run_maintenance_dry_run_executes_nothing(self):
+        connection = partitioned(monthly(date(2025, 1, 1), 3))
+        statements = partitions.run_maintenance(connection, date(2025, 4, 10), months_ahead=0,
+                                                retention_months=2, dry_run=True)
+
+        self.assertEqual(len(connection.executed), 1)  # only the partition listing
+        self.assertIn('PARTITION p202504 VALUES', statements[0])
+        self.assertEqual(statements[1:], partitions.archive_sql('p_history') + partitions.archive_sql('p202501'))
+        self.assertTrue(statements[1].startswith('INSERT INTO TransactionsArchive'))
+
+    def test_archive_sql_copies_missing_rows_and_checks_them(self):
+        insert, verify, drop = partitions.archive_sql('p202501')
+        self.assertNotIn('IGNORE', insert)
+        self.assertIn('FROM Transactions PARTITION (p202501) t LEFT JOIN TransactionsArchive a', insert)
+        self.assertIn('WHERE a.transaction_id IS NULL', insert)
+        for column in partitions.COLUMNS:
+            self.assertIn(f'a.{column} <=> t.{column}', verify)
+        self.assertEqual(drop, 'ALTER TABLE Transactions DROP PARTITION p202501')
+
+    def test_run_maintenance_archives_then_drops(self):
+        connection = partitioned(monthly(date(2025, 1, 1), 7))
+        partitions.run_maintenance(connection, date(2025, 7, 10), months_ahead=0, retention_months=6)
+
+        executed = [sql for sql, _ in connection.executed[1:]]
+        self.assertEqual(executed, partitions.archive_sql('p_history'))
+        self.assertEqual(connection.commits, 2)
+
+    def test_run_maintenance_keeps_partition_missing_from_archive(self):
+        connection = partitioned(monthly(date(2025, 1, 1), 7), archived_rows=9)
+        with self.assertRaisesRegex(partitions.ArchiveMismatchError, 'p_history has 10 rows but only 9'):
+            partitions.run_maintenance(connection, date(2025, 7, 10), months_ahead=0, retention_months=6)
+
+        executed = [sql for sql, _ in connection.executed]
+        self.assertFalse(any('DROP PARTITION' in sql for sql in executed))
+        self.assertEqual(connection.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
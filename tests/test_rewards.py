@@ -0,0 +1,108 @@
+import sqlite3
+import unittest
+from datetime import date, datetime
+
+from services import fx, rewards
+from tests.helpers import FakeConnection
+
+
+def accounts(bounds, missing_rates=()):
+    """A connection answering the account-range query with bounds; each batch upsert changes two rows.
+
+    The missing-rate check returns missing_rates.
+    """
+    def respond(sql, params):
+        if 'fx.rate_to_base IS NULL' in sql:
+            return [{'currency': currency} for currency in missing_rates]
+        return [{}, {}] if params else [bounds]
+    return FakeConnection(respond)
+
+
+def points_database(transactions, rates):
+    """In-memory SQLite holding Transactions (account_id, amount, type, category, currency) and FxRates.
+
+    IF and GREATEST are registered as functions so the MySQL points query runs
+    unchanged apart from its placeholders.
+    """
+    db = sqlite3.connect(':memory:')
+    db.create_function('IF', 3, lambda condition, then, otherwise: then if condition else otherwise)
+    db.create_function('GREATEST', 2, max)
+    db.executescript("""
+        CREATE TABLE Categories (category_key INTEGER PRIMARY KEY, category_name TEXT);
+        CREATE TABLE Transactions (account_id INTEGER, transaction_date TEXT, category_key INTEGER,
+                                   transaction_amount NUMERIC, transaction_type TEXT,
+                                   transaction_status TEXT, currency TEXT);
+        CREATE TABLE FxRates (currency TEXT, rate_date TEXT, rate_to_base NUMERIC);
+    """)
+    categories = sorted({category for _, _, _, category, _ in transactions})
+    db.executemany('INSERT INTO Categories VALUES (?, ?)', enumerate(categories))
+    db.executemany(
+        "INSERT INTO Transactions VALUES (?, '2025-04-15', ?, ?, ?, 'Completed', ?)",
+        [(account_id, categories.index(category), amount, kind, currency)
+         for account_id, amount, kind, category, currency in transactions])
+    db.executemany('INSERT INTO FxRates VALUES (?, ?, ?)', rates)
+    return db
+
+
+class TestRewards(unittest.TestCase):
+    def test_tier_for_points(self):
+        self.assertEqual(rewards.tier_for_points(0), 'Standard')
+        self.assertEqual(rewards.tier_for_points(2999), 'Standard')
+        self.assertEqual(rewards.tier_for_points(3000), 'Silver')
+        self.assertEqual(rewards.tier_for_points(7000), 'Gold')
+        self.assertEqual(rewards.tier_for_points(25000), 'Platinum')
+
+    def test_cycle_bounds(self):
+        self.assertEqual(rewards.cycle_bounds('2025-04'), (datetime(2025, 4, 1), datetime(2025, 5, 1)))
+        self.assertEqual(rewards.cycle_bounds('2025-12'), (datetime(2025, 12, 1), datetime(2026, 1, 1)))
+
+    def test_accrual_runs_one_upsert_per_batch(self):
+        connection = accounts({'first_id': 1, 'last_id': 12})
+        changed = rewards.run_accrual(connection, '2025-04', batch_size=5)
+
+        upserts = connection.executed[2:]
+        self.assertEqual([params[-2:] for _, params in upserts], [(1, 5), (6, 10), (11, 12)])
+        self.assertTrue(all('ON DUPLICATE KEY UPDATE' in sql for sql, _ in upserts))
+        self.assertEqual(upserts[0][1][:5], (datetime(2025, 4, 1), '2025-04', date(2025, 4, 30),
+                                             datetime(2025, 4, 1), datetime(2025, 5, 1)))
+        self.assertEqual(connection.commits, 3)
+        self.assertEqual(changed, 6)
+
+    def test_missing_rate_fails_before_accruing(self):
+        connection = accounts({'first_id': 1, 'last_id': 12}, missing_rates=['INR'])
+        with self.assertRaisesRegex(fx.MissingRateError, 'INR on 2025-04-30'):
+            rewards.run_accrual(connection, '2025-04')
+        self.assertEqual(len(connection.executed), 1)
+        self.assertEqual(connection.commits, 0)
+
+    def test_points_are_earned_on_base_currency_spend(self):
+        db = points_database(
+            [(1, 45000, 'Purchase', 'Travel', 'INR'),      # 715.50 SGD, doubled
+             (1, 100, 'Purchase', 'Groceries', 'SGD'),
+             (1, 20, 'Refund', 'Groceries', None),
+             (2, 1000, 'Purchase', 'Dining', 'USD')],
+            [('INR', '2025-01-01', '0.0159'), ('USD', '2025-01-01', '1.30'),
+             ('USD', '2025-04-30', '1.35'), ('USD', '2025-05-01', '1.40')])
+        params = ('2025-04-30', '2025-04-01', '2025-05-01', 1, 2)
+
+        points = db.execute(rewards.build_points_sql().replace('%s', '?'), params).fetchall()
+        self.assertEqual(sorted(points), [(1, 1511), (2, 2700)])
+
+        missing = rewards.build_missing_rates_sql().replace('%s', '?')
+        self.assertEqual(db.execute(missing, params[:3]).fetchall(), [])
+        db.execute("DELETE FROM FxRates WHERE currency = 'INR'")
+        self.assertEqual(db.execute(missing, params[:3]).fetchall(), [('INR',)])
+
+    def test_accrual_without_accounts(self):
+        connection = accounts({'first_id': None, 'last_id': None})
+        self.assertEqual(rewards.run_accrual(connection, '2025-04'), 0)
+
+    def test_update_clause_writes_last_accrual_period_last(self):
+        sql = rewards.build_accrual_sql()
+        update = sql.split('ON DUPLICATE KEY UPDATE')[1]
+        self.assertLess(update.index('reward_points ='), update.index('tier_level ='))
+        self.assertLess(update.index('tier_level ='), update.index('last_accrual_period ='))
+
+
+if __name__ == '__main__':
+    unittest.main()
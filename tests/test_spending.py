@@ -0,0 +1,43 @@
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from services import spending
+
+
+def row(month, category, currency, spend, refunds, count):
+    return {'spend_month': month, 'category': category, 'currency': currency,
+            'spend_amount': Decimal(spend), 'refund_amount': Decimal(refunds), 'transaction_count': count}
+
+
+class TestSpendingSummary(unittest.TestCase):
+    def test_window_start(self):
+        self.assertEqual(spending.window_start(1, date(2025, 4, 17)), date(2025, 4, 1))
+        self.assertEqual(spending.window_start(12, date(2025, 4, 17)), date(2024, 5, 1))
+        self.assertEqual(spending.window_start(4, date(2025, 1, 31)), date(2024, 10, 1))
+
+    def test_summarise_by_month_and_category(self):
+        summary = spending.summarise([
+            row(date(2025, 3, 1), 'Groceries', 'SGD', '100.50', '0', 2),
+            row(date(2025, 3, 1), 'Travel', 'SGD', '900.00', '100.00', 3),
+            row(date(2025, 4, 1), 'Groceries', 'SGD', '50.25', '10.00', 2),
+            row(date(2025, 4, 1), 'Groceries', 'HKD', '650.00', '0', 1),
+        ])
+
+        self.assertEqual(summary['by_month'], [
+            {'month': '2025-03', 'currency': 'SGD', 'spend': 1000.5, 'refunds': 100.0, 'net': 900.5,
+             'transactions': 5},
+            {'month': '2025-04', 'currency': 'HKD', 'spend': 650.0, 'refunds': 0.0, 'net': 650.0,
+             'transactions': 1},
+            {'month': '2025-04', 'currency': 'SGD', 'spend': 50.25, 'refunds': 10.0, 'net': 40.25,
+             'transactions': 2},
+        ])
+        self.assertEqual([(item['category'], item['currency'], item['spend']) for item in summary['by_category']],
+                         [('Travel', 'SGD', 900.0), ('Groceries', 'HKD', 650.0), ('Groceries', 'SGD', 150.75)])
+
+    def test_empty(self):
+        self.assertEqual(spending.summarise([]), {'by_month': [], 'by_category': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
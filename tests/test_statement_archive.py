@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from services.statement_archive import StatementArchive
+
+
+class TestStatementArchive(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.archive = StatementArchive(self.root)
+        self.pdf = b'%PDF-1.7\n' + b'statement body ' * 100
+
+    def test_put_and_get_round_trip(self):
+        digest = self.archive.put(self.pdf, 1, 10, '2025-03', 'en', 'DBS_Statement_John_Tan_202503.pdf')
+        self.assertTrue(os.path.exists(self.archive.blob_path(digest, False)))
+        self.assertEqual(self.archive.get(1, '2025-03', 'en'), (self.pdf, 'DBS_Statement_John_Tan_202503.pdf'))
+        self.assertEqual(self.archive.get(1, '2025-03', 'en', account_id=10)[0], self.pdf)
+
+    def test_missing_statement_returns_none(self):
+        self.archive.put(self.pdf, 1, 10, '2025-03', 'en', 'a.pdf')
+        self.assertIsNone(self.archive.get(1, '2025-04', 'en'))
+        self.assertIsNone(self.archive.get(1, '2025-03', 'zh'))
+        self.assertIsNone(self.archive.get(1, '2025-03', 'en', account_id=11))
+
+    def test_identical_pdfs_are_stored_once(self):
+        first = self.archive.put(self.pdf, 1, 10, '2025-03', 'en', 'a.pdf')
+        second = self.archive.put(self.pdf, 2, 20, '2025-03', 'en', 'b.pdf')
+        self.assertEqual(first, second)
+        blob_files = [name for _, _, names in os.walk(self.archive.blob_dir) for name in names]
+        self.assertEqual(blob_files, [first + '.pdf'])
+
+    def test_blobs_are_sharded_by_digest_prefix(self):
+        digest = self.archive.put(self.pdf, 1, 10, '2025-03', 'en', 'a.pdf')
+        relative = os.path.relpath(self.archive.blob_path(digest, False), self.archive.blob_dir)
+        self.assertEqual(relative.split(os.sep)[:2], [digest[:2], digest[2:4]])
+
+    def test_compressed_archive(self):
+        archive = StatementArchive(tempfile.mkdtemp(), compress=True)
+        digest = archive.put(self.pdf, 1, 10, '2025-03', 'en', 'a.pdf')
+        self.assertLess(os.path.getsize(archive.blob_path(digest, True)), len(self.pdf))
+        self.assertEqual(archive.get(1, '2025-03', 'en')[0], self.pdf)
+        self.assertEqual(StatementArchive(archive.root).get(1, '2025-03', 'en')[0], self.pdf)
+
+    def test_entries_for_period(self):
+        self.archive.put(self.pdf, 2, 20, '2025-03', 'en', 'b.pdf')
+        self.archive.put(self.pdf, 1, 10, '2025-03', 'zh', 'a.pdf')
+        self.archive.put(self.pdf, 1, 10, '2025-04', 'en', 'c.pdf')
+
+        entries = self.archive.entries('2025-03')
+        self.assertEqual([(e['customer_id'], e['filename']) for e in entries], [(1, 'a.pdf'), (2, 'b.pdf')])
+        self.assertEqual(self.archive.read(entries[0]), self.pdf)
+
+
+if __name__ == '__main__':
+    unittest.main()
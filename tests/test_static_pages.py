@@ -0,0 +1,105 @@
+import gzip
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+import brotli
+
+import build_static
+import generate_pdf
+
+ASSET_NAME_RE = re.compile(r'^(first|index|login|signup)-\d+\.([0-9a-f]{12})\.(css|js)$')
+
+
+class TestBuildStatic(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = os.path.join(tempfile.mkdtemp(), 'dist')
+        self.manifest = build_static.build(self.output_dir)
+
+    def test_assets_are_fingerprinted_and_precompressed(self):
+        assets_dir = os.path.join(self.output_dir, 'assets')
+        names = [name for name in os.listdir(assets_dir) if name.endswith(('.css', '.js'))]
+        self.assertTrue(names)
+        for name in names:
+            match = ASSET_NAME_RE.match(name)
+            self.assertIsNotNone(match, name)
+            with open(os.path.join(assets_dir, name), 'rb') as f:
+                data = f.read()
+            self.assertEqual(match.group(2), build_static.fingerprint(data))
+            with open(os.path.join(assets_dir, name + '.br'), 'rb') as f:
+                self.assertEqual(brotli.decompress(f.read()), data)
+            with open(os.path.join(assets_dir, name + '.gz'), 'rb') as f:
+                self.assertEqual(gzip.decompress(f.read()), data)
+
+    def test_pages_link_their_assets(self):
+        self.assertEqual(sorted(self.manifest), sorted(generate_pdf.STATIC_PAGES))
+        for entry in self.manifest.values():
+            with open(os.path.join(self.output_dir, entry['file']), encoding='utf-8') as f:
+                html = f.read()
+            self.assertNotIn('<style>', html)
+            self.assertNotIn('<script>', html)
+            for url in re.findall(r'(?:href|src)="(/static/dist/assets/[^"]+)"', html):
+                self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'assets', url.rsplit('/', 1)[1])))
+            self.assertEqual(entry['etag'], build_static.fingerprint(html.encode('utf-8')))
+
+
+class StaticPageTestCase(unittest.TestCase):
+    """Page routes served from a dist tree in a temporary directory."""
+
+    dist_dir = None
+
+    def setUp(self):
+        for patcher in (mock.patch.object(generate_pdf, 'STATIC_DIST_DIR', self.dist_dir),
+                        mock.patch.dict(generate_pdf._prebuilt_pages, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = generate_pdf.app.test_client()
+
+
+class TestPrebuiltPages(StaticPageTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dist_dir = os.path.join(tempfile.mkdtemp(), 'dist')
+        cls.manifest = build_static.build(cls.dist_dir)
+        with open(os.path.join(cls.dist_dir, cls.manifest['login']['file']), 'rb') as f:
+            cls.login_html = f.read()
+
+    def test_negotiates_encoding(self):
+        for accept, encoding, decode in (('br, gzip', 'br', brotli.decompress),
+                                         ('gzip', 'gzip', gzip.decompress),
+                                         ('', None, bytes)):
+            response = self.client.get('/login', headers={'Accept-Encoding': accept})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers.get('Content-Encoding'), encoding)
+            self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+            self.assertEqual(decode(response.data), self.login_html)
+
+    def test_if_none_match_returns_304(self):
+        response = self.client.get('/login', headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(response.cache_control.public)
+        self.assertEqual(response.cache_control.max_age, generate_pdf.PAGE_MAX_AGE)
+
+        unchanged = self.client.get('/login', headers={'Accept-Encoding': 'gzip',
+                                                       'If-None-Match': response.headers['ETag']})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.data, b'')
+
+        # Each encoding has its own ETag
+        identity = self.client.get('/login', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(identity.status_code, 200)
+
+
+class TestTemplateFallback(StaticPageTestCase):
+    dist_dir = tempfile.mkdtemp()
+
+    def test_renders_template_without_a_build(self):
+        response = self.client.get('/login', headers={'Accept-Encoding': 'br, gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertIn('<style>', response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()